@@ -6,6 +6,10 @@ except ImportError:
     def load_dotenv(*args, **kwargs):
         pass
 
+# .env ファイルが存在する場合は環境変数を読み込む
+# （下記 Config のクラス属性で環境変数を参照するため、クラス定義より先に読み込む）
+load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env")
+
 # アプリケーション全体で利用する設定（パス、定数など）を保持するクラス
 class Config:
     # BASE_DIR: プロジェクトのルートディレクトリ (実行ファイルから2階層上)
@@ -14,12 +18,107 @@ class Config:
     # 認証情報の保存ファイルパス (実行毎に認証が不要なようにTokenを保存)
     TOKEN_CACHE_FILE = BASE_DIR / "config" / "token.json"
     
+    # アクセストークンの有効期限の何秒前に、バックグラウンドで更新するか / 更新に失敗した場合の再試行の間隔(秒)
+    AUTH_REFRESH_MARGIN_SECONDS = float(os.environ.get("AUTH_REFRESH_MARGIN_SECONDS", "300"))
+    AUTH_REFRESH_RETRY_SECONDS = float(os.environ.get("AUTH_REFRESH_RETRY_SECONDS", "30"))
+    
     # Google API へアクセスするためのクライアント機密情報 (事前にGCPでダウンロードして配置する)
     CREDENTIALS_FILE = BASE_DIR / "config" / "credentials.json"
     
     # アプリケーションが利用する各種データを保存するディレクトリ
     DATA_DIR = BASE_DIR / "data"
 
+    # Gemini API への同時リクエスト数の上限 (APIのクォータに合わせて調整する)
+    GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "4"))
+
+    # Gemini のモデル選択（処理種別ごと）。軽い処理（振り分け・並び替え）は高速なモデルを用いる
+    GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-pro")
+    GEMINI_MODEL_CLASSIFY = os.environ.get("GEMINI_MODEL_CLASSIFY", "gemini-2.5-flash")
+    GEMINI_MODEL_SORT = os.environ.get("GEMINI_MODEL_SORT", "gemini-2.5-flash")
+    GEMINI_MODEL_ANALYZE = os.environ.get("GEMINI_MODEL_ANALYZE", "gemini-2.5-pro")
+    # 高速なモデルの応答が解析できない・不完全な場合に再実行するモデル（空文字で再実行しない）
+    # 1回目の問い合わせに ESCALATION_MAX_SECONDS 秒以上かかった場合は、待ち時間を優先して再実行しない
+    GEMINI_ESCALATION_MODEL = os.environ.get("GEMINI_ESCALATION_MODEL", "gemini-2.5-pro")
+    GEMINI_ESCALATION_MAX_SECONDS = float(os.environ.get("GEMINI_ESCALATION_MAX_SECONDS", "30"))
+
+    # Google Tasks API への同時リクエスト数の上限 (リスト単位の並行取得などで使用する)
+    TASKS_MAX_CONCURRENCY = int(os.environ.get("TASKS_MAX_CONCURRENCY", "4"))
+
+    # タスク一括分析で1リクエストに含めるタスクの上限 (タイトル+メモの合計文字数 / 件数)
+    GEMINI_BATCH_CHAR_BUDGET = int(os.environ.get("GEMINI_BATCH_CHAR_BUDGET", "8000"))
+    GEMINI_BATCH_MAX_TASKS = int(os.environ.get("GEMINI_BATCH_MAX_TASKS", "20"))
+    # Inbox の振り分けで1リクエストに含めるタスクの上限 (文字数の上限は GEMINI_BATCH_CHAR_BUDGET と共通)
+    GEMINI_CLASSIFY_BATCH_MAX_TASKS = int(os.environ.get("GEMINI_CLASSIFY_BATCH_MAX_TASKS", "50"))
+
+    # スケジューリングの分析・配置・書き込みを並行するパイプラインで処理する (1 で有効。既定は全件ずつ順に処理する)
+    # 配置結果を逐次処理と同じに保つため、分析中に登録できるのは未分析のタスクより期限が真に早いタスクのみ
+    # （期限付きのタスクが少ない場合は、分析と登録はほとんど重ならない）
+    SCHEDULE_PIPELINE_ENABLED = os.environ.get("SCHEDULE_PIPELINE_ENABLED", "0") == "1"
+
+    # Gemini の応答キャッシュ (data/llm_cache.sqlite3) の設定
+    LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") != "0"
+    LLM_CACHE_TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+    # Google Tasks のローカルミラー (data/tasks_mirror.sqlite3) の設定
+    # 差分同期を基本とし、取りこぼし対策として一定時間ごとに全件を取得し直す
+    TASK_MIRROR_ENABLED = os.environ.get("TASK_MIRROR_ENABLED", "1") != "0"
+    TASK_MIRROR_FULL_RESYNC_HOURS = float(os.environ.get("TASK_MIRROR_FULL_RESYNC_HOURS", "24"))
+
+    # Google Calendar の予定キャッシュ (data/calendar_cache.sqlite3) の設定
+    # MAX_AGE 秒以内の再要求は通信せずにキャッシュから Busy 期間を返す
+    CALENDAR_CACHE_ENABLED = os.environ.get("CALENDAR_CACHE_ENABLED", "1") != "0"
+    CALENDAR_CACHE_MAX_AGE_SECONDS = int(os.environ.get("CALENDAR_CACHE_MAX_AGE_SECONDS", "60"))
+    CALENDAR_CACHE_HORIZON_DAYS = int(os.environ.get("CALENDAR_CACHE_HORIZON_DAYS", "60"))
+    CALENDAR_CACHE_FULL_RESYNC_HOURS = float(os.environ.get("CALENDAR_CACHE_FULL_RESYNC_HOURS", "24"))
+
+    # Inbox の振り分けのローカル分類器 (data/inbox_classifier.sqlite3)
+    # 過去の振り分け結果と各■リストのタスクから学習し、確信度が MIN_CONFIDENCE 以上のタスクは Gemini に問い合わせずに振り分ける
+    # (推定したリストの学習例が MIN_EXAMPLES 件未満の場合は Gemini に委ねる。学習例は MAX_EXAMPLES 件まで保持する)
+    INBOX_CLASSIFIER_ENABLED = os.environ.get("INBOX_CLASSIFIER_ENABLED", "1") != "0"
+    INBOX_CLASSIFIER_MIN_CONFIDENCE = float(os.environ.get("INBOX_CLASSIFIER_MIN_CONFIDENCE", "0.95"))
+    INBOX_CLASSIFIER_MIN_EXAMPLES = int(os.environ.get("INBOX_CLASSIFIER_MIN_EXAMPLES", "3"))
+    INBOX_CLASSIFIER_MAX_EXAMPLES = int(os.environ.get("INBOX_CLASSIFIER_MAX_EXAMPLES", "20000"))
+
+    # API呼び出し・処理フェーズの計測 (集計はUIのログと data/traces/ に出力する)
+    INSTRUMENTATION_ENABLED = os.environ.get("INSTRUMENTATION_ENABLED", "1") != "0"
+    # data/traces/ に保持する計測結果のファイル数の上限（超えた分は古いものから削除する。0 で無制限）
+    INSTRUMENTATION_MAX_TRACE_FILES = int(os.environ.get("INSTRUMENTATION_MAX_TRACE_FILES", "200"))
+    # 計測結果を data/traces/ に保存する (0 でログへの出力のみ。模擬サービスでの実行は常に保存しない)
+    INSTRUMENTATION_SAVE_TRACES = os.environ.get("INSTRUMENTATION_SAVE_TRACES", "1") != "0"
+
+    # API クライアントごとのレート制限（1秒あたりのリクエスト数の上限、0 で無制限）
+    # 各サービスで共有され、レート制限エラー (429 等) を受けた場合は自動的に送信レートを下げる
+    TASKS_QPS = float(os.environ.get("TASKS_QPS", "10"))
+    CALENDAR_QPS = float(os.environ.get("CALENDAR_QPS", "10"))
+    GEMINI_QPS = float(os.environ.get("GEMINI_QPS", "1"))
+    # Google Calendar API への同時リクエスト数の上限
+    CALENDAR_MAX_CONCURRENCY = int(os.environ.get("CALENDAR_MAX_CONCURRENCY", "4"))
+    # 一時的なエラー (429/5xx、通信エラー) の再試行回数 / 指数バックオフの初回・最大の待ち時間(秒)
+    API_MAX_RETRIES = int(os.environ.get("API_MAX_RETRIES", "5"))
+    API_BACKOFF_BASE_SECONDS = float(os.environ.get("API_BACKOFF_BASE_SECONDS", "1"))
+    API_BACKOFF_MAX_SECONDS = float(os.environ.get("API_BACKOFF_MAX_SECONDS", "60"))
+
+    # GUI のログ表示: 画面に保持する行数の上限 / 1秒あたりの画面更新回数の上限
+    # 全てのログは data/logs/taskmanager.log に保存し、FILE_MAX_BYTES ごとに BACKUPS 世代までローテーションする
+    UI_LOG_MAX_LINES = int(os.environ.get("UI_LOG_MAX_LINES", "1000"))
+    UI_LOG_FPS = float(os.environ.get("UI_LOG_FPS", "10"))
+    UI_LOG_FILE_MAX_BYTES = int(os.environ.get("UI_LOG_FILE_MAX_BYTES", str(5 * 1024 * 1024)))
+    UI_LOG_FILE_BACKUPS = int(os.environ.get("UI_LOG_FILE_BACKUPS", "3"))
+
+    # 常駐モード (python src/cli.py daemon) で変更の有無を確認する間隔(秒)
+    # 変更が無い間は MIN から MAX まで間隔を倍々に広げ、変更を検知したら MIN に戻す
+    DAEMON_MIN_INTERVAL_SECONDS = float(os.environ.get("DAEMON_MIN_INTERVAL_SECONDS", "60"))
+    DAEMON_MAX_INTERVAL_SECONDS = float(os.environ.get("DAEMON_MAX_INTERVAL_SECONDS", "900"))
+
+    # 接続先のバックエンド ("google": 実際の Google / Gemini API, "simulation": 通信なしの模擬サービス)
+    BACKEND = os.environ.get("TASKMANAGER_BACKEND", "google")
+    # シミュレーション時に生成するタスク数 / 1通信あたりの遅延(ミリ秒) / N件ごとのクォータエラー(0で無効) / 乱数シード
+    SIMULATION_TASKS = int(os.environ.get("SIMULATION_TASKS", "1000"))
+    SIMULATION_LATENCY_MS = float(os.environ.get("SIMULATION_LATENCY_MS", "0"))
+    SIMULATION_QUOTA_ERROR_EVERY = int(os.environ.get("SIMULATION_QUOTA_ERROR_EVERY", "0"))
+    SIMULATION_SEED = int(os.environ.get("SIMULATION_SEED", "0"))
+
     # 必須ディレクトリが存在しない場合は初期化処理で作成する
     @classmethod
     def init_dirs(cls):
@@ -29,6 +128,3 @@ class Config:
 
 # モジュール読み込み時に自動でディレクトリ初期化を行う
 Config.init_dirs()
-
-# .env ファイルが存在する場合は環境変数を読み込む
-load_dotenv(dotenv_path=Config.BASE_DIR / ".env")
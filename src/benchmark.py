@@ -0,0 +1,188 @@
+import sys
+import os
+import argparse
+import datetime
+import json
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+# Add project root to sys.path
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(root_dir))
+
+from config.config import Config
+from src.logic.simulation import SimulatedWorkspace
+from src.logic.state_manager import StateManager
+from src.logic.synchronizer import Synchronizer
+from src.logic.scheduler import Scheduler
+from src.logic.busy_timeline import BusyTimeline
+from src.logic import instrumentation
+
+# 模擬サービス（通信なし）上の合成アカウントに対して主要な処理の所要時間を計測し、JSONに保存するベンチマーク。
+# 使い方: python src/benchmark.py --tasks-per-list 500 --busy-per-day 5 --split-fanout 3 [--compare 前回の結果.json]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=root_dir, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def _diff_stats(before: dict, after: dict) -> dict:
+    return {
+        service: {key: after[service][key] - before[service].get(key, 0) for key in after[service]}
+        for service in after
+    }
+
+
+def _measure(name: str, workspace: SimulatedWorkspace, func, track_memory: bool) -> dict:
+    """
+    1つの処理を実行し、経過時間・API呼び出し数・LLM呼び出し数・メモリ使用量のピークを記録する。
+    """
+    stats_before = workspace.stats() if workspace else None
+    if track_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    extra = func() or {}
+    wall = time.perf_counter() - started
+    peak = None
+    if track_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    result = {"wall_seconds": round(wall, 4), "peak_memory_bytes": peak}
+    if workspace:
+        calls = _diff_stats(stats_before, workspace.stats())
+        result["api_calls"] = {"tasks": calls["tasks"], "calendar": calls["calendar"]}
+        result["llm_calls"] = calls["gemini"]["requests"]
+    result.update(extra)
+    print(f"  {name:<22} {wall:8.3f}s" + (f"  peak {peak / 1024 / 1024:7.1f} MiB" if peak is not None else ""))
+    return result
+
+
+def _new_environment(args) -> tuple:
+    workspace = SimulatedWorkspace(seed=args.seed, split_fanout=args.split_fanout)
+    workspace.populate(tasks_per_list=args.tasks_per_list, busy_events_per_day=args.busy_per_day)
+    tasks, calendar, gemini = workspace.create_adapters()
+    state = StateManager(":memory:")
+    logs = []
+    synchronizer = Synchronizer(tasks, calendar, state, gemini, logger=logs.append)
+    scheduler = Scheduler(tasks, calendar, state, gemini, logger=logs.append)
+    return workspace, tasks, state, synchronizer, scheduler
+
+
+def run_benchmarks(args) -> dict:
+    results = {}
+    track_memory = not args.no_memory
+
+    # Inbox の振り分け
+    workspace, tasks, state, synchronizer, scheduler = _new_environment(args)
+    results["organize_inbox"] = _measure("organize_inbox", workspace, synchronizer.organize_inbox, track_memory)
+
+    # スケジューリング全体 → 元に戻す
+    workspace, tasks, state, synchronizer, scheduler = _new_environment(args)
+    results["schedule_tasks"] = _measure(
+        "schedule_tasks", workspace,
+        lambda: scheduler.schedule_tasks() or {"linked_tasks": len(state.get_all_links())},
+        track_memory
+    )
+    results["undo_scheduled_tasks"] = _measure(
+        "undo_scheduled_tasks", workspace, lambda: scheduler.undo_scheduled_tasks(delete_events=True), track_memory
+    )
+
+    # 個別登録 (_schedule_single_task) を1件ずつ繰り返す
+    workspace, tasks, state, synchronizer, scheduler = _new_environment(args)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    busy_timeline = BusyTimeline(scheduler.calendar.get_free_busy(now, now + datetime.timedelta(days=14)))
+    list_id = next(lst['id'] for lst in tasks.get_tasklists() if lst['title'] == "■仕事")
+    targets = tasks.get_tasks(list_id)[:args.single_placements]
+    analysis = {"duration_minutes": 30, "importance": 3, "location": None, "recommended_subtasks": []}
+
+    def place_single():
+        search_start = None
+        for task in targets:
+            search_start = scheduler._schedule_single_task(list_id, task, analysis, busy_timeline, search_start)
+        return {"placements": len(targets)}
+    results["schedule_single_task"] = _measure("schedule_single_task", workspace, place_single, track_memory)
+
+    # StateManager の書き込み性能（1件ごとのコミット / transaction() による一括コミット）
+    with tempfile.TemporaryDirectory() as tmp:
+        count = args.state_writes
+
+        def write_each():
+            manager = StateManager(Path(tmp) / "each.sqlite3")
+            for i in range(count):
+                manager.link_task_to_event(f"task{i}", f"event{i}")
+            return {"writes": count}
+
+        def write_batched():
+            manager = StateManager(Path(tmp) / "batched.sqlite3")
+            with manager.transaction():
+                for i in range(count):
+                    manager.link_task_to_event(f"task{i}", f"event{i}")
+            return {"writes": count}
+
+        for name, func in (("state_write_each", write_each), ("state_write_batched", write_batched)):
+            result = _measure(name, None, func, track_memory)
+            result["writes_per_second"] = round(count / result["wall_seconds"]) if result["wall_seconds"] else None
+            results[name] = result
+    return results
+
+
+def compare(current: dict, previous: dict):
+    print(f"\n=== 比較: {previous.get('commit')} -> {current.get('commit')} ===")
+    for name, result in current["results"].items():
+        before = previous.get("results", {}).get(name)
+        if not before or not before.get("wall_seconds"):
+            continue
+        ratio = result["wall_seconds"] / before["wall_seconds"]
+        print(f"  {name:<22} {before['wall_seconds']:8.3f}s -> {result['wall_seconds']:8.3f}s  ({ratio:5.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TaskManager ベンチマーク（模擬サービス使用）")
+    parser.add_argument("--tasks-per-list", type=int, default=200, help="Inbox を含む各リストのタスク数")
+    parser.add_argument("--busy-per-day", type=int, default=3, help="1日あたりの既存予定の数")
+    parser.add_argument("--split-fanout", type=int, default=2, help="分割対象タスクのサブタスク数")
+    parser.add_argument("--single-placements", type=int, default=100, help="個別登録の計測で登録するタスク数")
+    parser.add_argument("--state-writes", type=int, default=2000, help="StateManager の書き込み計測の件数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="メモリ計測 (tracemalloc) を行わない（計測の負荷を除いた時間を測る）")
+    parser.add_argument("--output", help="結果の保存先 (省略時は data/benchmarks/ 配下)")
+    parser.add_argument("--compare", help="比較対象とする過去の結果 (JSON)")
+    args = parser.parse_args()
+
+    # 計測結果のファイル保存を計測時間に含めず、data/traces/ にも書き込まない
+    instrumentation.set_trace_persistence(False)
+    print("=== TaskManager Benchmark ===")
+    results = run_benchmarks(args)
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": results,
+    }
+
+    output = Path(args.output) if args.output else (
+        Config.DATA_DIR / "benchmarks" / f"bench_{datetime.datetime.now():%Y%m%d_%H%M%S}_{report['commit'] or 'nogit'}.json"
+    )
+    os.makedirs(output.parent, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました: {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
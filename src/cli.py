@@ -0,0 +1,108 @@
+import sys
+import argparse
+import datetime
+import signal
+import warnings
+from pathlib import Path
+
+# filter warning outputs to keep console clean
+warnings.filterwarnings("ignore", category=DeprecationWarning)
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+# Add project root to sys.path
+root_dir = Path(__file__).resolve().parent.parent
+sys.path.append(str(root_dir))
+
+from config.config import Config
+from src.logic.backends import create_components
+from src.logic.instance_lock import InstanceLock, InstanceLockError
+from src.logic.synchronizer import Synchronizer
+from src.logic.scheduler import Scheduler
+from src.logic.daemon import TaskManagerDaemon
+
+# GUI を起動せずに振り分け・スケジューリングを実行するコマンドライン版の入口。
+# 使い方:
+#   python src/cli.py organize                      Inbox の振り分け
+#   python src/cli.py schedule --start 6 --end 22   未スケジュールタスクのカレンダー登録
+#   python src/cli.py undo [--delete-events]        スケジュール済みタスクを元に戻す
+#   python src/cli.py run-all                       振り分け → スケジューリング
+#   python src/cli.py daemon                        常駐して、変更のあったタスクのみを定期的に処理する
+# 同じアカウントに対しては1プロセスのみ実行できる（ロックファイル: data/locks/）。
+
+
+def _log(message: str):
+    print(f"[{datetime.datetime.now():%H:%M:%S}] {message}", flush=True)
+
+
+def _build(logger) -> tuple:
+    tasks, calendar, gemini, state = create_components()
+    synchronizer = Synchronizer(tasks, calendar, state, gemini, logger=logger)
+    scheduler = Scheduler(tasks, calendar, state, gemini, logger=logger)
+    return synchronizer, scheduler
+
+
+def _run_daemon(args, synchronizer: Synchronizer, scheduler: Scheduler):
+    daemon = TaskManagerDaemon(
+        synchronizer, scheduler, args.start, args.end,
+        min_interval=args.min_interval, max_interval=args.max_interval, logger=_log
+    )
+    # 終了要求 (Ctrl+C / SIGTERM) を受けたら、実行中の処理が終わった時点で停止する
+    signal.signal(signal.SIGINT, lambda *_: daemon.stop())
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    daemon.run()
+
+
+def run(args):
+    synchronizer, scheduler = _build(_log)
+    if args.command == "organize":
+        synchronizer.organize_inbox()
+    elif args.command == "schedule":
+        scheduler.schedule_tasks(args.start, args.end)
+        for p_task in scheduler.pending_split_tasks:
+            _log(f"「{p_task['title']}」は分割に承認が必要なため、登録を保留しました（GUI から承認してください）。")
+    elif args.command == "undo":
+        scheduler.undo_scheduled_tasks(delete_events=args.delete_events)
+    elif args.command == "run-all":
+        synchronizer.organize_inbox()
+        scheduler.schedule_tasks(args.start, args.end)
+    elif args.command == "daemon":
+        _run_daemon(args, synchronizer, scheduler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TaskManager コマンドライン版（GUI を起動せずに実行する）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_work_hours(subparser):
+        subparser.add_argument("--start", type=int, default=6, help="予定を登録する時間帯の開始時刻 (0〜23時)")
+        subparser.add_argument("--end", type=int, default=22, help="予定を登録する時間帯の終了時刻 (1〜24時)")
+
+    subparsers.add_parser("organize", help="Inbox（■メモ）のタスクを各■リストに振り分ける")
+    add_work_hours(subparsers.add_parser("schedule", help="未スケジュールのタスクをカレンダーに登録する"))
+    undo = subparsers.add_parser("undo", help="スケジュール済みのタスクを未スケジュールの状態に戻す")
+    undo.add_argument("--delete-events", action="store_true", help="紐付いているカレンダーの予定も削除する")
+    add_work_hours(subparsers.add_parser("run-all", help="振り分けとスケジューリングを続けて実行する"))
+    daemon = subparsers.add_parser("daemon", help="常駐して、新着・変更されたタスクのみを定期的に振り分け・スケジューリングする")
+    add_work_hours(daemon)
+    daemon.add_argument("--min-interval", type=float, default=None,
+                        help=f"変更を確認する最短の間隔（秒, 既定: {Config.DAEMON_MIN_INTERVAL_SECONDS:.0f}）")
+    daemon.add_argument("--max-interval", type=float, default=None,
+                        help=f"変更が無い間に広げる間隔の上限（秒, 既定: {Config.DAEMON_MAX_INTERVAL_SECONDS:.0f}）")
+    args = parser.parse_args()
+    if getattr(args, "start", None) is not None and not 0 <= args.start < args.end <= 24:
+        parser.error(f"設定された時間帯が不正です（開始 {args.start}時 / 終了 {args.end}時）。")
+
+    try:
+        with InstanceLock.for_account():
+            run(args)
+    except InstanceLockError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,15 @@
-import os.path
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
+import datetime
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING
 from config.config import Config
+from src.logic.instance_lock import InstanceLock
+
+# google-auth のモジュールは読み込みに時間がかかるため、認証を行う時点で読み込む
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
 
 # Google Tasks と Calendar のデータを読み書きするために必要なスコープを定義
 SCOPES = [
@@ -12,43 +19,162 @@ SCOPES = [
 
 class GoogleAuth:
     """
-    Google API にアクセスするための認証を管理するクラス。
-    ユーザーにブラウザでOAuth認証を求め、結果のトークンを使い回す処理を担当する。
+    Google API にアクセスするための認証を管理するクラス（1つのインスタンスを全アダプタ・全スレッドで共有する）。
+    - 保存されているトークン (token.json) を読み込み、無い・使えない場合はブラウザでOAuth認証を求める
+    - アクセストークンは有効期限の AUTH_REFRESH_MARGIN_SECONDS 秒前に、バックグラウンドのタイマーで更新する
+      （認証情報オブジェクトをその場で更新するため、共有している全サービスがそのまま新しいトークンを使い、
+      　API呼び出しがトークンの更新を待つことはない）
+    - token.json の読み書きはロックファイルでプロセス間の排他を行い、書き込みは一時ファイルからの置き換えで行う
+      （別のプロセスが先に更新していた場合は、更新せずにそのトークンを取り込む）
     """
-    def __init__(self):
+    def __init__(self, token_file=None, logger=print):
+        self.token_file = Path(token_file or Config.TOKEN_CACHE_FILE)
         self.creds = None
+        self.log = logger
+        # 認証情報の読み込み・更新はスレッド間でも排他する
+        self._lock = threading.RLock()
+        self._timer = None
+
+    def _file_lock(self) -> InstanceLock:
+        return InstanceLock(Config.DATA_DIR / "locks" / f"{self.token_file.name}.lock", blocking=True)
 
-    def authenticate(self) -> Credentials:
+    def authenticate(self) -> "Credentials":
         """
         保存されているトークン (token.json) をロードし、有効性を確認する。
         有効なトークンが無い場合、または期限切れの場合はブラウザを開いて認証を行う。
+        既に有効な認証情報を保持している場合は、トークンファイルを読み直さずにそれを返す（アダプタ間で共有する）。
         """
-        # トークンファイルが存在する場合、ロードを試みる
-        if os.path.exists(Config.TOKEN_CACHE_FILE):
-            self.creds = Credentials.from_authorized_user_file(Config.TOKEN_CACHE_FILE, SCOPES)
-            
-        # クレデンシャルが存在しない、または無効な場合の再取得＆保存
-        if not self.creds or not self.creds.valid:
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                # リフレッシュトークンで新しいアクセストークンを取得
-                try:
-                    self.creds.refresh(Request())
-                except Exception:
-                    # リフレッシュに失敗したら新規取得へ
-                    self.creds = None
-            if not self.creds:
+        with self._lock:
+            if self.creds and self.creds.valid:
+                return self.creds
+
+            # トークンファイルが存在する場合、ロードを試み、期限切れならリフレッシュトークンで更新する
+            with self._file_lock():
+                creds = self._load_token_file()
+                if creds and not creds.valid and creds.refresh_token:
+                    try:
+                        self._refresh(creds)
+                    except Exception:
+                        # リフレッシュに失敗したら新規取得へ
+                        creds = None
+
+            if not creds or not creds.valid:
                 # ユーザーの操作（ブラウザ）を要求して新しい認証を行う
                 # ※事前に client_secret_*.json を credentials.json 等にリネームして配置が必要
                 if not os.path.exists(Config.CREDENTIALS_FILE):
                     raise FileNotFoundError(
                         f"認証情報ファイルが見つかりません。Google Cloud ConsoleからOAuth設定をダウンロードし、以下のパスに「credentials.json」として配置してください。\\nパス: {Config.CREDENTIALS_FILE}"
                     )
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 flow = InstalledAppFlow.from_client_secrets_file(
                     Config.CREDENTIALS_FILE, SCOPES)
-                self.creds = flow.run_local_server(port=0)
-                
-            # 認証後、次回の実行のためにトークンをファイルに保存
-            with open(Config.TOKEN_CACHE_FILE, 'w', encoding='utf-8') as token_file:
-                token_file.write(self.creds.to_json())
+                creds = flow.run_local_server(port=0)
+                # 認証後、次回の実行のためにトークンをファイルに保存
+                with self._file_lock():
+                    self._save(creds)
+
+            self._adopt(creds)
+            self._schedule_refresh()
+            return self.creds
+
+    def _load_token_file(self):
+        from google.oauth2.credentials import Credentials
+        if not os.path.exists(self.token_file):
+            return None
+        try:
+            return Credentials.from_authorized_user_file(str(self.token_file), SCOPES)
+        except ValueError:
+            # 壊れた・必要な項目が無いトークンは使わずに新規取得する
+            return None
+
+    def _refresh(self, creds):
+        """
+        リフレッシュトークンで新しいアクセストークンを取得し、トークンファイルに保存する（ファイルのロック中に呼ぶこと）。
+        """
+        from google.auth.transport.requests import Request
+        creds.refresh(Request())
+        self._save(creds)
+
+    def _save(self, creds):
+        """
+        トークンを一時ファイルに書き出してから置き換える（書き込み途中のファイルを他のプロセスが読むことはない）。
+        """
+        os.makedirs(self.token_file.parent, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.token_file.parent, prefix=f".{self.token_file.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as token_file:
+                token_file.write(creds.to_json())
+                token_file.flush()
+                os.fsync(token_file.fileno())
+            os.replace(temp_path, self.token_file)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
 
-        return self.creds
+    def _adopt(self, creds):
+        """
+        取得した認証情報を共有中の認証情報として保持する。
+        各サービスは最初に渡されたオブジェクトを参照し続けるため、2回目以降は（再認証等でリフレッシュトークンが
+        変わった場合も含めて）そのオブジェクトのトークン・有効期限・リフレッシュトークンをその場で差し替える。
+        """
+        if self.creds is None or creds is self.creds:
+            self.creds = creds
+            return
+        self.creds.token = creds.token
+        self.creds.expiry = creds.expiry
+        # google-auth はリフレッシュトークン等の更新用のプロパティを持たないため、属性を直接差し替える
+        self.creds._refresh_token = creds.refresh_token
+        self.creds._id_token = creds.id_token
+
+    @staticmethod
+    def _seconds_until_expiry(creds) -> float:
+        # google-auth の有効期限はタイムゾーン無しの UTC で保持されている
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (creds.expiry - now).total_seconds()
+
+    def _schedule_refresh(self, delay: float = None):
+        """
+        アクセストークンの更新タイマーを設定する（delay 省略時は有効期限の AUTH_REFRESH_MARGIN_SECONDS 秒前）。
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.creds or not self.creds.refresh_token or not self.creds.expiry:
+                return
+            if delay is None:
+                delay = max(0.0, self._seconds_until_expiry(self.creds) - Config.AUTH_REFRESH_MARGIN_SECONDS)
+            self._timer = threading.Timer(delay, self._refresh_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _refresh_in_background(self):
+        """
+        タイマーから呼ばれ、アクセストークンを更新して次の更新を予約する。
+        失敗した場合は AUTH_REFRESH_RETRY_SECONDS 秒後に再試行する
+        （その間に期限が切れた場合も、API呼び出し側で従来どおり更新される）。
+        """
+        with self._lock:
+            try:
+                with self._file_lock():
+                    stored = self._load_token_file()
+                    if stored and stored.valid and self._seconds_until_expiry(stored) > Config.AUTH_REFRESH_MARGIN_SECONDS:
+                        # 別のプロセスが既に更新したトークンを取り込む
+                        self._adopt(stored)
+                    else:
+                        self._refresh(self.creds)
+            except Exception as e:
+                self.log(f"アクセストークンの更新に失敗しました。{Config.AUTH_REFRESH_RETRY_SECONDS:.0f}秒後に再試行します: {e}")
+                self._schedule_refresh(Config.AUTH_REFRESH_RETRY_SECONDS)
+                return
+            self._schedule_refresh()
+
+    def close(self):
+        """
+        バックグラウンドの更新タイマーを停止する。
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
@@ -0,0 +1,44 @@
+from config.config import Config
+from src.logic.state_manager import StateManager
+from src.logic import instrumentation
+
+
+def create_components(auth=None, backend: str = None) -> tuple:
+    """
+    設定されたバックエンドに応じて (TasksAdapter, CalendarAdapter, GeminiAdapter, StateManager) を生成する。
+    - "google": 実際の Google Tasks / Calendar / Gemini API に接続する（auth 省略時は GoogleAuth を用いる）
+    - "simulation": 通信を行わない模擬サービスに接続し、状態もメモリ上にのみ保持する
+    """
+    backend = backend or Config.BACKEND
+    if backend == "simulation":
+        from src.logic.simulation import SimulatedWorkspace
+        workspace = SimulatedWorkspace(
+            latency_seconds=Config.SIMULATION_LATENCY_MS / 1000,
+            quota_error_every=Config.SIMULATION_QUOTA_ERROR_EVERY,
+            seed=Config.SIMULATION_SEED
+        )
+        workspace.populate(Config.SIMULATION_TASKS)
+        tasks_adapter, calendar_adapter, gemini_adapter = workspace.create_adapters()
+        return tasks_adapter, calendar_adapter, gemini_adapter, StateManager(":memory:")
+    if backend != "google":
+        raise ValueError(f"未知のバックエンドが指定されました: {backend}（google または simulation を指定してください）")
+
+    # 各段階の所要時間は、起動時の計測 (instrumentation.begin_run) に記録される
+    with instrumentation.span("import_adapters"):
+        from src.logic.auth import GoogleAuth
+        from src.logic.tasks_adapter import TasksAdapter
+        from src.logic.calendar_adapter import CalendarAdapter
+        from src.logic.gemini_adapter import GeminiAdapter
+    # 認証は1度だけ行い、各アダプタで認証情報を共有する
+    auth = auth or GoogleAuth()
+    with instrumentation.span("authenticate"):
+        auth.authenticate()
+    with instrumentation.span("tasks_adapter"):
+        tasks_adapter = TasksAdapter(auth)
+    with instrumentation.span("calendar_adapter"):
+        calendar_adapter = CalendarAdapter(auth)
+    with instrumentation.span("gemini_adapter"):
+        gemini_adapter = GeminiAdapter()
+    with instrumentation.span("state_manager"):
+        state = StateManager()
+    return tasks_adapter, calendar_adapter, gemini_adapter, state
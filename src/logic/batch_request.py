@@ -0,0 +1,96 @@
+import time
+from src.logic import instrumentation
+from src.logic.rate_limiter import RateLimiter, get_limiter, is_retryable_error, is_throttle_error, retry_after_seconds
+
+
+class BatchRequestQueue:
+    """
+    Google API へのリクエストをキューに積み、バッチHTTPリクエスト（1回の通信で最大50件）にまとめて送信するクラス。
+    操作ごとの結果・エラーを積んだ順に返し、一時的なエラー（429/5xx、通信エラー）で失敗した操作のみを再送する。
+    作成 (insert) 等の冪等でない操作は、サーバー側で作成済みの場合に重複しないよう、レート制限エラーの場合のみ再送する。
+    再送の間隔とレート制限は RateLimiter（サービスごとに共有）に従う。
+    """
+    # Google API のバッチリクエスト1回に含められる操作数の上限
+    MAX_BATCH_SIZE = 50
+
+    def __init__(self, service_getter, max_retries: int = None, limiter: RateLimiter = None):
+        # service_getter: 実行スレッド用のサービスオブジェクトを返す関数
+        # max_retries: 再送回数（省略時は limiter の設定に従う）
+        self.service_getter = service_getter
+        self.limiter = limiter or get_limiter("batch")
+        self.max_retries = self.limiter.max_retries if max_retries is None else max_retries
+        self._factories = []
+        # 操作ごとの冪等性（False の操作はレート制限エラーの場合のみ再送する）
+        self._idempotent = []
+
+    def __len__(self) -> int:
+        return len(self._factories)
+
+    def add(self, request_factory, idempotent: bool = True) -> int:
+        """
+        リクエストを生成する関数 (service -> HttpRequest) をキューに追加し、結果配列上の番号を返す。
+        再送時にリクエストを作り直せるよう、リクエストそのものではなく生成関数を受け取る。
+        作成など、2回実行すると結果が重複する操作は idempotent=False を指定する。
+        """
+        self._factories.append(request_factory)
+        self._idempotent.append(idempotent)
+        return len(self._factories) - 1
+
+    @classmethod
+    def is_retryable(cls, error: Exception, idempotent: bool = True) -> bool:
+        """
+        再送で回復が見込めるエラーかどうかを判定する。
+        """
+        return is_retryable_error(error, idempotent)
+
+    def _send(self, indexes: list, results: list):
+        """
+        指定した番号の操作を最大50件ずつのバッチで送信し、results に結果を書き込む。
+        """
+        service = self.service_getter()
+        for offset in range(0, len(indexes), self.MAX_BATCH_SIZE):
+            chunk = indexes[offset:offset + self.MAX_BATCH_SIZE]
+
+            def callback(request_id, response, exception):
+                results[int(request_id)] = {
+                    "ok": exception is None,
+                    "response": response if exception is None else None,
+                    "error": exception,
+                }
+
+            batch = service.new_batch_http_request(callback=callback)
+            for index in chunk:
+                batch.add(self._factories[index](service), request_id=str(index))
+            try:
+                batch.execute()
+            except Exception as e:
+                # バッチ通信自体が失敗した場合は、チャンク内の全操作を失敗扱いにする
+                for index in chunk:
+                    results[index] = {"ok": False, "response": None, "error": e}
+
+    def execute(self) -> list:
+        """
+        キューに積んだ全操作を送信し、積んだ順の結果配列を返す。
+        各要素は {"ok": 成否, "response": レスポンス, "error": 例外} の辞書。
+        """
+        results = [None] * len(self._factories)
+        pending = list(range(len(self._factories)))
+        for attempt in range(self.max_retries + 1):
+            if not pending:
+                break
+            if attempt > 0:
+                # 一時的なエラーのみを、間隔を空けて再送する（Retry-After の指定があればそれ以上待つ）
+                errors = [results[i]["error"] for i in pending]
+                if any(is_throttle_error(e) for e in errors):
+                    self.limiter.on_throttled()
+                retry_after = max((retry_after_seconds(e) or 0 for e in errors), default=0)
+                instrumentation.record_retry("batch", len(pending))
+                time.sleep(self.limiter.backoff_delay(attempt, retry_after or None))
+            self._send(pending, results)
+            pending = [
+                i for i in pending
+                if not results[i]["ok"] and self.is_retryable(results[i]["error"], self._idempotent[i])
+            ]
+        self._factories = []
+        self._idempotent = []
+        return results
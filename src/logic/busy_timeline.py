@@ -0,0 +1,107 @@
+import bisect
+import datetime
+
+
+class BusyTimeline:
+    """
+    カレンダーの Busy 期間を「ソート済み・重複マージ済み」の区間列として保持するクラス。
+    freebusy の文字列は構築時に一度だけパースし、以後の空き枠探索は bisect による二分探索で行う。
+    スケジューリング1回の実行につき1つ構築し、予定を登録するたびに add() でその場更新する。
+    """
+    # 予定の開始時刻を揃える単位（分）
+    SLOT_MINUTES = 15
+
+    def __init__(self, busy_periods: list = None):
+        # 区間は互いに重ならないため、開始時刻・終了時刻の両配列がともに昇順になる
+        self._starts = []
+        self._ends = []
+        if busy_periods:
+            self._build(busy_periods)
+
+    @staticmethod
+    def parse_iso(ts) -> datetime.datetime:
+        """
+        Google API の '2023-01-01T10:00:00Z' や '+09:00' 形式の文字列を datetime に変換する。
+        既に datetime の場合はそのまま返す。
+        """
+        if isinstance(ts, datetime.datetime):
+            return ts
+        return datetime.datetime.fromisoformat(ts.replace('Z', '+00:00'))
+
+    @classmethod
+    def snap_up(cls, dt: datetime.datetime) -> datetime.datetime:
+        """
+        時刻を直後の15分単位の時刻に切り上げる（既に15分ちょうどの場合はそのまま）。
+        """
+        rem = dt.minute % cls.SLOT_MINUTES
+        if rem != 0 or dt.second != 0 or dt.microsecond != 0:
+            dt += datetime.timedelta(minutes=cls.SLOT_MINUTES - rem, seconds=-dt.second, microseconds=-dt.microsecond)
+        return dt
+
+    def _build(self, busy_periods: list):
+        """
+        freebusy 形式 ({'start': ..., 'end': ...}) の配列を一括でパース・ソート・マージする。
+        """
+        parsed = sorted(
+            (self.parse_iso(b['start']), self.parse_iso(b['end'])) for b in busy_periods
+        )
+        for start, end in parsed:
+            if end <= start:
+                continue
+            # 直前の区間と重なる（または接する）場合は結合する
+            if self._ends and start <= self._ends[-1]:
+                if end > self._ends[-1]:
+                    self._ends[-1] = end
+            else:
+                self._starts.append(start)
+                self._ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def intervals(self) -> list:
+        """
+        マージ済みの Busy 区間を (開始, 終了) のタプル配列で返す。
+        """
+        return list(zip(self._starts, self._ends))
+
+    def add(self, start, end):
+        """
+        新しく登録した予定を Busy 区間として追加し、隣接・重複する区間とその場でマージする。
+        """
+        start = self.parse_iso(start)
+        end = self.parse_iso(end)
+        if end <= start:
+            return
+        # start 以降に終わる最初の区間 〜 end 以前に始まる最後の区間までが結合対象
+        lo = bisect.bisect_left(self._ends, start)
+        hi = bisect.bisect_right(self._starts, end)
+        if lo < hi:
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi - 1])
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+
+    def find_first_fit(self, search_start: datetime.datetime, duration_minutes: int) -> tuple:
+        """
+        search_start 以降で、duration_minutes 分の予定が Busy と重ならずに入る最初の枠を探し、
+        (開始, 終了) のタプルで返す。衝突した場合は Busy 終了時刻を15分単位に切り上げて再探索する。
+        """
+        duration = datetime.timedelta(minutes=duration_minutes)
+        candidate_start = search_start
+        while True:
+            candidate_end = candidate_start + duration
+
+            # candidate_start 以前に始まる最後の区間が candidate_start をまたいでいないか
+            i = bisect.bisect_right(self._starts, candidate_start) - 1
+            if i >= 0 and candidate_start < self._ends[i]:
+                candidate_start = self.snap_up(self._ends[i])
+                continue
+
+            # candidate_start より後に始まる最初の区間が候補の終了前に始まっていないか
+            j = i + 1
+            if j < len(self._starts) and self._starts[j] < candidate_end:
+                candidate_start = self.snap_up(self._ends[j])
+                continue
+
+            return candidate_start, candidate_end
@@ -1,26 +1,54 @@
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 import datetime
+import time
+from config.config import Config
 from src.logic.auth import GoogleAuth
+from src.logic.calendar_cache import CalendarEventCache
+from src.logic.batch_request import BatchRequestQueue
+from src.logic.google_service import ThreadLocalService, build_service
+from src.logic.rate_limiter import RateLimiter, get_limiter
 
 class CalendarAdapter:
     """
     Google Calendar API と連携するためのアダプタクラス。
     空き時間の取得や、タスクを予定としてカレンダーに登録する処理を担当する。
     """
-    def __init__(self, auth: GoogleAuth):
+    def __init__(self, auth: GoogleAuth, event_cache: CalendarEventCache = None, limiter: RateLimiter = None):
         self.auth = auth
-        self.service = self._build_service()
+        self.creds = self.auth.authenticate()
+        # googleapiclient (httplib2) のサービスはスレッドセーフではないため、スレッドごとに保持する
+        # レート制限・再試行はサービス単位で共有する（既定は Config の設定による共有の RateLimiter）
+        self.limiter = limiter or get_limiter("calendar")
+        self._services = ThreadLocalService(self._build_service, "calendar", self.limiter)
+        # 呼び出し元スレッドのサービスは起動時に構築しておく
+        self._services.get()
+        # 予定のローカルキャッシュ（有効時は get_free_busy を syncToken による差分同期＋キャッシュで処理する）
+        if event_cache is None and Config.CALENDAR_CACHE_ENABLED:
+            event_cache = CalendarEventCache()
+        self.event_cache = event_cache
 
     def _build_service(self):
         # 認証情報を使用して Calendar API のサービスオブジェクトを構築
-        creds = self.auth.authenticate()
-        return build('calendar', 'v3', credentials=creds)
+        # （ディスカバリドキュメントは同梱・保存済みのものを共有し、通信せずに構築する）
+        return build_service('calendar', 'v3', self.creds)
+
+    @property
+    def service(self):
+        """
+        現在のスレッド専用の Calendar API サービスオブジェクトを返す。
+        """
+        return self._services.get()
 
     def get_free_busy(self, time_min: datetime.datetime, time_max: datetime.datetime, calendar_id: str = 'primary') -> dict:
         """
         指定した期間内の予定の入り具合 (Free/Busy 情報) を取得する。
         これにより、AIが空き時間を探してパズル的にタスクをスケジュール可能になる。
+        予定キャッシュが有効な場合は、差分同期したキャッシュから同じ形式で Busy 期間を返す。
         """
+        if self.event_cache:
+            self.sync_events(calendar_id, time_max=time_max)
+            return self.event_cache.get_busy(calendar_id, time_min, time_max)
+            
         # timeMin, timeMax は datetime オブジェクト。そのまま isoformat() に 'Z' を付けると
         # tzinfo がある場合に +09:00Z のような不正なフォーマットになることがあるため、
         # 確実にUTCに変換してからフォーマットするか、そのまま isoformat() を渡す。
@@ -45,11 +73,129 @@ class CalendarAdapter:
         # primaryカレンダーの busy 期間リストを返す
         return events_result['calendars'][calendar_id]['busy']
 
+    def sync_events(self, calendar_id: str = 'primary', time_max: datetime.datetime = None, force: bool = False) -> int:
+        """
+        予定のローカルキャッシュを最新化し、反映した予定の件数を返す。
+        - 前回の同期から一定時間以内であれば通信を行わない (force=True で強制)
+        - 通常は syncToken による差分のみを取得する
+        - 初回・一定時間経過後・保持範囲を超える期間の要求時は全件を取得し直す
+        - syncToken が失効した (410 Gone) 場合はキャッシュを破棄して全件を取得し直す
+        """
+        state = self.event_cache.get_sync_state(calendar_id)
+        now = time.time()
+        if state and not force and now - state["synced_at"] < Config.CALENDAR_CACHE_MAX_AGE_SECONDS:
+            if time_max is None or CalendarEventCache.format_utc(time_max) <= state["window_end"]:
+                return 0
+                
+        full = (
+            not state
+            or not state["sync_token"]
+            or now - state["full_synced_at"] > Config.CALENDAR_CACHE_FULL_RESYNC_HOURS * 3600
+            or (time_max is not None and CalendarEventCache.format_utc(time_max) > state["window_end"])
+        )
+        if not full:
+            try:
+                events, sync_token = self._list_events(calendar_id, sync_token=state["sync_token"])
+                self.event_cache.apply_changes(calendar_id, events, sync_token, full=False, synced_at=now)
+                return len(events)
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                print("カレンダーの同期トークンが失効したため、予定を全件取得し直します。")
+                self.event_cache.clear(calendar_id)
+                
+        # 全件取得: 直近の過去1日〜保持範囲の終わりまでを対象にする
+        now_dt = datetime.datetime.now(datetime.timezone.utc)
+        window_end = now_dt + datetime.timedelta(days=Config.CALENDAR_CACHE_HORIZON_DAYS)
+        if time_max is not None and time_max > window_end:
+            window_end = time_max
+        events, sync_token = self._list_events(
+            calendar_id,
+            time_min=now_dt - datetime.timedelta(days=1),
+            time_max=window_end
+        )
+        self.event_cache.apply_changes(
+            calendar_id, events, sync_token, full=True, synced_at=now,
+            window_end=CalendarEventCache.format_utc(window_end)
+        )
+        return len(events)
+
+    def _list_events(self, calendar_id: str, sync_token: str = None, time_min: datetime.datetime = None, time_max: datetime.datetime = None) -> tuple:
+        """
+        events.list をページネーションしながら全件取得し、(予定の配列, 次回の syncToken) を返す。
+        """
+        params = {"calendarId": calendar_id, "singleEvents": True, "maxResults": 2500}
+        if sync_token:
+            params["syncToken"] = sync_token
+        else:
+            params["timeMin"] = time_min.isoformat()
+            params["timeMax"] = time_max.isoformat()
+            
+        events = []
+        page_token = None
+        while True:
+            results = self.service.events().list(pageToken=page_token, **params).execute()
+            events.extend(results.get('items', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return events, results.get('nextSyncToken')
+
     def insert_event(self, summary: str, description: str, start_time: datetime.datetime, end_time: datetime.datetime, calendar_id: str = 'primary') -> dict:
         """
         カレンダーに新しい予定を登録する。
         スケジュール実行（Tasks -> Calendar）専用。
         """
+        event = self._insert_event_request(self.service, summary, description, start_time, end_time, calendar_id).execute()
+        if self.event_cache:
+            self.event_cache.upsert_event(calendar_id, event)
+        return event
+
+    def insert_events(self, events: list, calendar_id: str = 'primary') -> list:
+        """
+        複数の予定をバッチリクエストでまとめて登録し、登録されたイベントIDを渡された順の配列で返す。
+        events の各要素は insert_event と同じ引数名 (summary, description, start_time, end_time) を持つ辞書。
+        登録に失敗した予定のIDは None となる（エラー内容はコンソールに出力する）。
+        """
+        batch = BatchRequestQueue(lambda: self.service, limiter=self.limiter)
+        for ev in events:
+            # 予定の作成は再送すると重複するため、レート制限エラーの場合のみ再送する
+            batch.add(lambda service, ev=ev: self._insert_event_request(
+                service, ev['summary'], ev.get('description', ''), ev['start_time'], ev['end_time'], calendar_id
+            ), idempotent=False)
+        event_ids = []
+        for ev, result in zip(events, batch.execute()):
+            if result["ok"]:
+                event = result["response"] or {}
+                if self.event_cache:
+                    self.event_cache.upsert_event(calendar_id, event)
+                event_ids.append(event.get('id'))
+            else:
+                print(f"予定「{ev['summary']}」の登録に失敗しました: {result['error']}")
+                event_ids.append(None)
+        return event_ids
+
+    def delete_events(self, event_ids: list, calendar_id: str = 'primary') -> int:
+        """
+        複数の予定をバッチリクエストでまとめて削除し、削除できた（または既に削除済みだった）件数を返す。
+        削除に失敗した予定はコンソールに出力する。
+        """
+        batch = BatchRequestQueue(lambda: self.service, limiter=self.limiter)
+        for event_id in event_ids:
+            batch.add(lambda service, event_id=event_id: service.events().delete(calendarId=calendar_id, eventId=event_id))
+        deleted = 0
+        for event_id, result in zip(event_ids, batch.execute()):
+            error = result["error"]
+            # 404 / 410 は既に削除済みの予定のため、削除できたものとして扱う
+            if result["ok"] or (isinstance(error, HttpError) and error.resp.status in (404, 410)):
+                if self.event_cache:
+                    self.event_cache.delete_event(calendar_id, event_id)
+                deleted += 1
+            else:
+                print(f"予定(ID: {event_id})の削除に失敗しました: {error}")
+        return deleted
+
+    @staticmethod
+    def _insert_event_request(service, summary: str, description: str, start_time: datetime.datetime, end_time: datetime.datetime, calendar_id: str = 'primary'):
         start_str = start_time.isoformat()
         if not start_time.tzinfo:
             start_str += '+09:00'
@@ -72,4 +218,4 @@ class CalendarAdapter:
             },
         }
         
-        return self.service.events().insert(calendarId=calendar_id, body=event).execute()
+        return service.events().insert(calendarId=calendar_id, body=event)
@@ -0,0 +1,158 @@
+import datetime
+import sqlite3
+import threading
+from config.config import Config
+
+
+class CalendarEventCache:
+    """
+    Google Calendar の予定をカレンダー単位でローカルのSQLiteファイルに保持するキャッシュ。
+    Calendar API の syncToken による差分同期で最新化し、Busy 期間（freebusy 相当）をキャッシュから算出する。
+    """
+    def __init__(self, path=None):
+        self.path = path or (Config.DATA_DIR / "calendar_cache.sqlite3")
+        # 複数スレッドから利用されるため、接続は1つにしてロックで保護する
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " calendar_id TEXT NOT NULL,"
+            " event_id TEXT NOT NULL,"
+            " start_utc TEXT NOT NULL,"
+            " end_utc TEXT NOT NULL,"
+            " busy INTEGER NOT NULL,"
+            " PRIMARY KEY (calendar_id, event_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_events_range ON events (calendar_id, start_utc, end_utc)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state ("
+            " calendar_id TEXT PRIMARY KEY,"
+            " sync_token TEXT,"
+            " window_end TEXT NOT NULL,"
+            " full_synced_at REAL NOT NULL,"
+            " synced_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def format_utc(dt: datetime.datetime) -> str:
+        """
+        datetime を文字列比較で前後関係が判定できる UTC の ISO 形式に変換する。
+        """
+        return dt.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    @classmethod
+    def _event_time(cls, value: dict) -> str:
+        """
+        予定の start / end ({'dateTime': ...} または終日予定の {'date': ...}) を UTC 文字列に変換する。
+        終日予定の日付は日本時間の 0 時として扱う。
+        """
+        if value.get('dateTime'):
+            return cls.format_utc(datetime.datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00')))
+        jst_tz = datetime.timezone(datetime.timedelta(hours=9))
+        day = datetime.date.fromisoformat(value['date'])
+        return cls.format_utc(datetime.datetime.combine(day, datetime.time(0, 0), tzinfo=jst_tz))
+
+    @staticmethod
+    def _is_busy(event: dict) -> bool:
+        """
+        freebusy と同様に、「予定なし(transparent)」や自分が辞退した予定は Busy として扱わない。
+        """
+        if event.get('transparency') == 'transparent':
+            return False
+        for attendee in event.get('attendees', []):
+            if attendee.get('self') and attendee.get('responseStatus') == 'declined':
+                return False
+        return True
+
+    def _apply_event(self, calendar_id: str, event: dict):
+        if event.get('status') == 'cancelled' or 'start' not in event or 'end' not in event:
+            self._conn.execute(
+                "DELETE FROM events WHERE calendar_id = ? AND event_id = ?", (calendar_id, event['id'])
+            )
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO events (calendar_id, event_id, start_utc, end_utc, busy) VALUES (?, ?, ?, ?, ?)",
+            (
+                calendar_id, event['id'], self._event_time(event['start']), self._event_time(event['end']),
+                1 if self._is_busy(event) else 0
+            )
+        )
+
+    def get_sync_state(self, calendar_id: str) -> dict:
+        """
+        カレンダーの同期状態 (sync_token, window_end, full_synced_at, synced_at) を返す。未同期の場合は None。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sync_token, window_end, full_synced_at, synced_at FROM sync_state WHERE calendar_id = ?",
+                (calendar_id,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"sync_token": row[0], "window_end": row[1], "full_synced_at": row[2], "synced_at": row[3]}
+
+    def apply_changes(self, calendar_id: str, events: list, sync_token: str, full: bool, synced_at: float, window_end: str = None):
+        """
+        APIから取得した予定（全件または差分）を反映し、次回の syncToken を記録する。
+        full=True の場合は、カレンダーの既存データを置き換える。
+        """
+        with self._lock:
+            if full:
+                self._conn.execute("DELETE FROM events WHERE calendar_id = ?", (calendar_id,))
+            for event in events:
+                self._apply_event(calendar_id, event)
+            if full:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sync_state (calendar_id, sync_token, window_end, full_synced_at, synced_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (calendar_id, sync_token, window_end, synced_at, synced_at)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE sync_state SET sync_token = ?, synced_at = ? WHERE calendar_id = ?",
+                    (sync_token, synced_at, calendar_id)
+                )
+            self._conn.commit()
+
+    def clear(self, calendar_id: str):
+        """
+        カレンダーのキャッシュと同期状態を破棄する（syncToken 失効時など）。
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM events WHERE calendar_id = ?", (calendar_id,))
+            self._conn.execute("DELETE FROM sync_state WHERE calendar_id = ?", (calendar_id,))
+            self._conn.commit()
+
+    def upsert_event(self, calendar_id: str, event: dict):
+        """
+        本アプリ自身が登録した予定を即座にキャッシュへ反映する（書き込みスルー）。
+        """
+        if not event or 'id' not in event:
+            return
+        with self._lock:
+            self._apply_event(calendar_id, event)
+            self._conn.commit()
+
+    def delete_event(self, calendar_id: str, event_id: str):
+        """
+        本アプリ自身が削除した予定を即座にキャッシュから取り除く。
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM events WHERE calendar_id = ? AND event_id = ?", (calendar_id, event_id)
+            )
+            self._conn.commit()
+
+    def get_busy(self, calendar_id: str, time_min: datetime.datetime, time_max: datetime.datetime) -> list:
+        """
+        指定期間と重なる Busy 期間を、freebusy API と同じ形式 ([{'start': ..., 'end': ...}]) で返す。
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT start_utc, end_utc FROM events"
+                " WHERE calendar_id = ? AND busy = 1 AND start_utc < ? AND end_utc > ?"
+                " ORDER BY start_utc",
+                (calendar_id, self.format_utc(time_max), self.format_utc(time_min))
+            ).fetchall()
+        return [{'start': row[0], 'end': row[1]} for row in rows]
@@ -0,0 +1,103 @@
+import threading
+import traceback
+from config.config import Config
+from src.logic.synchronizer import Synchronizer
+from src.logic.scheduler import Scheduler
+
+
+class TaskManagerDaemon:
+    """
+    常駐モードで、Inbox の振り分けとスケジューリングを定期的に差分実行するクラス。
+    - アダプタ（認証・API クライアント・各種キャッシュ）は起動時に1度だけ生成したものを使い回す
+    - 毎回の確認は Inbox と処理対象リストのタスク一覧の取得のみ（ローカルミラーが有効なら差分同期）で行う
+    - 前回の確認以降に追加・変更されたタスクのみを振り分け・スケジューリングの対象とする
+      （振り分け先が見つからずに Inbox に残ったタスクや、登録できなかったタスクは、変更されるまで再処理しない）
+    - 変更が無い間は確認の間隔を最大値まで倍々に広げ、変更を検知したら最小値に戻す
+    """
+    def __init__(
+        self,
+        synchronizer: Synchronizer,
+        scheduler: Scheduler,
+        work_start_hour: int = 6,
+        work_end_hour: int = 22,
+        min_interval: float = None,
+        max_interval: float = None,
+        logger=print
+    ):
+        self.synchronizer = synchronizer
+        self.scheduler = scheduler
+        self.work_start_hour = work_start_hour
+        self.work_end_hour = work_end_hour
+        self.min_interval = Config.DAEMON_MIN_INTERVAL_SECONDS if min_interval is None else min_interval
+        self.max_interval = max(self.min_interval, Config.DAEMON_MAX_INTERVAL_SECONDS if max_interval is None else max_interval)
+        self.log = logger
+        # 処理済みのタスク {タスクID: 更新日時}（更新日時が変わったタスクは再び処理対象とする）
+        self._seen_inbox = {}
+        self._seen_unscheduled = {}
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _snapshot(tasks: list) -> dict:
+        return {task['id']: task.get('updated') for task in tasks}
+
+    @staticmethod
+    def _changed_ids(snapshot: dict, seen: dict) -> list:
+        return [task_id for task_id, updated in snapshot.items() if task_id not in seen or seen[task_id] != updated]
+
+    def run_once(self) -> bool:
+        """
+        変更の確認と差分処理を1回行い、処理対象のタスクがあった場合は True を返す。
+        """
+        processed = False
+
+        # 1. Inbox の新着タスクを振り分ける
+        inbox = self._snapshot(self.synchronizer.get_inbox_tasks())
+        new_inbox = self._changed_ids(inbox, self._seen_inbox)
+        if new_inbox:
+            self.log(f"Inbox に新着・変更されたタスクが {len(new_inbox)} 件あります。")
+            self.synchronizer.organize_inbox(task_ids=new_inbox)
+            processed = True
+            inbox = self._snapshot(self.synchronizer.get_inbox_tasks())
+        self._seen_inbox = inbox
+
+        # 2. 新たに未スケジュールとなったタスク（振り分けで移動したタスクを含む）を登録する
+        unscheduled = self._snapshot([task for _, task in self.scheduler.get_unscheduled_tasks()])
+        new_unscheduled = self._changed_ids(unscheduled, self._seen_unscheduled)
+        if new_unscheduled:
+            self.log(f"未スケジュールのタスクが {len(new_unscheduled)} 件あります。")
+            self.scheduler.schedule_tasks(self.work_start_hour, self.work_end_hour, task_ids=new_unscheduled)
+            processed = True
+            self._report_pending_splits()
+            unscheduled = self._snapshot([task for _, task in self.scheduler.get_unscheduled_tasks()])
+        self._seen_unscheduled = unscheduled
+        return processed
+
+    def _report_pending_splits(self):
+        """
+        常駐モードでは過剰分割の承認ができないため、承認待ちのタスクはログに出力して保留を解除する。
+        （タスク自体は未スケジュールのまま残るため、GUI からスケジューリングを実行すると再び承認待ちになる）
+        """
+        for p_task in self.scheduler.drain_pending_splits():
+            subtasks = p_task["analysis"].get("recommended_subtasks", [])
+            self.log(f"  -> 「{p_task['title']}」は {len(subtasks)} 個への分割に承認が必要なため、登録を保留しました（GUI から承認してください）。")
+
+    def run(self):
+        """
+        stop() が呼ばれるまで、変更の確認と差分処理を繰り返す。
+        処理中にエラーが発生した場合はログに出力し、間隔を広げて次回に再試行する。
+        """
+        interval = self.min_interval
+        self.log(f"常駐モードを開始しました。（確認間隔: {self.min_interval:.0f}〜{self.max_interval:.0f}秒）")
+        while not self._stop.is_set():
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                self.log(f"常駐処理中にエラーが発生しました: {e}")
+                traceback.print_exc()
+                processed = False
+            interval = self.min_interval if processed else min(self.max_interval, interval * 2)
+            self._stop.wait(interval)
+        self.log("常駐モードを終了しました。")
+
+    def stop(self):
+        self._stop.set()
@@ -1,9 +1,29 @@
 import warnings
 warnings.filterwarnings("ignore", category=FutureWarning, module="google.generativeai")
-import google.generativeai as genai
 import os
+import re
+import json
 import time
-from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+from concurrent.futures import ThreadPoolExecutor
+from config.config import Config
+from src.logic.llm_cache import LLMCache
+from src.logic import instrumentation
+from src.logic.rate_limiter import get_limiter
+
+def _genai():
+    """
+    google.generativeai を初回の利用時に読み込む（読み込みに時間がかかるため、起動時には読み込まない）。
+    """
+    import google.generativeai as genai
+    return genai
+
+
+def preload():
+    """
+    google.generativeai を先に読み込んでおく（画面の表示後にバックグラウンドで呼び、初回の処理を待たせないため）。
+    """
+    _genai()
+
 
 class GeminiAdapter:
     """
@@ -11,6 +31,22 @@ class GeminiAdapter:
     タスク名やメモから、重要度・緊急度・所要時間・場所などの「タスクの属性」を推定したり、
     所要時間が長いタスクをサブタスクに分割する役割を担う。
     """
+    # 処理種別ごとのプロンプトの版。プロンプトのテンプレートを変更した場合は版を上げること
+    # （キャッシュキーに含まれるため、古い版で得た応答は再利用されなくなる）
+    PROMPT_VERSIONS = {
+        "analyze": "1",   # analyze_task / analyze_tasks_batch (タスク単位で共有)
+        "sort": "1",      # sort_tasks_order
+        "classify": "2",  # Inbox の振り分け (Synchronizer)
+    }
+
+    # 処理種別ごとに用いるモデル（Config で変更できる）
+    MODEL_ROUTES = {
+        "raw": Config.GEMINI_MODEL,
+        "analyze": Config.GEMINI_MODEL_ANALYZE,
+        "sort": Config.GEMINI_MODEL_SORT,
+        "classify": Config.GEMINI_MODEL_CLASSIFY,
+    }
+
     def __init__(self):
         # APIキーは環境変数から取得するか、Config経由で取得する
         api_key = os.environ.get("GEMINI_API_KEY") or os.environ.get("GOOGLE_API_KEY")
@@ -22,31 +58,150 @@ class GeminiAdapter:
             )
         
         # APIバージョンの指定 (v1beta -> v1)
-        genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': 'generativelanguage.googleapis.com'})
+        _genai().configure(api_key=api_key, transport='rest', client_options={'api_endpoint': 'generativelanguage.googleapis.com'})
         
-        # モデルの初期化 (gemini-2.5-pro を想定)
-        self.model = genai.GenerativeModel('gemini-2.5-pro')
+        # モデルの初期化（既定のモデル。処理種別ごとのモデルは MODEL_ROUTES に従い必要時に生成する）
+        self.model_name = Config.GEMINI_MODEL
+        self._models = {}
+        self.model = self._get_model(self.model_name)
+        # レート制限・再試行（429 / 5xx は指数バックオフで再試行する）
+        self.limiter = get_limiter("gemini")
+        
+        # 同じ問い合わせの応答を再利用するためのディスクキャッシュ
+        self.cache = None
+        if Config.LLM_CACHE_ENABLED:
+            self.cache = LLMCache()
+            # プロンプトの版が変わったキャッシュや期限切れのキャッシュは起動時に削除する
+            self.cache.invalidate_stale_versions(self.PROMPT_VERSIONS)
+
+    def _create_model(self, model_name: str):
+        return _genai().GenerativeModel(model_name)
 
-    def generate_content_with_retry(self, prompt: str, max_retries: int = 3) -> any:
+    def _get_model(self, model_name: str):
         """
-        503等の容量不足エラーに対応するため、リトライ処理を挟んでAIによる生成を行う。
+        モデル名に対応する GenerativeModel を返す（未生成なら生成して保持する）。
         """
-        for count in range(max_retries):
+        model = self._models.get(model_name)
+        if model is None:
+            model = self._models[model_name] = self._create_model(model_name)
+        return model
+
+    def model_for(self, operation: str) -> str:
+        """
+        処理種別に対応するモデル名を返す。
+        """
+        return self.MODEL_ROUTES.get(operation) or self.model_name
+
+    def cache_lookup(self, operation: str, payload):
+        """
+        処理種別と入力内容に対応するキャッシュ済みの結果を返す（無ければ None）。
+        """
+        if not self.cache:
+            return None
+        return self.cache.get(LLMCache.make_key(self.model_for(operation), operation, self.PROMPT_VERSIONS[operation], payload))
+
+    def cache_store(self, operation: str, payload, value):
+        """
+        処理種別と入力内容に対応する結果をキャッシュに保存する。
+        """
+        if not self.cache:
+            return
+        version = self.PROMPT_VERSIONS[operation]
+        self.cache.set(LLMCache.make_key(self.model_for(operation), operation, version, payload), value, operation, version)
+
+    def cache_stats(self) -> dict:
+        """
+        キャッシュのヒット数・ミス数・保存件数を返す（キャッシュ無効時は None）。
+        """
+        return self.cache.stats() if self.cache else None
+
+    def generate_content_with_retry(self, prompt: str, max_retries: int = None,
+                                    operation: str = "raw", model_name: str = None) -> any:
+        """
+        レート制限（429）や容量不足（503）等の一時的なエラーに対応するため、
+        RateLimiter による送信レートの調整と指数バックオフでの再試行を挟んでAIによる生成を行う。
+        応答はキャッシュしない（呼び出し元が解析・検証した結果を、処理種別ごとのキーでキャッシュする）。
+        operation: 処理種別（使用するモデルの選択と計測の集計単位）/ model_name: モデルを明示する場合に指定
+        """
+        try:
+            response = self.limiter.call(
+                self._timed_generate, prompt, operation, model_name or self.model_for(operation), max_retries=max_retries
+            )
+        except Exception as e:
+            # リトライ不可なエラー、または最大リトライ到達時
+            print(f"Gemini APIリクエストエラー: {e}")
+            raise e
+        return response
+
+    def generate_parsed(self, prompt: str, operation: str, parse) -> tuple:
+        """
+        処理種別に対応する（高速な）モデルで生成し、parse(応答本文) で解析した (結果, 十分な品質か) を返す。
+        parse は (結果, 十分な品質か) を返す関数で、解析できない場合は例外を送出してよい。
+        解析できない・品質が不十分な場合は、GEMINI_ESCALATION_MODEL で1回だけ再実行する
+        （1回目に GEMINI_ESCALATION_MAX_SECONDS 秒以上かかった場合は再実行しない）。
+        再実行しない・再実行でも不十分な場合は最後の結果を (結果, False) として返し、解析できなければ例外を送出する。
+        （呼び出し元は品質が不十分な結果をキャッシュしないこと）
+        API のエラーはそのまま送出する。
+        """
+        models = [self.model_for(operation)]
+        if Config.GEMINI_ESCALATION_MODEL and Config.GEMINI_ESCALATION_MODEL not in models:
+            models.append(Config.GEMINI_ESCALATION_MODEL)
+        started = time.perf_counter()
+        for index, model_name in enumerate(models):
+            response = self.generate_content_with_retry(prompt, operation=operation, model_name=model_name)
+            is_last = index == len(models) - 1 or time.perf_counter() - started >= Config.GEMINI_ESCALATION_MAX_SECONDS
             try:
-                return self.model.generate_content(prompt)
+                result, ok = parse(response.text)
             except Exception as e:
-                error_msg = str(e)
-                # 503 Unavailable や Capacity Exhausted に対処
-                if "503" in error_msg or "UNAVAILABLE" in error_msg or "CAPACITY" in error_msg.upper():
-                    if count < max_retries - 1:
-                        sleep_time = (count + 1) * 15 # 15秒, 30秒と待機時間を増やす
-                        print(f"Gemini APIが混雑しています(503)。{sleep_time}秒後にリトライします... ({count+1}/{max_retries})")
-                        time.sleep(sleep_time)
-                        continue
-                # リトライ不可なエラー、または最大リトライ到達時
-                print(f"Gemini APIリクエストエラー: {e}")
-                raise e
+                if is_last:
+                    raise
+                reason = f"応答を解析できませんでした ({e})"
+            else:
+                if ok or is_last:
+                    return result, ok
+                reason = "応答が不完全でした"
+            print(f"Gemini ({model_name}) の{reason}。{models[index + 1]} で再実行します。")
+            instrumentation.record_retry(f"gemini.{operation}.escalation")
+
+    @staticmethod
+    def parse_json_response(text: str):
+        """
+        応答本文から JSON を取り出して解析する（Markdownのコードブロックで囲まれている場合に対処）。
+        """
+        match = re.search(r'```(?:json)?\s*(.*?)\s*```', text, re.DOTALL)
+        if match:
+            text = match.group(1)
+        return json.loads(text)
 
+    def _timed_generate(self, prompt: str, operation: str = "raw", model_name: str = None):
+        """
+        1回の生成リクエストを実行し、所要時間・プロンプト/応答の文字数・トークン使用量を
+        処理種別・モデルごと（gemini.<処理種別>.<モデル名>）に計測に記録する。
+        """
+        model_name = model_name or self.model_for(operation)
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self._get_model(model_name).generate_content(prompt)
+            return response
+        finally:
+            usage = getattr(response, "usage_metadata", None)
+            tokens = None
+            if usage is not None:
+                tokens = {
+                    "prompt": getattr(usage, "prompt_token_count", 0),
+                    "response": getattr(usage, "candidates_token_count", 0),
+                    "total": getattr(usage, "total_token_count", 0),
+                }
+            try:
+                response_bytes = len(response.text or "") if response is not None else 0
+            except Exception:
+                # 安全フィルタ等で本文が無い応答は .text の参照で例外となる
+                response_bytes = 0
+            instrumentation.record_call(
+                f"gemini.{operation}.{model_name}", started, time.perf_counter(), response is not None,
+                request_bytes=len(prompt), response_bytes=response_bytes, tokens=tokens
+            )
 
     def analyze_task(self, title: str, notes: str) -> dict:
         """
@@ -66,38 +221,184 @@ class GeminiAdapter:
 }}
 所要時間が60分を超えるか、工程が複数ある場合は recommended_subtasks に分割したタスク名を含めてください。
 '''
-        # AIに問い合わせ (リトライ付き)
-        try:
-            response = self.generate_content_with_retry(prompt)
-        except Exception:
-            return {
-                "duration_minutes": 30,
-                "importance": 3,
-                "location": None,
-                "recommended_subtasks": []
-            }
+        cache_payload = {"title": title, "notes": notes}
+        cached = self.cache_lookup("analyze", cache_payload)
+        if cached is not None:
+            return cached
         
-        # JSONのパース処理 (簡易的な抽出)
+        # AIに問い合わせ (リトライ付き。解析できない応答は上位のモデルで再実行する)
+        def parse(text):
+            result = self.parse_json_response(text)
+            return result, self._normalize_analysis(result) is not None
+
         try:
-            import json
-            import re
-            
-            # Markdownのコードブロックなどで囲まれている場合に対処
-            text = response.text
-            match = re.search(r'```(?:json)?\s*(.*?)\s*```', text, re.DOTALL)
-            if match:
-                text = match.group(1)
-                
-            return json.loads(text)
+            result, _ = self.generate_parsed(prompt, "analyze", parse)
         except Exception as e:
-            print(f"Gemini解析エラー: {e}\nRaw Response: {response.text}")
+            print(f"Gemini解析エラー: {e}")
             # 解析失敗時のデフォルト値
-            return {
-                "duration_minutes": 30,
-                "importance": 3,
-                "location": None,
-                "recommended_subtasks": []
-            }
+            return self._default_analysis()
+        analysis = self._normalize_analysis(result)
+        if analysis is None:
+            # 形式が不正な結果はキャッシュせず、デフォルト値を用いる（次回に再分析させる）
+            print("Gemini解析エラー: 応答の形式が不正なため、デフォルト値を使用します。")
+            return self._default_analysis()
+        self.cache_store("analyze", cache_payload, analysis)
+        return analysis
+
+    @staticmethod
+    def _default_analysis() -> dict:
+        """
+        タスク分析に失敗した場合に用いるデフォルトの分析結果。
+        """
+        return {
+            "duration_minutes": 30,
+            "importance": 3,
+            "location": None,
+            "recommended_subtasks": []
+        }
+
+    @staticmethod
+    def _normalize_analysis(entry) -> dict:
+        """
+        一括分析の1件分の結果を検証し、欠けている項目をデフォルト値で補完して返す。
+        形式が不正な場合は None を返す（呼び出し元でデフォルト値にフォールバックする）。
+        """
+        if not isinstance(entry, dict):
+            return None
+        try:
+            duration = int(float(entry.get("duration_minutes", 30)))
+        except (TypeError, ValueError):
+            return None
+        subtasks = entry.get("recommended_subtasks") or []
+        if not isinstance(subtasks, list):
+            return None
+        result = GeminiAdapter._default_analysis()
+        result.update(entry)
+        result["duration_minutes"] = duration
+        result["recommended_subtasks"] = [str(sub) for sub in subtasks]
+        return result
+
+    @staticmethod
+    def _analysis_cache_payload(task: dict) -> dict:
+        # analyze_task と同じキーにすることで、単発・一括の分析結果を相互に再利用する
+        return {"title": task.get('title', ''), "notes": task.get('notes', '') or ''}
+
+    def chunk_tasks(self, tasks: list, char_budget: int = None, max_tasks: int = None) -> list:
+        """
+        一括処理の対象タスクを、1リクエストあたりの文字数・件数の上限に収まるチャンクへ分割する。
+        （上限の省略時は一括分析の設定 GEMINI_BATCH_CHAR_BUDGET / GEMINI_BATCH_MAX_TASKS を用いる）
+        """
+        char_budget = char_budget or Config.GEMINI_BATCH_CHAR_BUDGET
+        max_tasks = max_tasks or Config.GEMINI_BATCH_MAX_TASKS
+        chunks = []
+        current = []
+        current_size = 0
+        for task in tasks:
+            size = len(task.get('title', '')) + len(task.get('notes', '') or '')
+            if current and (current_size + size > char_budget or len(current) >= max_tasks):
+                chunks.append(current)
+                current = []
+                current_size = 0
+            current.append(task)
+            current_size += size
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _analyze_chunk(self, chunk: list) -> dict:
+        """
+        1チャンク分のタスクを1回のリクエストで分析し、タスクIDと分析結果の辞書を返す。
+        プロンプト内ではトークン節約のためタスクIDの代わりに連番を用いる。
+        解析できなかったタスクはデフォルト値となる。
+        """
+        tasks_text = ""
+        for index, task in enumerate(chunk, start=1):
+            tasks_text += f"[{index}]\nタスク名: {task.get('title', '')}\nメモ: {task.get('notes', '') or ''}\n---\n"
+
+        prompt = f'''
+以下の複数のタスクをそれぞれ分析し、JSON形式で出力してください。
+
+【タスク一覧】
+{tasks_text}
+出力形式は必ず以下の構造を持つJSONデータのみとしてください。キーは各タスクの番号（[ ]内の数字）です。
+{{
+  "1": {{
+    "duration_minutes": 推定所要時間(数値),
+    "importance": 1(低)～5(高)の数値,
+    "location": "場所の推定（無ければ null）",
+    "recommended_subtasks": ["サブタスク1", "サブタスク2"] (分割不要な場合は空配列)
+  }},
+  ... (すべてのタスク番号について出力)
+}}
+所要時間が60分を超えるか、工程が複数ある場合は recommended_subtasks に分割したタスク名を含めてください。
+'''
+        def parse(text):
+            result = self.parse_json_response(text)
+            if not isinstance(result, dict):
+                raise ValueError("JSONオブジェクトではありません")
+            complete = all(self._normalize_analysis(result.get(str(index))) is not None for index in range(1, len(chunk) + 1))
+            return result, complete
+
+        parsed = {}
+        try:
+            parsed, _ = self.generate_parsed(prompt, "analyze", parse)
+        except Exception as e:
+            print(f"Gemini一括解析エラー: {e}")
+
+        results = {}
+        failed = 0
+        for index, task in enumerate(chunk, start=1):
+            analysis = self._normalize_analysis(parsed.get(str(index)))
+            if analysis is None:
+                failed += 1
+                analysis = self._default_analysis()
+            else:
+                # 解析に成功したタスクのみキャッシュする（デフォルト値は次回に再分析させる）
+                self.cache_store("analyze", self._analysis_cache_payload(task), analysis)
+            results[task['id']] = analysis
+        if failed:
+            print(f"Gemini一括解析: {failed}/{len(chunk)}件の結果を取得できなかったため、デフォルト値を使用します。")
+        return results
+
+    def analyze_tasks_batch(self, tasks: list) -> dict:
+        """
+        複数のタスク（{'id', 'title', 'notes'} を持つ辞書の配列）をまとめて分析し、
+        タスクIDと分析結果（analyze_task と同じ構造）の辞書を返す。
+        文字数・件数の上限ごとにチャンク分割したリクエストを、同時実行数を制限して並行実行する。
+        """
+        return {task['id']: analysis for task, analysis in self.iter_analyze_tasks(tasks)}
+
+    def iter_analyze_tasks(self, tasks: list):
+        """
+        analyze_tasks_batch と同じ分析を行い、(タスク, 分析結果) を入力と同じ順序で順次返すジェネレータ。
+        キャッシュ済みのタスクは即座に、それ以外は所属するチャンクの分析が完了した時点で返すため、
+        呼び出し元は全件の分析を待たずに後続の処理を始められる。
+        """
+        if not tasks:
+            return
+
+        # キャッシュ済みのタスクは問い合わせ対象から除外する
+        results = {}
+        uncached = []
+        for task in tasks:
+            cached = self.cache_lookup("analyze", self._analysis_cache_payload(task))
+            if cached is not None:
+                results[task['id']] = cached
+            else:
+                uncached.append(task)
+
+        chunks = self.chunk_tasks(uncached)
+        chunk_of = {task['id']: index for index, chunk in enumerate(chunks) for task in chunk}
+        executor = ThreadPoolExecutor(max_workers=max(1, min(Config.GEMINI_MAX_CONCURRENCY, len(chunks))))
+        try:
+            futures = [executor.submit(self._analyze_chunk, chunk) for chunk in chunks]
+            for task in tasks:
+                if task['id'] not in results:
+                    results.update(futures[chunk_of[task['id']]].result())
+                yield task, results[task['id']]
+        finally:
+            # 途中で打ち切られた場合は、未着手のチャンクを取り消す
+            executor.shutdown(wait=False, cancel_futures=True)
 
     def sort_tasks_order(self, tasks_data: list) -> dict:
         """
@@ -136,22 +437,32 @@ class GeminiAdapter:
         # 失敗時のフェイルセーフ用（元の順序をそのまま返す）
         fallback_result = {"sorted": tasks_data, "duplicates": []}
         
+        cache_payload = [
+            [item["task"].get('id'), item["task"].get('title', ''), item["task"].get('notes', ''), item["task"].get('due')]
+            for item in tasks_data
+        ]
+        result_json = self.cache_lookup("sort", cache_payload)
+        all_ids = {item["task"].get('id') for item in tasks_data}
+
+        def parse(text):
+            result = self.parse_json_response(text)
+            if not isinstance(result, dict) or "sorted_ids" not in result:
+                raise ValueError("sorted_ids がありません")
+            # すべてのタスクが並び順か重複のいずれかに含まれていれば十分とみなす
+            covered = set(result.get("sorted_ids") or []) | set(result.get("duplicate_ids") or [])
+            return result, all_ids <= covered
+
+        if result_json is None:
+            try:
+                result_json, complete = self.generate_parsed(prompt, "sort", parse)
+            except Exception as e:
+                print(f"タスク並び替えエラー: {e}")
+                return fallback_result
+            # 全タスクを網羅した並び順のみキャッシュする（不完全な結果は次回に再問い合わせさせる）
+            if complete:
+                self.cache_store("sort", cache_payload, result_json)
+
         try:
-            response = self.generate_content_with_retry(prompt)
-        except Exception as e:
-            print(f"タスク並び替えAPIエラー: {e}")
-            return fallback_result
-            
-        try:
-            import json
-            import re
-            
-            text = response.text
-            match = re.search(r'```(?:json)?\s*(.*?)\s*```', text, re.DOTALL)
-            if match:
-                text = match.group(1)
-                
-            result_json = json.loads(text)
             if isinstance(result_json, dict) and "sorted_ids" in result_json:
                 sorted_ids = result_json.get("sorted_ids", [])
                 duplicate_ids = result_json.get("duplicate_ids", [])
@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+from config.config import Config
+from src.logic.instrumentation import instrument_service
+from src.logic.rate_limiter import RateLimitedService
+
+# API名・バージョンごとのディスカバリドキュメント（解析済み）。全スレッド・全アダプタで共有する
+_discovery_documents = {}
+_discovery_lock = threading.Lock()
+
+
+def _discovery_document(name: str, version: str) -> dict:
+    """
+    ディスカバリドキュメントを返す。googleapiclient に同梱の静的なドキュメントを優先し、
+    同梱されていない場合は1度だけ取得して Config.DATA_DIR/discovery/ に保存したものを使い回す。
+    """
+    key = (name, version)
+    with _discovery_lock:
+        document = _discovery_documents.get(key)
+        if document is not None:
+            return document
+        from googleapiclient import discovery_cache
+        content = discovery_cache.get_static_doc(name, version)
+        if content is None:
+            path = Config.DATA_DIR / "discovery" / f"{name}.{version}.json"
+            if os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            else:
+                import httplib2
+                from googleapiclient.discovery import DISCOVERY_URI
+                response, content = httplib2.Http().request(DISCOVERY_URI.format(api=name, apiVersion=version))
+                if response.status >= 400:
+                    raise RuntimeError(f"ディスカバリドキュメントを取得できませんでした ({name} {version}): HTTP {response.status}")
+                content = content.decode('utf-8')
+                os.makedirs(path.parent, exist_ok=True)
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+        document = _discovery_documents[key] = json.loads(content)
+        return document
+
+
+def prefetch_discovery(apis):
+    """
+    指定した API [(名前, バージョン), ...] のディスカバリドキュメントを先に読み込んでおく
+    （保存されていない場合は取得する。以後のサービスの構築では読み込み・解析を行わない）。
+    """
+    for name, version in apis:
+        _discovery_document(name, version)
+
+
+def build_service(name: str, version: str, credentials):
+    """
+    キャッシュしたディスカバリドキュメントから googleapiclient のサービスオブジェクトを構築する
+    （スレッドごとに構築する際も、ドキュメントの読み込み・解析は1度だけ行う）。
+    """
+    from googleapiclient.discovery import build_from_document
+    return build_from_document(_discovery_document(name, version), credentials=credentials)
+
+
+class ThreadLocalService:
+    """
+    googleapiclient のサービスオブジェクトをスレッドごとに構築・保持するクラス。
+    サービスが内部で使う httplib2 はスレッドセーフではないため、
+    複数スレッドから同じアダプタを利用する場合でも、各スレッドが専用の HTTP 接続を持つようにする。
+    """
+    def __init__(self, factory, name: str = "service", limiter=None):
+        # factory: サービスオブジェクトを構築する関数（認証情報は呼び出し元で共有する）
+        # name: 計測で用いるサービス名 (tasks / calendar)
+        # limiter: 全スレッドで共有する RateLimiter（指定時は全リクエストをレート制限・再試行付きで実行する）
+        self.factory = factory
+        self.name = name
+        self.limiter = limiter
+        self._local = threading.local()
+
+    def get(self):
+        """
+        現在のスレッド専用のサービスオブジェクトを返す（未作成なら構築する）。
+        """
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = instrument_service(self.factory(), self.name)
+            if self.limiter is not None:
+                service = RateLimitedService(service, self.limiter)
+            self._local.service = service
+        return service
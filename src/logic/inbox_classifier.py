@@ -0,0 +1,173 @@
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from config.config import Config
+
+
+class InboxClassifier:
+    """
+    Inbox（■メモ）のタスクの振り分け先を、ローカルで学習・推定する分類器。
+    タイトルの単語と文字 n-gram を特徴量とする多項ナイーブベイズで、
+    過去の振り分け結果や各■リストに現在あるタスクを「タスクID → 所属リスト」の例として逐次学習する。
+    （同じタスクを再度学習した場合は例を置き換えるため、リスト間の移動も反映される）
+    学習した例は SQLite ファイルに保存し、起動時に読み込んで集計をメモリ上に構築する。
+    """
+    # 文字 n-gram の長さ
+    NGRAM_SIZES = (2, 3)
+
+    def __init__(self, path=None, min_confidence: float = None, min_examples: int = None, max_examples: int = None):
+        # path: 保存先（シミュレーション等では ":memory:" を指定して実データと分離する）
+        self.path = path or (Config.DATA_DIR / "inbox_classifier.sqlite3")
+        self.min_confidence = Config.INBOX_CLASSIFIER_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self.min_examples = Config.INBOX_CLASSIFIER_MIN_EXAMPLES if min_examples is None else min_examples
+        self.max_examples = Config.INBOX_CLASSIFIER_MAX_EXAMPLES if max_examples is None else max_examples
+        # 複数スレッドから利用されるため、接続と集計はロックで保護する
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS examples ("
+            " example_id TEXT PRIMARY KEY,"
+            " label TEXT NOT NULL,"
+            " features TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        # {例のID: (ラベル, 特徴量の配列, 更新時刻)}
+        self._examples = {}
+        # {ラベル: {特徴量: 出現数}} / {ラベル: 例の数} / {ラベル: 特徴量の総数} / {特徴量: 出現するラベル数}
+        self._feature_counts = {}
+        self._label_examples = {}
+        self._label_features = {}
+        self._vocabulary = {}
+        for example_id, label, features, updated_at in self._conn.execute(
+            "SELECT example_id, label, features, updated_at FROM examples"
+        ):
+            self._add_counts(example_id, label, json.loads(features), updated_at)
+
+    def __len__(self) -> int:
+        return len(self._examples)
+
+    @classmethod
+    def features(cls, title: str) -> list:
+        """
+        タイトルから特徴量（単語と文字 n-gram）を抽出する。
+        全角・半角や大文字・小文字の違い、先頭の【】の印、連番などの数字は無視する。
+        """
+        text = unicodedata.normalize("NFKC", title or "").lower()
+        text = re.sub(r'^(\s*【[^】]*】)+', '', text)
+        text = re.sub(r'[0-9]+', ' ', text)
+        features = []
+        for word in re.findall(r'\w+', text):
+            if len(word) > 1:
+                features.append(f"w:{word}")
+            for size in cls.NGRAM_SIZES:
+                features.extend(f"c:{word[i:i + size]}" for i in range(len(word) - size + 1))
+        return features
+
+    def _add_counts(self, example_id: str, label: str, features: list, updated_at: float):
+        self._examples[example_id] = (label, features, updated_at)
+        self._label_examples[label] = self._label_examples.get(label, 0) + 1
+        self._label_features[label] = self._label_features.get(label, 0) + len(features)
+        counts = self._feature_counts.setdefault(label, {})
+        for feature in features:
+            if feature not in counts:
+                self._vocabulary[feature] = self._vocabulary.get(feature, 0) + 1
+            counts[feature] = counts.get(feature, 0) + 1
+
+    def _remove_counts(self, example_id: str):
+        label, features, _ = self._examples.pop(example_id)
+        self._label_examples[label] -= 1
+        self._label_features[label] -= len(features)
+        counts = self._feature_counts[label]
+        for feature in features:
+            counts[feature] -= 1
+            if not counts[feature]:
+                del counts[feature]
+                self._vocabulary[feature] -= 1
+                if not self._vocabulary[feature]:
+                    del self._vocabulary[feature]
+        if not self._label_examples[label]:
+            del self._label_examples[label], self._label_features[label], self._feature_counts[label]
+
+    def learn_many(self, examples: list) -> int:
+        """
+        (例のID, タイトル, ラベル) の配列を学習し、追加・変更された例の数を返す。
+        既に同じ内容で学習済みの例は何もしない。上限を超えた分は更新が古い例から削除する。
+        """
+        now = time.time()
+        changed = []
+        removed = []
+        with self._lock:
+            for example_id, title, label in examples:
+                features = self.features(title)
+                current = self._examples.get(example_id)
+                if current and current[0] == label and current[1] == features:
+                    continue
+                if current:
+                    self._remove_counts(example_id)
+                if not features:
+                    # 特徴量の無いタイトル（数字のみ等）は学習しない
+                    if current:
+                        removed.append(example_id)
+                    continue
+                self._add_counts(example_id, label, features, now)
+                changed.append((example_id, label, json.dumps(features, ensure_ascii=False), now))
+            overflow = len(self._examples) - self.max_examples if self.max_examples else 0
+            if overflow > 0:
+                oldest = sorted(self._examples, key=lambda example_id: self._examples[example_id][2])[:overflow]
+                for example_id in oldest:
+                    self._remove_counts(example_id)
+                removed.extend(oldest)
+            if not changed and not removed:
+                return 0
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO examples (example_id, label, features, updated_at) VALUES (?, ?, ?, ?)", changed
+            )
+            self._conn.executemany("DELETE FROM examples WHERE example_id = ?", [(example_id,) for example_id in removed])
+            self._conn.commit()
+        return len(changed)
+
+    def learn(self, example_id: str, title: str, label: str) -> bool:
+        return self.learn_many([(example_id, title, label)]) > 0
+
+    def predict(self, title: str, labels=None) -> tuple:
+        """
+        タイトルから最も確からしいラベルとその確信度 (0〜1) を返す。
+        labels を指定した場合はその中から選ぶ。学習が不十分な場合や、
+        学習済みの特徴量を1つも含まないタイトルの場合は (None, 0.0) を返す。
+        """
+        features = self.features(title)
+        with self._lock:
+            candidates = [label for label in (labels if labels is not None else self._label_examples) if label in self._label_examples]
+            known = [feature for feature in features if feature in self._vocabulary]
+            if len(candidates) < 2 or not known:
+                return None, 0.0
+            total_examples = sum(self._label_examples[label] for label in candidates)
+            vocabulary_size = len(self._vocabulary)
+            scores = {}
+            for label in candidates:
+                counts = self._feature_counts[label]
+                denominator = self._label_features[label] + vocabulary_size
+                score = math.log(self._label_examples[label] / total_examples)
+                for feature in known:
+                    score += math.log((counts.get(feature, 0) + 1) / denominator)
+                scores[label] = score
+            best = max(scores, key=scores.get)
+            if self._label_examples[best] < self.min_examples:
+                return None, 0.0
+        # 対数尤度を正規化して事後確率を求める
+        top = scores[best]
+        confidence = 1.0 / sum(math.exp(score - top) for score in scores.values())
+        return best, confidence
+
+    def classify(self, title: str, labels=None):
+        """
+        確信度が min_confidence 以上の場合のみラベルを返し、それ以外は None を返す（Gemini に判定を委ねる）。
+        """
+        label, confidence = self.predict(title, labels)
+        return label if label is not None and confidence >= self.min_confidence else None
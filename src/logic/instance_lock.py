@@ -0,0 +1,104 @@
+import errno
+import hashlib
+import os
+from config.config import Config
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+class InstanceLockError(RuntimeError):
+    """
+    同じアカウントに対して、既に別のプロセスが実行中の場合に発生する例外。
+    """
+
+
+class InstanceLock:
+    """
+    ロックファイルによる多重起動の防止（アカウントごとに1プロセスのみ実行できるようにする）。
+    OS のファイルロック (fcntl / msvcrt) を用いるため、プロセスが異常終了してもロックは自動的に解放される。
+    ロックファイルには実行中のプロセスIDを書き込む（ロックの取得に失敗した際のメッセージに用いる）。
+    blocking=True の場合は、他のプロセスが解放するまで待ってから取得する（ファイルの書き込みの排他等に用いる）。
+    """
+    def __init__(self, path, blocking: bool = False):
+        self.path = path
+        self.blocking = blocking
+        self._file = None
+
+    @classmethod
+    def for_account(cls, backend: str = None, token_file=None) -> "InstanceLock":
+        """
+        接続先のアカウントに対応するロックを返す。
+        アカウントは認証情報の保存ファイル（1ファイル = 1アカウント）とバックエンドの組で識別する。
+        """
+        backend = backend or Config.BACKEND
+        token_file = token_file or Config.TOKEN_CACHE_FILE
+        digest = hashlib.sha1(str(os.path.abspath(token_file)).encode("utf-8")).hexdigest()[:12]
+        return cls(Config.DATA_DIR / "locks" / f"taskmanager_{backend}_{digest}.lock")
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, "a+")
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            elif self.blocking:
+                self._lock_windows_blocking(f)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            # Windows ではロック中の領域を読めないため、プロセスIDが取得できない場合がある
+            try:
+                f.seek(0)
+                owner = f.read().strip()
+            except OSError:
+                owner = ""
+            f.close()
+            raise InstanceLockError(
+                f"同じアカウントに対して既に別のプロセス (PID: {owner or '不明'}) が実行中です。\nロックファイル: {self.path}"
+            )
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._file = f
+
+    @staticmethod
+    def _lock_windows_blocking(f):
+        """
+        msvcrt の LK_LOCK は1秒間隔で10回再試行した後に失敗する (EDEADLK) ため、取得できるまで繰り返す。
+        """
+        while True:
+            try:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError as e:
+                if e.errno != errno.EDEADLK:
+                    raise
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            self._file.seek(0)
+            self._file.truncate()
+            if fcntl:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
@@ -0,0 +1,423 @@
+import datetime
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from config.config import Config
+
+# API呼び出しと処理フェーズの計測（インストルメンテーション）。
+# - Google API: ThreadLocalService が返すサービスを InstrumentedService で包み、全リクエストの execute() を計測する
+# - Gemini: GeminiAdapter.generate_content_with_retry で計測する（トークン使用量を含む）
+# - フェーズ: Scheduler / Synchronizer が span() で区切る
+# 計測結果は run() の実行中のみ記録され、終了時に集計をログへ出力し、Config.DATA_DIR/traces/ に保存する。
+# （模擬サービス (TASKMANAGER_BACKEND=simulation) での実行や、set_trace_persistence(False) の後は保存しない）
+# （run() が並行して実行されている場合、API呼び出しは実行中のすべての run に記録される）
+
+# 応答時間のヒストグラムの区切り (ミリ秒)
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class CallStats:
+    """
+    1種類の呼び出し（例: tasks.list）の件数・エラー数・所要時間のヒストグラム・通信量を集計する。
+    """
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.items = 0
+        self.tokens = {"prompt": 0, "response": 0, "total": 0}
+
+    def add(self, seconds: float, ok: bool, request_bytes: int, response_bytes: int, items: int, tokens: dict):
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        ms = seconds * 1000
+        index = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if ms <= bound), len(LATENCY_BUCKETS_MS))
+        self.buckets[index] += 1
+        self.request_bytes += request_bytes
+        self.response_bytes += response_bytes
+        self.items += items
+        for key, value in (tokens or {}).items():
+            self.tokens[key] = self.tokens.get(key, 0) + (value or 0)
+
+    def to_dict(self) -> dict:
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        result = {
+            "count": self.count,
+            "errors": self.errors,
+            "total_seconds": round(self.total_seconds, 4),
+            "avg_ms": round(self.total_seconds * 1000 / self.count, 2) if self.count else 0,
+            "max_ms": round(self.max_seconds * 1000, 2),
+            "histogram": {label: n for label, n in zip(labels, self.buckets) if n},
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+        }
+        if self.items:
+            result["batched_items"] = self.items
+        if any(self.tokens.values()):
+            result["tokens"] = dict(self.tokens)
+        return result
+
+
+class RunTrace:
+    """
+    1回の処理（スケジューリング・振り分け等）の計測結果。
+    入れ子のフェーズ (span) と API呼び出しを、Chrome の trace event 形式でも記録する。
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.datetime.now()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.retries = {}
+        self.spans = {}
+        self.events = []
+        self._stacks = threading.local()
+
+    def _timestamp_us(self, t: float) -> float:
+        return round((t - self._origin) * 1_000_000, 1)
+
+    def _stack(self) -> list:
+        stack = getattr(self._stacks, "stack", None)
+        if stack is None:
+            stack = self._stacks.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str):
+        stack = self._stack()
+        path = "/".join(stack + [name])
+        stack.append(name)
+        with self._lock:
+            # 集計結果を開始順に並べるため、開始時点で登録しておく
+            self.spans.setdefault(path, (0.0, 0))
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            ended = time.perf_counter()
+            stack.pop()
+            with self._lock:
+                total, count = self.spans.get(path, (0.0, 0))
+                self.spans[path] = (total + ended - started, count + 1)
+                self.events.append({
+                    "name": name, "cat": "phase", "ph": "X", "pid": 1, "tid": threading.get_ident(),
+                    "ts": self._timestamp_us(started), "dur": self._timestamp_us(ended) - self._timestamp_us(started),
+                    "args": {"path": path},
+                })
+
+    def record_call(self, name: str, started: float, ended: float, ok: bool, request_bytes: int = 0,
+                    response_bytes: int = 0, items: int = 0, tokens: dict = None):
+        with self._lock:
+            self.calls.setdefault(name, CallStats()).add(
+                ended - started, ok, request_bytes, response_bytes, items, tokens
+            )
+            self.events.append({
+                "name": name, "cat": "call", "ph": "X", "pid": 1, "tid": threading.get_ident(),
+                "ts": self._timestamp_us(started), "dur": self._timestamp_us(ended) - self._timestamp_us(started),
+                "args": {"ok": ok, "items": items} if items else {"ok": ok},
+            })
+
+    def record_retry(self, name: str, count: int = 1):
+        with self._lock:
+            self.retries[name] = self.retries.get(name, 0) + count
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "wall_seconds": round(time.perf_counter() - self._origin, 4),
+                "phases": {path: {"seconds": round(total, 4), "count": count} for path, (total, count) in self.spans.items()},
+                "calls": {name: stats.to_dict() for name, stats in sorted(self.calls.items())},
+                "retries": dict(self.retries),
+            }
+
+    def format_summary(self) -> list:
+        """
+        UIのログに出力する集計結果の行を返す。
+        """
+        summary = self.summary()
+        lines = [f"[計測] {self.name}: 合計 {summary['wall_seconds']:.2f}秒"]
+        lines.append("  処理フェーズ:")
+        for path, phase in summary["phases"].items():
+            indent = "  " * (path.count("/") + 1)
+            lines.append(f"  {indent}- {path.rsplit('/', 1)[-1]}: {phase['seconds']:.2f}秒")
+        lines.append("  API呼び出し:")
+        for name, stats in summary["calls"].items():
+            line = f"    - {name}: {stats['count']}回 (平均 {stats['avg_ms']:.0f}ms / 最大 {stats['max_ms']:.0f}ms"
+            if stats["errors"]:
+                line += f" / エラー {stats['errors']}回"
+            if "tokens" in stats:
+                line += f" / トークン {stats['tokens']['total']}"
+            lines.append(line + ")")
+        for name, count in summary["retries"].items():
+            lines.append(f"    - 再送 {name}: {count}件")
+        return lines
+
+    def save(self, directory=None) -> str:
+        """
+        集計結果と trace event（chrome://tracing や Perfetto で表示可能）を1つのJSONファイルに保存し、パスを返す。
+        保存後、ディレクトリ内のファイル数が INSTRUMENTATION_MAX_TRACE_FILES を超えた分は古いものから削除する。
+        """
+        directory = directory or (Config.DATA_DIR / "traces")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.name}_{self.started_at:%Y%m%d_%H%M%S_%f}.json")
+        summary = self.summary()
+        with self._lock:
+            events = list(self.events)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"summary": summary, "traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        prune_traces(directory)
+        return path
+
+
+def prune_traces(directory, max_files: int = None):
+    """
+    計測結果のファイル (*.json) のうち、更新日時が新しい max_files 件を残して削除する。
+    """
+    max_files = Config.INSTRUMENTATION_MAX_TRACE_FILES if max_files is None else max_files
+    if max_files <= 0:
+        return
+    try:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json")]
+        paths.sort(key=os.path.getmtime, reverse=True)
+    except OSError:
+        return
+    for path in paths[max_files:]:
+        try:
+            os.remove(path)
+        except OSError:
+            # 他のプロセスが先に削除した場合などは無視する
+            pass
+
+
+# 実行中の計測 (RunTrace) の一覧
+_active_runs = []
+_active_lock = threading.Lock()
+# 計測結果をファイルに保存するか（None の場合は設定に従う）
+_save_traces = None
+
+
+def set_trace_persistence(enabled: bool):
+    """
+    計測結果のファイルへの保存を有効・無効にする（ベンチマーク・検証用のスクリプトは無効にして実行する）。
+    """
+    global _save_traces
+    _save_traces = enabled
+
+
+def _persistence_enabled() -> bool:
+    if _save_traces is not None:
+        return _save_traces
+    # 模擬サービスでの実行は data/ 配下に書き込まない（保存数の上限による削除で、実アカウントの計測結果を失わないようにする）
+    return Config.INSTRUMENTATION_SAVE_TRACES and Config.BACKEND != "simulation"
+
+
+def _runs() -> list:
+    with _active_lock:
+        return list(_active_runs)
+
+
+def begin_run(name: str) -> RunTrace:
+    """
+    計測を開始して RunTrace を返す（計測が無効な場合は None）。
+    起動処理のように、1つのブロックに収まらず複数のスレッドにまたがる処理を計測する場合に用いる。
+    フェーズは trace.span() で記録し、end_run() で終了する。
+    """
+    if not Config.INSTRUMENTATION_ENABLED:
+        return None
+    trace = RunTrace(name)
+    with _active_lock:
+        _active_runs.append(trace)
+    return trace
+
+
+def end_run(trace: RunTrace, logger=print):
+    """
+    begin_run() で開始した計測を終了し、集計をログへ出力してファイルに保存する（保存が無効な場合はログへの出力のみ）。
+    """
+    if trace is None:
+        return
+    with _active_lock:
+        if trace not in _active_runs:
+            return
+        _active_runs.remove(trace)
+    for line in trace.format_summary():
+        logger(line)
+    if not _persistence_enabled():
+        return
+    try:
+        logger(f"  計測結果を保存しました: {trace.save()}")
+    except OSError as e:
+        logger(f"  計測結果の保存に失敗しました: {e}")
+
+
+@contextmanager
+def run(name: str, logger=print):
+    """
+    ブロック内の処理を1回の計測単位として記録し、終了時に集計をログへ出力してファイルに保存する。
+    """
+    trace = begin_run(name)
+    if trace is None:
+        yield None
+        return
+    try:
+        with trace.span(name):
+            yield trace
+    finally:
+        end_run(trace, logger)
+
+
+@contextmanager
+def span(name: str):
+    """
+    実行中の計測に、処理フェーズの区間を記録する（入れ子にできる）。
+    """
+    runs = _runs()
+    if not runs:
+        yield
+        return
+    with _nested(runs, name):
+        yield
+
+
+@contextmanager
+def _nested(runs: list, name: str):
+    if not runs:
+        yield
+        return
+    with runs[0].span(name):
+        with _nested(runs[1:], name):
+            yield
+
+
+def record_call(name: str, started: float, ended: float, ok: bool, **kwargs):
+    """
+    API呼び出し1回分の結果を、実行中のすべての計測に記録する。
+    """
+    for trace in _runs():
+        trace.record_call(name, started, ended, ok, **kwargs)
+
+
+def record_retry(name: str, count: int = 1):
+    for trace in _runs():
+        trace.record_retry(name, count)
+
+
+def _payload_size(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    try:
+        return len(json.dumps(value, ensure_ascii=False))
+    except (TypeError, ValueError):
+        return 0
+
+
+class _InstrumentedRequest:
+    """
+    HttpRequest を包み、execute() の所要時間・成否・通信量を記録する。
+    """
+    def __init__(self, request, name: str):
+        self._request = request
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._request, attr)
+
+    def execute(self, *args, **kwargs):
+        started = time.perf_counter()
+        ok = False
+        response = None
+        try:
+            response = self._request.execute(*args, **kwargs)
+            ok = True
+            return response
+        finally:
+            record_call(
+                self._name, started, time.perf_counter(), ok,
+                request_bytes=_payload_size(getattr(self._request, "body", None)),
+                response_bytes=_payload_size(response)
+            )
+
+
+class _InstrumentedBatch:
+    """
+    バッチリクエストを包み、1回の通信としての所要時間と含まれる操作数・失敗数を記録する。
+    """
+    def __init__(self, batch, name: str, callback):
+        self._batch = batch
+        self._name = name
+        self._callback = callback
+        self._count = 0
+        self._errors = 0
+
+    def add(self, request, *args, **kwargs):
+        self._count += 1
+        # バッチには元の HttpRequest を渡す
+        return self._batch.add(getattr(request, "_request", request), *args, **kwargs)
+
+    def _on_response(self, request_id, response, exception):
+        if exception is not None:
+            self._errors += 1
+        if self._callback:
+            self._callback(request_id, response, exception)
+
+    def execute(self, *args, **kwargs):
+        started = time.perf_counter()
+        ok = False
+        try:
+            result = self._batch.execute(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            record_call(self._name, started, time.perf_counter(), ok and self._errors == 0, items=self._count)
+
+
+class InstrumentedService:
+    """
+    googleapiclient のサービス（またはそのリソース）を包み、生成されたリクエストを計測対象にする。
+    呼び出し名は "tasks.tasks.list" のように「サービス名.リソース.メソッド」で記録する。
+    """
+    def __init__(self, target, path: str):
+        self._target = target
+        self._path = path
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        if not callable(value):
+            return value
+        name = f"{self._path}.{attr}"
+        if attr == "new_batch_http_request":
+            def new_batch(callback=None, **kwargs):
+                wrapper = _InstrumentedBatch(None, f"{self._path}.batch", callback)
+                wrapper._batch = value(callback=wrapper._on_response, **kwargs)
+                return wrapper
+            return new_batch
+
+        def call(*args, **kwargs):
+            result = value(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return _InstrumentedRequest(result, name)
+            return InstrumentedService(result, name)
+        return call
+
+
+def instrument_service(service, name: str):
+    """
+    計測が有効な場合、サービスオブジェクトを InstrumentedService で包んで返す。
+    """
+    if not Config.INSTRUMENTATION_ENABLED:
+        return service
+    return InstrumentedService(service, name)
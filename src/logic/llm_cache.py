@@ -0,0 +1,123 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from config.config import Config
+
+
+class LLMCache:
+    """
+    Gemini の応答（またはその解析結果）をローカルのSQLiteファイルに保存し、
+    同じモデル・同じプロンプト版・同じ入力の問い合わせを再利用するためのキャッシュ。
+    有効期限 (TTL) と件数上限 (最終参照時刻による LRU 方式で削除) を持ち、ヒット・ミス数を記録する。
+    """
+    def __init__(self, path=None, ttl_seconds: int = None, max_entries: int = None):
+        self.path = path or (Config.DATA_DIR / "llm_cache.sqlite3")
+        self.ttl_seconds = Config.LLM_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = Config.LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.hits = 0
+        self.misses = 0
+        # 複数スレッドから利用されるため、接続は1つにしてロックで保護する
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " operation TEXT NOT NULL,"
+            " prompt_version TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, operation: str, prompt_version: str, payload) -> str:
+        """
+        モデル名・処理種別・プロンプト版・入力内容からキャッシュキー (SHA-256) を生成する。
+        """
+        raw = json.dumps([model, operation, prompt_version, payload], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        """
+        キャッシュされた値を返す。存在しない・期限切れの場合は None を返す。
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                if row is not None:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value, operation: str, prompt_version: str):
+        """
+        値を保存し、件数上限を超えた分は最終参照が古いものから削除する。
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, operation, prompt_version, value, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, operation, prompt_version, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            if self.max_entries:
+                count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_access LIMIT ?)",
+                        (count - self.max_entries,)
+                    )
+            self._conn.commit()
+
+    def invalidate(self, operation: str = None) -> int:
+        """
+        指定した処理種別（省略時は全件）のキャッシュを削除し、削除件数を返す。
+        """
+        with self._lock:
+            if operation:
+                cur = self._conn.execute("DELETE FROM entries WHERE operation = ?", (operation,))
+            else:
+                cur = self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            return cur.rowcount
+
+    def invalidate_stale_versions(self, prompt_versions: dict) -> int:
+        """
+        現在のプロンプト版 ({処理種別: 版}) と一致しない古いキャッシュ、および期限切れのキャッシュを削除する。
+        プロンプトのテンプレートを変更した際は、該当する処理種別の版を上げることで古い応答が無効になる。
+        """
+        with self._lock:
+            deleted = 0
+            for operation, version in prompt_versions.items():
+                cur = self._conn.execute(
+                    "DELETE FROM entries WHERE operation = ? AND prompt_version != ?", (operation, version)
+                )
+                deleted += cur.rowcount
+            placeholders = ", ".join("?" for _ in prompt_versions)
+            cur = self._conn.execute(
+                f"DELETE FROM entries WHERE operation NOT IN ({placeholders})", tuple(prompt_versions)
+            )
+            deleted += cur.rowcount
+            if self.ttl_seconds:
+                cur = self._conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+                deleted += cur.rowcount
+            self._conn.commit()
+            return deleted
+
+    def stats(self) -> dict:
+        """
+        ヒット数・ミス数・保存件数を返す。
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
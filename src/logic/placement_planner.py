@@ -0,0 +1,160 @@
+import datetime
+import heapq
+from src.logic.busy_timeline import BusyTimeline
+
+
+class PlacementPlanner:
+    """
+    スケジューリング対象の全タスクについて、カレンダー上の配置（開始・終了時刻）を一括で計算するクラス。
+    検索範囲（通常は2週間）を15分単位のスロットに区切ったビットマップで空き状況を表現し、
+    期限（deadline）→ 重要度 → リスト内の順序 の優先度で、各タスクを最も早く収まる空き枠へ詰めていく。
+    先に配置した長いタスクが入らなかった隙間にも、後続の短いタスクが入る（バックフィル）。
+    ネットワーク処理は一切行わず、結果は書き込みフェーズで一括適用する前提の「計画」として返す。
+    """
+    SLOT_MINUTES = BusyTimeline.SLOT_MINUTES
+    # 重要度の上限（配置要求の importance は 1〜MAX_IMPORTANCE に収める）
+    MAX_IMPORTANCE = 5
+
+    def __init__(self, busy_timeline: BusyTimeline, horizon_start: datetime.datetime, horizon_end: datetime.datetime):
+        self.timeline = busy_timeline
+        self.horizon_start = horizon_start
+        self.slot_count = max(0, int((horizon_end - horizon_start).total_seconds() // (self.SLOT_MINUTES * 60)))
+        self.horizon_end = self._slot_time(self.slot_count)
+        # ビットが1のスロットが空き。Python の int をビット列として扱う
+        self.free_bits = self._build_free_bits()
+
+    def _slot_time(self, index: int) -> datetime.datetime:
+        return self.horizon_start + datetime.timedelta(minutes=index * self.SLOT_MINUTES)
+
+    def _slot_index_floor(self, dt: datetime.datetime) -> int:
+        delta = (dt - self.horizon_start).total_seconds()
+        return int(delta // (self.SLOT_MINUTES * 60))
+
+    def _slot_index_ceil(self, dt: datetime.datetime) -> int:
+        delta = (dt - self.horizon_start).total_seconds()
+        return int(-(-delta // (self.SLOT_MINUTES * 60)))
+
+    def _build_free_bits(self) -> int:
+        """
+        Busy区間と少しでも重なるスロットを埋め、残りを空きとするビットマップを作成する。
+        """
+        free = (1 << self.slot_count) - 1
+        for start, end in self.timeline.intervals():
+            lo = max(0, self._slot_index_floor(start))
+            hi = min(self.slot_count, self._slot_index_ceil(end))
+            if lo < hi:
+                free &= ~(((1 << (hi - lo)) - 1) << lo)
+        return free
+
+    def _find_run(self, slots: int, lo: int) -> int:
+        """
+        スロット lo 以降で、連続 slots 個の空きが始まる最初のスロット番号を返す（無ければ -1）。
+        """
+        if lo >= self.slot_count or slots > self.slot_count:
+            return -1
+        # runs のビット i は「スロット i から slots 個が全て空き」を表す（倍々にシフトして計算）
+        runs = self.free_bits
+        covered = 1
+        while covered < slots:
+            step = min(covered, slots - covered)
+            runs &= runs >> step
+            covered += step
+        runs = (runs >> lo) << lo
+        if not runs:
+            return -1
+        return (runs & -runs).bit_length() - 1
+
+    def _reserve(self, start: datetime.datetime, end: datetime.datetime):
+        lo = max(0, self._slot_index_floor(start))
+        hi = min(self.slot_count, self._slot_index_ceil(end))
+        if lo < hi:
+            self.free_bits &= ~(((1 << (hi - lo)) - 1) << lo)
+        self.timeline.add(start, end)
+
+    @staticmethod
+    def _priority_key(item: dict) -> tuple:
+        deadline = item.get("deadline")
+        # 期限のないタスクは期限付きタスクの後ろに回す
+        deadline_key = (0, deadline) if deadline else (1, datetime.datetime.max.replace(tzinfo=datetime.timezone.utc))
+        return (deadline_key, -item.get("importance", 3), item.get("order", 0), item.get("seq", 0))
+
+    def place(self, item: dict, earliest: datetime.datetime = None) -> dict:
+        """
+        1件のタスクを earliest 以降の最も早い空き枠に配置し、枠を予約した上で配置結果を返す。
+        検索範囲内に収まらない場合は、範囲外を BusyTimeline で探索して配置する。
+        """
+        duration = item["duration_minutes"]
+        earliest = max(earliest or self.horizon_start, self.horizon_start)
+
+        index = self._find_run(duration // self.SLOT_MINUTES, self._slot_index_ceil(earliest))
+        if index >= 0:
+            start = self._slot_time(index)
+            end = start + datetime.timedelta(minutes=duration)
+        else:
+            start, end = self.timeline.find_first_fit(BusyTimeline.snap_up(max(earliest, self.horizon_end)), duration)
+        self._reserve(start, end)
+
+        deadline = item.get("deadline")
+        return {
+            "item": item,
+            "start": start,
+            "end": end,
+            "deadline_missed": bool(deadline and end > deadline),
+        }
+
+    @classmethod
+    def lower_bound_key(cls, deadline: datetime.datetime, order: int) -> tuple:
+        """
+        重要度が未確定（分析前・分割前）のタスクが取りうる優先度キーの下限を返す。
+        """
+        return cls._priority_key({"deadline": deadline, "importance": cls.MAX_IMPORTANCE, "order": order})
+
+    def plan(self, items: list) -> list:
+        """
+        配置要求の配列を受け取り、優先度順に一括配置した結果（配置順の配列）を返す。
+        各要素は以下のキーを持つ辞書:
+          - duration_minutes: 所要時間（15分の倍数）
+          - importance: 重要度 (1〜5)
+          - deadline: 期限（datetime、無ければ None）
+          - order: sort_tasks_order 後の並び順
+          - group / seq: 分割タスクの親単位の識別子とその中の順番（同じ group は seq 順に前後関係を保つ）
+        """
+        stream = PlacementStream(self)
+        for item in items:
+            stream.add(item)
+        return stream.release()
+
+
+class PlacementStream:
+    """
+    配置要求を順次受け取り、PlacementPlanner.plan と同じ順序・結果で配置を確定していくクラス。
+    release(bound) は、まだ届いていない要求の優先度キーの下限 (bound) より前に来る要求だけを配置するため、
+    全要求が揃う前から配置（と後続の書き込み）を始めても、全件を揃えてから計画した場合と結果が変わらない。
+    """
+    def __init__(self, planner: PlacementPlanner):
+        self.planner = planner
+        # (優先度キー, 追加順, 配置要求) のヒープ。同じキーは追加順に配置する（plan の安定ソートと同じ）
+        self._heap = []
+        self._added = 0
+        self._group_ends = {}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def add(self, item: dict):
+        heapq.heappush(self._heap, (PlacementPlanner._priority_key(item), self._added, item))
+        self._added += 1
+
+    def release(self, bound: tuple = None) -> list:
+        """
+        優先度キーが bound より前の要求を優先度順に配置し、配置結果の配列を返す（bound が None なら全件）。
+        """
+        placements = []
+        while self._heap and (bound is None or self._heap[0][0] < bound):
+            _, _, item = heapq.heappop(self._heap)
+            group = item.get("group")
+            placement = self.planner.place(item, earliest=self._group_ends.get(group) if group is not None else None)
+            if group is not None:
+                self._group_ends[group] = placement["end"]
+            placements.append(placement)
+        return placements
@@ -0,0 +1,290 @@
+import email.utils
+import random
+import ssl
+import threading
+import time
+from googleapiclient.errors import HttpError
+from google.api_core import exceptions as api_exceptions
+from config.config import Config
+from src.logic import instrumentation
+
+# 一時的なエラーとして再試行する HTTP ステータス
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+# Google API が 403 で返すレート制限エラーの理由
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# 2回実行すると結果が重複する（冪等でない）API メソッド（メソッド名の末尾で判定する）
+NON_IDEMPOTENT_METHODS = ("insert", "import", "quickAdd")
+# 一時的なエラーとして再試行する google.api_core (Gemini) の例外
+RETRYABLE_API_CORE_ERRORS = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.InternalServerError,
+    api_exceptions.BadGateway,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.GatewayTimeout,
+    api_exceptions.DeadlineExceeded,
+)
+
+
+def _transport_errors() -> tuple:
+    """
+    再試行の対象とする通信エラーの型を返す（接続・タイムアウト・TLS・名前解決の失敗）。
+    httplib2 / requests は通信を行う時点で読み込まれるため、ここで初めて参照する。
+    """
+    import httplib2
+    from requests import exceptions as requests_exceptions
+    return (
+        ConnectionError, TimeoutError, ssl.SSLError, httplib2.ServerNotFoundError,
+        requests_exceptions.ConnectionError, requests_exceptions.Timeout,
+    )
+
+
+def _http_error_reason(error: HttpError) -> str:
+    try:
+        return error._get_reason() or ""
+    except Exception:
+        return ""
+
+
+def is_throttle_error(error: Exception) -> bool:
+    """
+    クォータ・レート制限によるエラー (429 / 403 rateLimitExceeded / ResourceExhausted) かどうかを判定する。
+    """
+    if isinstance(error, HttpError):
+        if error.resp.status == 429:
+            return True
+        if error.resp.status == 403:
+            content = error.content.decode('utf-8', 'ignore') if isinstance(error.content, bytes) else str(error.content)
+            return any(reason in content or reason in _http_error_reason(error) for reason in RATE_LIMIT_REASONS)
+        return False
+    return isinstance(error, api_exceptions.TooManyRequests)
+
+
+def is_retryable_error(error: Exception, idempotent: bool = True) -> bool:
+    """
+    再試行で回復が見込めるエラー（レート制限・5xx・通信エラー）かどうかを、例外の型とステータスで判定する。
+    idempotent=False（作成など、2回実行すると結果が重複する操作）の場合は、サーバー側で処理されずに
+    拒否されたことが確実なレート制限エラーのみを再試行の対象とする
+    （5xx・タイムアウト・通信エラーはサーバー側で作成済みの可能性があり、再送すると重複するため）。
+    """
+    if is_throttle_error(error):
+        return True
+    if not idempotent:
+        return False
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUSES
+    if isinstance(error, RETRYABLE_API_CORE_ERRORS):
+        return True
+    if isinstance(error, api_exceptions.GoogleAPICallError):
+        return False
+    # PermissionError・FileNotFoundError 等のローカルのエラー (OSError) は再試行しても回復しないため対象外とする
+    return isinstance(error, _transport_errors())
+
+
+def is_idempotent_request(request) -> bool:
+    """
+    HttpRequest の API メソッド名 (例: "tasks.tasks.insert") から、再送しても結果が重複しない操作かどうかを判定する。
+    """
+    method_id = getattr(request, "methodId", None) or ""
+    return method_id.rsplit(".", 1)[-1] not in NON_IDEMPOTENT_METHODS
+
+
+def retry_after_seconds(error: Exception) -> float:
+    """
+    エラー応答の Retry-After ヘッダー（秒数または日時）が示す待ち時間を返す。指定が無い場合は None。
+    """
+    value = None
+    if isinstance(error, HttpError):
+        value = error.resp.get('retry-after')
+    else:
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None)
+        if headers is not None:
+            value = headers.get('retry-after') or headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    API クライアントごとのレート制限・同時実行数の制御と、一時的なエラーの再試行を担当するクラス。
+    - トークンバケットで1秒あたりのリクエスト数 (QPS) を上限以下に保つ
+    - レート制限エラーを受けたら送信レートを半分に下げ、成功が続けば上限まで徐々に戻す（AIMD方式）
+    - 再試行の間隔は指数バックオフ＋ジッター（Retry-After の指定があればそれ以上待つ）
+    """
+    def __init__(self, name: str, qps: float, max_concurrency: int, max_retries: int = None,
+                 backoff_base_seconds: float = None, backoff_max_seconds: float = None):
+        # qps: 1秒あたりのリクエスト数の上限 (0 以下で無制限)
+        self.name = name
+        self.max_rate = qps
+        self.rate = qps
+        self.burst = max(1.0, qps)
+        self.max_retries = Config.API_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff_base_seconds = Config.API_BACKOFF_BASE_SECONDS if backoff_base_seconds is None else backoff_base_seconds
+        self.backoff_max_seconds = Config.API_BACKOFF_MAX_SECONDS if backoff_max_seconds is None else backoff_max_seconds
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+
+    def acquire(self, tokens: int = 1):
+        """
+        送信レートの上限に収まるまで待つ。バッチ（複数件）の場合は件数分のトークンを消費する。
+        """
+        if self.max_rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                # バケットの容量を超える件数は、残りを「前借り」して後続の送信を遅らせる
+                if self._tokens >= min(tokens, self.burst):
+                    self._tokens -= tokens
+                    return
+                wait = (min(tokens, self.burst) - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_throttled(self):
+        """
+        レート制限エラーを受けた際に送信レートを下げる。
+        """
+        if self.max_rate <= 0:
+            return
+        with self._lock:
+            self.rate = max(self.max_rate * 0.05, self.rate * 0.5)
+
+    def on_success(self):
+        """
+        成功時に送信レートを上限まで少しずつ戻す。
+        """
+        if self.max_rate <= 0 or self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def backoff_delay(self, attempt: int, retry_after: float = None) -> float:
+        """
+        attempt 回目 (1始まり) の再試行までの待ち時間を返す（指数バックオフ＋フルジッター）。
+        """
+        ceiling = min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** (attempt - 1)))
+        delay = random.uniform(ceiling / 2, ceiling)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max_seconds))
+        return delay
+
+    def call(self, func, *args, tokens: int = 1, retry: bool = True, max_retries: int = None, idempotent: bool = True, **kwargs):
+        """
+        レート制限と同時実行数の上限を守って func を実行する。
+        retry=True の場合は、一時的なエラーをバックオフしながら最大 max_retries 回（省略時は既定の回数）まで再試行する。
+        idempotent=False の場合は、レート制限エラーのみを再試行する（is_retryable_error を参照）。
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            self.acquire(tokens)
+            with self._slots:
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    error = e
+                else:
+                    self.on_success()
+                    return result
+            if is_throttle_error(error):
+                self.on_throttled()
+            attempt += 1
+            if not retry or attempt > max_retries or not is_retryable_error(error, idempotent):
+                raise error
+            delay = self.backoff_delay(attempt, retry_after_seconds(error))
+            instrumentation.record_retry(self.name)
+            print(f"{self.name} API: 一時的なエラーのため {delay:.1f}秒後に再試行します ({attempt}/{max_retries}): {error}")
+            time.sleep(delay)
+
+
+class _RateLimitedRequest:
+    """
+    HttpRequest を包み、execute() をレート制限・再試行付きで実行する。
+    作成 (insert) 等の冪等でない操作は、レート制限エラーの場合のみ再試行する。
+    """
+    def __init__(self, request, limiter: RateLimiter):
+        self._request = request
+        self._limiter = limiter
+
+    def __getattr__(self, attr):
+        return getattr(self._request, attr)
+
+    def execute(self, *args, **kwargs):
+        return self._limiter.call(
+            self._request.execute, *args, idempotent=is_idempotent_request(self._request), **kwargs
+        )
+
+
+class _RateLimitedBatch:
+    """
+    バッチリクエストを包み、含まれる件数分のレートを消費して送信する。
+    （操作ごとの再試行は BatchRequestQueue が行うため、ここでは再試行しない）
+    """
+    def __init__(self, batch, limiter: RateLimiter):
+        self._batch = batch
+        self._limiter = limiter
+        self._count = 0
+
+    def add(self, request, *args, **kwargs):
+        self._count += 1
+        return self._batch.add(getattr(request, "_request", request), *args, **kwargs)
+
+    def execute(self, *args, **kwargs):
+        return self._limiter.call(self._batch.execute, *args, tokens=max(1, self._count), retry=False, **kwargs)
+
+
+class RateLimitedService:
+    """
+    googleapiclient のサービス（またはそのリソース）を包み、生成されたリクエストを RateLimiter 経由で実行させる。
+    """
+    def __init__(self, target, limiter: RateLimiter):
+        self._target = target
+        self._limiter = limiter
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        if not callable(value):
+            return value
+        if attr == "new_batch_http_request":
+            return lambda *args, **kwargs: _RateLimitedBatch(value(*args, **kwargs), self._limiter)
+
+        def call(*args, **kwargs):
+            result = value(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return _RateLimitedRequest(result, self._limiter)
+            return RateLimitedService(result, self._limiter)
+        return call
+
+
+# サービス名ごとに共有する RateLimiter（複数のアダプタ・スレッドから同じ上限を共有する）
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> RateLimiter:
+    """
+    サービス名 (tasks / calendar / gemini) に対応する共有の RateLimiter を返す（設定は Config から読み込む）。
+    """
+    settings = {
+        "tasks": (Config.TASKS_QPS, Config.TASKS_MAX_CONCURRENCY),
+        "calendar": (Config.CALENDAR_QPS, Config.CALENDAR_MAX_CONCURRENCY),
+        "gemini": (Config.GEMINI_QPS, Config.GEMINI_MAX_CONCURRENCY),
+    }
+    with _limiters_lock:
+        if name not in _limiters:
+            qps, max_concurrency = settings.get(name, (0, 4))
+            _limiters[name] = RateLimiter(name, qps, max_concurrency)
+        return _limiters[name]
@@ -0,0 +1,181 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.logic.placement_planner import PlacementPlanner, PlacementStream
+from src.logic import instrumentation
+
+# キューの終端を表す印
+_DONE = object()
+
+
+class SchedulingPipeline:
+    """
+    schedule_tasks の 分析 → 分割 → 配置 → 書き込み を、上限付きのキューでつないだストリーミング処理として実行するクラス。
+    - 分析スレッド: 対象タスクを期限の早い順に一括分析し、その結果を分析済みキューへ流す
+    - 配置（呼び出し元スレッド）: 分析済みのタスクを配置要求にし、順序が確定したものから配置して書き込みキューへ流す
+      （配置は呼び出し元スレッドだけが行うため、同じ空き枠への二重登録は起こらない）
+    - 分割スレッド: 分割対象タスクの名称変更・子タスクの作成をバッチで送信する
+    - 書き込みスレッド: 確定した配置をカレンダー登録 → タスク更新 → ステート保存の順に反映する
+    配置は「まだ分析・分割が終わっていないタスクが取りうる優先度の下限」より前に来るものだけを確定するため、
+    配置結果は逐次処理 (PlacementPlanner.plan) と同じになる。
+    ただし未分析のタスクは重要度を最大と仮定するため、分析中に確定できるのは、未分析のタスクより期限が真に早いタスク
+    （同じ期限の場合は重要度が最大のもの）の配置のみとなる。期限の無いタスクや同じ期限のタスクの配置は、
+    その期限のタスクの分析が全て終わるまで確定しない（期限付きのタスクが少ない場合は、書き込みと分析はほとんど重ならない）。
+    """
+    # 分析済みキューに積めるタスク数 / 書き込みキューに積める配置のまとまりの数
+    ANALYZED_QUEUE_SIZE = 64
+    WRITE_QUEUE_SIZE = 8
+    # 停止要求の確認間隔（秒）
+    POLL_SECONDS = 0.1
+
+    def __init__(self, scheduler, planner: PlacementPlanner):
+        self.scheduler = scheduler
+        self.planner = planner
+        self._stop = threading.Event()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """
+        キューに空きができるまで待って item を積む。停止が要求された場合は積まずに False を返す。
+        """
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=self.POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get_available(self, q: queue.Queue) -> list:
+        """
+        キューから1件以上を取り出し、続けて取り出せる分もまとめて返す。停止が要求された場合は終端の印を返す。
+        """
+        while not self._stop.is_set():
+            try:
+                items = [q.get(timeout=self.POLL_SECONDS)]
+                break
+            except queue.Empty:
+                continue
+        else:
+            return [_DONE]
+        while True:
+            try:
+                items.append(q.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _analyze(self, target_tasks: list, analysis_order: list, analyzed: queue.Queue):
+        """
+        分析スレッド: analysis_order の順に (対象タスクの順番, 分析結果) を分析済みキューへ流す。
+        """
+        try:
+            with instrumentation.span("analyze"):
+                tasks = [target_tasks[order]["task"] for order in analysis_order]
+                for order, (task, analysis) in zip(analysis_order, self.scheduler.gemini.iter_analyze_tasks(tasks)):
+                    if not self._put(analyzed, (order, self.scheduler._finalize_analysis(task, analysis))):
+                        return
+        except Exception as e:
+            self._put(analyzed, e)
+        finally:
+            self._put(analyzed, _DONE)
+
+    def _write(self, placements: queue.Queue) -> list:
+        """
+        書き込みスレッド: 確定した配置を、キューに溜まっている分ごとにまとめて書き込む。
+        カレンダーへの登録に失敗したタスクのタイトルの配列を返す。
+        """
+        failed_titles = []
+        try:
+            while True:
+                plan = []
+                done = False
+                for entry in self._get_available(placements):
+                    if entry is _DONE:
+                        done = True
+                    else:
+                        plan.extend(entry)
+                if plan:
+                    with instrumentation.span("apply_plan"):
+                        failed_titles.extend(self.scheduler._write_placements(plan))
+                if done:
+                    return failed_titles
+        except Exception:
+            # 書き込みに失敗した場合は、他の段階も停止させる
+            self._stop.set()
+            raise
+
+    def _split(self, split_batch) -> list:
+        with instrumentation.span("split_tasks"):
+            return split_batch.execute()
+
+    def run(self, target_tasks: list):
+        scheduler = self.scheduler
+        count = len(target_tasks)
+        # 未分析のタスクが取りうる優先度キーの下限の順（期限の早い順）に分析する。
+        # 未分析のタスク全体の下限は、次に分析結果が届くタスクの下限となる
+        lower_bounds = [
+            PlacementPlanner.lower_bound_key(scheduler._parse_due(item["task"].get('due')), order)
+            for order, item in enumerate(target_tasks)
+        ]
+        analysis_order = sorted(range(count), key=lower_bounds.__getitem__)
+
+        analyzed = queue.Queue(maxsize=self.ANALYZED_QUEUE_SIZE)
+        placements = queue.Queue(maxsize=self.WRITE_QUEUE_SIZE)
+        stream = PlacementStream(self.planner)
+        # 送信中の分割: (Future, 分割の情報の配列, 分割後のタスクが取りうる優先度キーの最小値)
+        pending_splits = []
+        placed = 0
+        analyzed_count = 0
+
+        executor = ThreadPoolExecutor(max_workers=3)
+        try:
+            executor.submit(self._analyze, target_tasks, analysis_order, analyzed)
+            writer = executor.submit(self._write, placements)
+            done = False
+            while not done:
+                split_batch = scheduler.tasks.batch()
+                split_jobs = []
+                for entry in self._get_available(analyzed):
+                    if entry is _DONE:
+                        done = True
+                    elif isinstance(entry, Exception):
+                        raise entry
+                    else:
+                        order, analysis = entry
+                        kind, value = scheduler._prepare_target(order, target_tasks[order], analysis, split_batch)
+                        if kind == "place":
+                            stream.add(value)
+                        elif kind == "split":
+                            split_jobs.append(value)
+                        analyzed_count += 1
+                if self._stop.is_set():
+                    break
+                if split_jobs:
+                    bound = min(PlacementPlanner._priority_key(request_base) for request_base, _, _ in split_jobs)
+                    pending_splits.append((executor.submit(self._split, split_batch), split_jobs, bound))
+
+                # 分割が完了したものから子タスクの配置要求を加える（全件の分析後は全ての分割の完了を待つ）
+                for pending in list(pending_splits):
+                    future, jobs, _ = pending
+                    if done or future.done():
+                        for request in scheduler._split_placement_requests(jobs, future.result()):
+                            stream.add(request)
+                        pending_splits.remove(pending)
+
+                # 未確定のタスク（未分析・分割中）より優先度が高い配置のみを確定する
+                bounds = [lower_bounds[analysis_order[analyzed_count]]] if not done and analyzed_count < count else []
+                bounds += [bound for _, _, bound in pending_splits]
+                with instrumentation.span("plan"):
+                    released = stream.release(min(bounds) if bounds else None)
+                if released:
+                    placed += len(released)
+                    if not self._put(placements, released):
+                        break
+            self._put(placements, _DONE)
+            failed_titles = writer.result()
+        finally:
+            self._stop.set()
+            executor.shutdown(wait=True)
+
+        if placed:
+            self.scheduler.log(f"---\n{placed}件の予定を配置し、カレンダーへ登録しました。")
+        scheduler._raise_for_failed_registrations(failed_titles)
@@ -1,9 +1,17 @@
 import datetime
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
+from config.config import Config
 from src.logic.tasks_adapter import TasksAdapter
 from src.logic.calendar_adapter import CalendarAdapter
 from src.logic.state_manager import StateManager
 from src.logic.gemini_adapter import GeminiAdapter
+from src.logic.busy_timeline import BusyTimeline
+from src.logic.placement_planner import PlacementPlanner
+from src.logic.schedule_pipeline import SchedulingPipeline
+from src.logic import instrumentation
 import traceback
 
 class Scheduler:
@@ -34,6 +42,10 @@ class Scheduler:
         
         # ユーザー承認待ちのタスクを保持するリスト（GUI等から後で承認・実行される）
         self.pending_split_tasks = []
+        self._pending_lock = threading.Lock()
+        # Busy期間の取得から予定登録までを直列化するロック
+        # （UIから並行して実行された処理同士が、同じ空き枠へ予定を登録しないようにする）
+        self._placement_lock = threading.Lock()
 
     def _get_active_lists(self) -> list:
         """
@@ -48,82 +60,137 @@ class Scheduler:
                 active.append(lst)
         return active
 
-    def schedule_tasks(self, work_start_hour: int = 6, work_end_hour: int = 22):
+    def _has_schedule_marker(self, task: dict) -> bool:
         """
-        未スケジュールタスクを取得・分析し、カレンダーに登録する一連の処理を実行。
+        タスクに登録済み（【予定済】の接頭辞・メモ欄の [Ref:EventID:]）の目印があるかを判定する。
         """
-        self.log("スケジューリング処理を開始します...")
+        return task.get('title', '').startswith(self.SCHEDULED_PREFIX) or ("[Ref:EventID:" in task.get('notes', ''))
+
+    def get_unscheduled_tasks(self) -> list:
+        """
+        処理対象のリストにある未スケジュールのタスクを (リストID, タスク) の配列で返す。
+        （AIの分析・ステートの更新は行わない。常駐モードで新たな対象の有無を確認するために使用）
+        """
+        return [
+            (lst['id'], task)
+            for lst in self._get_active_lists()
+            for task in self.tasks.get_tasks(lst['id'])
+            if not self._has_schedule_marker(task) and not task.get('title', '').startswith(self.SPLIT_PREFIX)
+        ]
+
+    def _collect_list_targets(self, lst: dict, task_ids=None) -> tuple:
+        """
+        1つのリストから未スケジュールのタスクを収集し、AIによる順序最適化と重複削除を行う。
+        task_ids を指定した場合は、そのIDのタスクのみを対象とする。
+        ワーカースレッドから呼ばれるため、ログは直接出力せずに配列で返す。
+        戻り値: (順序最適化済みの対象タスク配列, 紐付けを解除すべきタスクID配列, ログ行の配列)
+        """
+        list_id = lst['id']
+        list_title = lst.get('title', 'Unknown')
+        log_lines = []
+        unlinked_task_ids = []
+        # 未完了タスクのみを取得（showCompleted=Falseはデフォルト）
+        tasks = self.tasks.get_tasks(list_id)
         
-        active_lists = self._get_active_lists()
-        target_tasks = []
+        list_target_tasks = []
         
-        # 1. 各リストから未完了・未スケジュールのタスクを収集し、AIで順序最適化させる
-        for lst in active_lists:
-            list_id = lst['id']
-            list_title = lst.get('title', 'Unknown')
-            # 未完了タスクのみを取得（showCompleted=Falseはデフォルト）
-            tasks = self.tasks.get_tasks(list_id)
+        for task in tasks:
+            title = task.get('title', '')
+            task_id = task['id']
+            if task_ids is not None and task_id not in task_ids:
+                continue
             
-            list_target_tasks = []
+            # ===== 予定のキャンセルの検知 (Tasks -> Cal) =====
+            mapped_event_id = self.state.get_event_id(task_id)
+            # 万が一過去に登録したタスクだが、手動で接頭辞やメモ欄のIDが消されている場合、
+            # ユーザーが「未登録に戻した」と判定して紐付けを解除する。
+            if mapped_event_id:
+                 if not self._has_schedule_marker(task):
+                     log_lines.append(f"[{title}] はユーザーにより予定が取り消されました。再登録対象とします。")
+                     unlinked_task_ids.append(task_id)
+                     mapped_event_id = None # クリアして以後の処理を通す
             
-            for task in tasks:
-                title = task.get('title', '')
-                notes = task.get('notes', '')
-                task_id = task['id']
-                
-                # ===== 予定のキャンセルの検知 (Tasks -> Cal) =====
-                mapped_event_id = self.state.get_event_id(task_id)
-                # 万が一過去に登録したタスクだが、手動で接頭辞やメモ欄のIDが消されている場合、
-                # ユーザーが「未登録に戻した」と判定して紐付けを解除する。
-                if mapped_event_id:
-                     is_still_scheduled = title.startswith(self.SCHEDULED_PREFIX) or ("[Ref:EventID:" in notes)
-                     if not is_still_scheduled:
-                         self.log(f"[{title}] はユーザーにより予定が取り消されました。再登録対象とします。")
-                         self.state.remove_link(task_id)
-                         mapped_event_id = None # クリアして以後の処理を通す
+            # 既に【予定済】の接頭辞があるか、メモ欄に [Ref:EventID:] の目印がある場合はスキップ
+            if self._has_schedule_marker(task) or mapped_event_id:
+                continue
+            # 既にコンテナとなっている親タスクもスキップ
+            if title.startswith(self.SPLIT_PREFIX):
+                continue
                 
-                # 既に【予定済】の接頭辞があるか、メモ欄に [Ref:EventID:] の目印がある場合はスキップ
-                if title.startswith(self.SCHEDULED_PREFIX) or ("[Ref:EventID:" in notes) or mapped_event_id:
-                    continue
-                # 既にコンテナとなっている親タスクもスキップ
-                if title.startswith(self.SPLIT_PREFIX):
-                    continue
+            list_target_tasks.append({
+                "list_id": list_id,
+                "task": task
+            })
+            
+        # リスト内に複数件のタスクがあればAIにて最適順序にソートする
+        if len(list_target_tasks) > 1:
+            log_lines.append(f"◆◆◆ 【{list_title}】リストのタスク実行順序をAIが最適化しています...")
+            sort_result = self.gemini.sort_tasks_order(list_target_tasks)
+            
+            # 重複タスクの処理
+            duplicates = sort_result.get("duplicates", [])
+            if duplicates:
+                # 削除後（ゴミ箱内）でも判別しやすくするため、タイトルとメモを更新してから削除する
+                # （更新・削除はそれぞれバッチリクエストでまとめて送信する）
+                batch = self.tasks.batch()
+                updates = []
+                for dup_item in duplicates:
+                    dup_task = dup_item["task"]
+                    dup_title = dup_task.get("title", "")
+                    dup_notes = dup_task.get("notes", "")
                     
-                list_target_tasks.append({
-                    "list_id": list_id,
-                    "task": task
-                })
+                    log_lines.append(f"  -> [重複削除] AIが重複と判定したタスクを削除します: {dup_title}")
+                    dup_task["title"] = f"★重複★{dup_title}"
+                    dup_task["notes"] = f"{dup_notes}\n重複タスクゆえ削除".strip()
+                    updates.append((dup_task, batch.update(list_id, dup_task["id"], dup_task)))
+                update_results = batch.execute()
                 
-            # リスト内に複数件のタスクがあればAIにて最適順序にソートする
-            if list_target_tasks:
-                if len(list_target_tasks) > 1:
-                    self.log(f"◆◆◆ 【{list_title}】リストのタスク実行順序をAIが最適化しています...")
-                    sort_result = self.gemini.sort_tasks_order(list_target_tasks)
+                # 更新に成功したものだけをGoogle Tasksから削除（ゴミ箱へ）
+                deletions = []
+                for dup_task, index in updates:
+                    if update_results[index]["ok"]:
+                        deletions.append((dup_task, batch.delete(list_id, dup_task["id"])))
+                    else:
+                        log_lines.append(f"     (削除エラー: {update_results[index]['error']})")
+                delete_results = batch.execute()
+                for dup_task, index in deletions:
+                    if not delete_results[index]["ok"]:
+                        log_lines.append(f"     (削除エラー: {delete_results[index]['error']})")
                     
-                    # 重複タスクの処理
-                    duplicates = sort_result.get("duplicates", [])
-                    for dup_item in duplicates:
-                        dup_task = dup_item["task"]
-                        dup_id = dup_task["id"]
-                        dup_title = dup_task.get("title", "")
-                        dup_notes = dup_task.get("notes", "")
-                        
-                        self.log(f"  -> [重複削除] AIが重複と判定したタスクを削除します: {dup_title}")
-                        try:
-                            # 削除後（ゴミ箱内）でも判別しやすくするため、タイトルとメモを更新してから削除する
-                            dup_task["title"] = f"★重複★{dup_title}"
-                            dup_task["notes"] = f"{dup_notes}\n重複タスクゆえ削除".strip()
-                            self.tasks.update_task(list_id, dup_id, dup_task)
-                            
-                            # 更新後にGoogle Tasksから削除（ゴミ箱へ）
-                            self.tasks.delete_task(list_id, dup_id)
-                        except Exception as e:
-                            self.log(f"     (削除エラー: {e})")
-                            
-                    sorted_list_tasks = sort_result.get("sorted", [])
-                    target_tasks.extend(sorted_list_tasks)
-                else:
-                    target_tasks.extend(list_target_tasks)
+            list_target_tasks = sort_result.get("sorted", [])
+            
+        return list_target_tasks, unlinked_task_ids, log_lines
+
+    def schedule_tasks(self, work_start_hour: int = 6, work_end_hour: int = 22, task_ids=None):
+        """
+        未スケジュールタスクを取得・分析し、カレンダーに登録する一連の処理を実行。
+        task_ids を指定した場合は、そのIDのタスクのみを対象とする（常駐モードの差分処理で使用）。
+        処理フェーズごとの所要時間とAPI呼び出しを計測し、終了時に集計をログへ出力する。
+        """
+        with instrumentation.run("schedule_tasks", self.log):
+            self._schedule_tasks(work_start_hour, work_end_hour, set(task_ids) if task_ids is not None else None)
+
+    def _schedule_tasks(self, work_start_hour: int, work_end_hour: int, task_ids=None):
+        self.log("スケジューリング処理を開始します...")
+        
+        active_lists = self._get_active_lists()
+        target_tasks = []
+        
+        # 1. 各リストから未完了・未スケジュールのタスクを収集し、AIで順序最適化させる
+        #    リスト同士は独立しているため、同時実行数を制限したスレッドプールで並行処理し、
+        #    結果とログは元のリスト順に統合する（逐次処理と同じ結果になる）
+        max_workers = max(1, min(Config.TASKS_MAX_CONCURRENCY, len(active_lists)))
+        with instrumentation.span("collect_lists"), ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list_results = list(executor.map(lambda lst: self._collect_list_targets(lst, task_ids), active_lists))
+            
+        # ステートの更新はメインスレッドでまとめて行い、1回のコミットで保存する
+        with self.state.transaction():
+            for list_target_tasks, unlinked_task_ids, log_lines in list_results:
+                for line in log_lines:
+                    self.log(line)
+                for task_id in unlinked_task_ids:
+                    self.state.remove_link(task_id)
+                target_tasks.extend(list_target_tasks)
         
         if not target_tasks:
             self.log("スケジューリング対象の未登録タスクはありません。")
@@ -131,11 +198,42 @@ class Scheduler:
             
         self.log(f"{len(target_tasks)}件のタスクをスケジューリング対象として処理します。")
 
+        # 2〜6. 空き時間の取得から予定登録までは、並行して実行された他の処理と重ならないように直列化する
+        with self._placement_lock:
+            self._schedule_targets(target_tasks, work_start_hour, work_end_hour)
+
+        cache_stats = self.gemini.cache_stats()
+        if cache_stats:
+            self.log(f"AI応答キャッシュ(起動後の累計): ヒット {cache_stats['hits']}件 / ミス {cache_stats['misses']}件")
+        self.log("スケジューリング処理が完了しました。")
+
+    def _schedule_targets(self, target_tasks: list, work_start_hour: int, work_end_hour: int):
+        """
+        収集済みの対象タスクを分析・分割し、空き時間へ配置してカレンダーに登録する。
+        Config.SCHEDULE_PIPELINE_ENABLED が有効な場合は、分析と書き込みを重ねて実行するパイプラインで処理する
+        （配置結果は逐次処理と同じになる）。
+        """
         # 2. カレンダーの空き時間情報を取得 (本日から最大2週間先まで)
         now = datetime.datetime.now(datetime.timezone.utc)
         two_weeks_later = now + datetime.timedelta(days=14)
-        
-        freebusy_data = self.calendar.get_free_busy(time_min=now, time_max=two_weeks_later)
+        busy_timeline = self._build_busy_timeline(now, two_weeks_later, work_start_hour, work_end_hour)
+
+        # 検索開始時間を直近の15分単位の時刻にする(UTC)
+        search_start = BusyTimeline.snap_up(now)
+        planner = PlacementPlanner(busy_timeline, search_start, two_weeks_later)
+
+        self.log(f"{len(target_tasks)}件のタスクをAIで一括分析しています... (同時実行数: {Config.GEMINI_MAX_CONCURRENCY})")
+        if Config.SCHEDULE_PIPELINE_ENABLED:
+            SchedulingPipeline(self, planner).run(target_tasks)
+        else:
+            self._schedule_targets_serially(target_tasks, planner)
+
+    def _build_busy_timeline(self, now: datetime.datetime, time_max: datetime.datetime, work_start_hour: int, work_end_hour: int) -> BusyTimeline:
+        """
+        カレンダーの Busy 期間に時間外ブロックを加え、マージ済みの BusyTimeline を返す。
+        """
+        with instrumentation.span("free_busy"):
+            freebusy_data = self.calendar.get_free_busy(time_min=now, time_max=time_max)
         self.log(f"APIからのBusy期間の取得数: {len(freebusy_data)}")
         
         # --- 架空のBusy（時間外ブロック）を注入 ---
@@ -162,54 +260,86 @@ class Scheduler:
             
         self.log(f"※時間外ブロックを注入しました（現在の総Busyブロック数={len(freebusy_data)}）")
         
-        # 検索開始時間を直近の15分単位の時刻にする(UTC)
-        search_start = now
-        remainder = search_start.minute % 15
-        search_start += datetime.timedelta(minutes=15 - remainder, seconds=-search_start.second, microseconds=-search_start.microsecond)
-
-        # 3. 各タスクの処理 (分析・分割・予定登録)
-        for item in target_tasks:
-            list_id = item["list_id"]
-            task = item["task"]
-            title = task.get('title', '')
-            notes = task.get('notes', '')
-            task_id = task['id']
-            
-            # 明示的な時間指定のパース (末尾の [:：][数値][HhMmＨｈＭｍ])
-            import re
-            match = re.search(r'[:：]\s*([0-9０-９]+)\s*([HhMmＨｈＭｍ])\s*$', title)
-            explicit_duration = None
-            if match:
-                num_str = match.group(1).translate(str.maketrans('０１２３４５６７８９', '0123456789'))
-                unit_str = match.group(2).lower().translate(str.maketrans('ｈｍ', 'hm'))
-                val = int(num_str)
-                explicit_duration = val * 60 if unit_str == 'h' else val
-                
-                # 要望によりタイトル内の時間指定部分（:30mなど）は削除せずそのまま残す
-                # title = title[:match.start()].strip()
-                # task['title'] = title
-            
-            self.log(f"---\nタスク '{title}' を処理中...")
-            if explicit_duration:
-                self.log(f"  -> 明示的な所要時間の指定を検出しました: {explicit_duration}分")
-            
-            # Geminiによる詳細分析
-            analysis = self.gemini.analyze_task(title, notes)
+        # Busy期間を一度だけパース・ソート・マージし、以後の空き枠探索は二分探索で行う
+        busy_timeline = BusyTimeline(freebusy_data)
+        self.log(f"  -> 重複を統合したBusy区間数: {len(busy_timeline)}")
+        return busy_timeline
+
+    def _schedule_targets_serially(self, target_tasks: list, planner: PlacementPlanner):
+        """
+        分析 → 分割 → 配置 → 書き込みを、それぞれ全件の完了を待ってから順に実行する。
+        """
+        # 3. 全対象タスクのAI分析を一括で実行する (結果は target_tasks と同じ順序で返る)
+        with instrumentation.span("analyze"):
+            analyses = self._analyze_targets(target_tasks)
+
+        # 4. 分析結果を元にタスクの分割を行い、カレンダーへの配置要求を作成する
+        #    （親タスクの名称変更・子タスクの作成はバッチリクエストでまとめて送信する）
+        placement_requests = []
+        split_batch = self.tasks.batch()
+        split_jobs = []
+        for order, (item, analysis) in enumerate(zip(target_tasks, analyses)):
+            kind, value = self._prepare_target(order, item, analysis, split_batch)
+            if kind == "place":
+                placement_requests.append(value)
+            elif kind == "split":
+                split_jobs.append(value)
+
+        if split_jobs:
+            with instrumentation.span("split_tasks"):
+                split_results = split_batch.execute()
+            placement_requests.extend(self._split_placement_requests(split_jobs, split_results))
+
+        if not placement_requests:
+            return
+
+        # 5. 全タスクの配置を一括で計算する (期限・重要度・順序を考慮してビットマップ上に詰める)
+        with instrumentation.span("plan"):
+            plan = planner.plan(placement_requests)
+        self.log(f"---\n{len(plan)}件の予定の配置を計算しました。カレンダーへ登録します。")
+        
+        # 6. 計画をまとめて適用 (カレンダー登録・タスク更新)
+        with instrumentation.span("apply_plan"):
+            self._apply_plan(plan)
+
+    def _prepare_target(self, order: int, item: dict, analysis: dict, split_batch) -> tuple:
+        """
+        分析済みの対象タスク1件を、配置要求・分割・承認待ちのいずれかとして処理する。
+        戻り値は ("place", 配置要求) / ("split", (配置要求の共通情報, 親タスクID, 子タスク作成の結果番号)) /
+        ("pending", None) のいずれか。分割する場合は、親タスクの名称変更と子タスクの作成を split_batch に積む。
+        """
+        list_id = item["list_id"]
+        task = item["task"]
+        title = task.get('title', '')
+        notes = task.get('notes', '')
+        task_id = task['id']
+        
+        explicit_duration = self._parse_explicit_duration(title)
+        
+        self.log(f"---\nタスク '{title}' を処理中...")
+        if explicit_duration:
+            self.log(f"  -> 明示的な所要時間の指定を検出しました: {explicit_duration}分")
             
-            # 明示的な時間指定があれば優先して適用し、AIによる勝手なタスク分割を抑制する
-            if explicit_duration is not None:
-                analysis["duration_minutes"] = explicit_duration
-                analysis["recommended_subtasks"] = []
-                
-            subtasks = analysis.get("recommended_subtasks", [])
+        subtasks = analysis.get("recommended_subtasks", [])
+        
+        # 配置の優先度に用いる共通情報（期限・重要度・リスト内順序）
+        request_base = {
+            "list_id": list_id,
+            "analysis": analysis,
+            "duration_minutes": self._round_duration(analysis),
+            "importance": self._parse_importance(analysis),
+            "deadline": self._parse_due(task.get('due')),
+            "order": order,
+        }
+        
+        # タスク分割の判定
+        # threshold を超えた場合は UI側での承認待ちとしてキューに置く (今回は即時カレンダー化せず保留)
+        if len(subtasks) >= self.OVER_SPLIT_THRESHOLD:
+            self.log(f"  -> [保留] 分割数({len(subtasks)}個)が閾値(n={self.OVER_SPLIT_THRESHOLD})以上の過剰分割と判定されました。")
+            self.log(f"  -> ユーザーの確認と承認が必要です。")
             
-            # タスク分割の判定
-            # threshold を超えた場合は UI側での承認待ちとしてキューに置く (今回は即時カレンダー化せず保留)
-            if len(subtasks) >= self.OVER_SPLIT_THRESHOLD:
-                self.log(f"  -> [保留] 分割数({len(subtasks)}個)が閾値(n={self.OVER_SPLIT_THRESHOLD})以上の過剰分割と判定されました。")
-                self.log(f"  -> ユーザーの確認と承認が必要です。")
-                
-                # 保留リストへ格納。UIからこの配列をチェックさせる想定
+            # 保留リストへ格納。UIからこの配列をチェックさせる想定
+            with self._pending_lock:
                 self.pending_split_tasks.append({
                     "original_task_id": task_id,
                     "list_id": list_id,
@@ -217,87 +347,225 @@ class Scheduler:
                     "notes": notes,
                     "analysis": analysis
                 })
+            return "pending", None
+            
+        elif len(subtasks) > 1:
+            # 正常な範囲でのサブタスク分割実行
+            self.log(f"  -> {len(subtasks)}個のサブタスクに分割します。")
+            
+            # 元タスクの名称を【分割済】に変更
+            new_title = f"{self.SPLIT_PREFIX}{title}"
+            task['title'] = new_title
+            split_batch.update(list_id, task_id, task)
+            
+            # 子タスクをタスクリストへ登録
+            insert_indexes = [split_batch.insert(list_id, sub_title, f"Parent: {title}") for sub_title in subtasks]
+            return "split", (request_base, task_id, insert_indexes)
+
+        # 単一タスクの場合の通常スケジュール登録
+        return "place", dict(request_base, task=task)
+
+    def _split_placement_requests(self, split_jobs: list, split_results: list) -> list:
+        """
+        分割のバッチ送信結果から、作成できた子タスクの配置要求を作成する。
+        """
+        placement_requests = []
+        for request_base, task_id, insert_indexes in split_jobs:
+            for seq, index in enumerate(insert_indexes):
+                result = split_results[index]
+                if result["ok"] and result["response"]:
+                    # 子タスクは親単位のグループとして、分割順の前後関係を保ったまま配置する
+                    placement_requests.append(dict(request_base, task=result["response"], group=task_id, seq=seq))
+                else:
+                    self.log(f"  -> (注意) サブタスクの作成に失敗しました: {result['error']}")
+        return placement_requests
+
+    def _apply_plan(self, plan: list):
+        """
+        配置計画をバッチリクエストでまとめて適用する。
+        カレンダーへの予定登録 → 登録できたタスクへの【予定済】の印とIDの付与 → ステートへの紐付け、の順に処理する。
+        """
+        self._raise_for_failed_registrations(self._write_placements(plan))
+
+    def _write_placements(self, plan: list) -> list:
+        """
+        _apply_plan の書き込み処理。カレンダーへの登録に失敗したタスクのタイトルの配列を返す。
+        （一括登録の通信自体が失敗した場合は ValueError を送出する）
+        """
+        jst_tz = datetime.timezone(datetime.timedelta(hours=9))
+        events = []
+        for placement in plan:
+            request = placement["item"]
+            task = request["task"]
+            title = task.get('title', '')
+            if placement["deadline_missed"]:
+                self.log(f"  -> (注意) 「{title}」は期限内に空き枠が見つからなかったため、期限後に配置します。")
+            start_jst = placement["start"].astimezone(jst_tz)
+            end_jst = placement["end"].astimezone(jst_tz)
+            self.log(f"  -> 「{title}」をカレンダーへイベント登録中... [{start_jst.strftime('%m/%d %H:%M')} - {end_jst.strftime('%H:%M')} , 予定: {request['duration_minutes']}分]")
+            events.append({
+                "summary": f"◆{title}", # 仕様変更：カレンダー側の予定タイトル先頭に◆を付与
+                "description": task.get('notes', ''),
+                "start_time": placement["start"],
+                "end_time": placement["end"],
+            })
+            
+        try:
+            event_ids = self.calendar.insert_events(events)
+        except Exception as e:
+            error_msg = f"カレンダーへの一括登録時にエラーが発生しました。\nネットワーク接続や認証設定を確認してください。\n詳細: {str(e)}"
+            self.log(f"  -> {error_msg}")
+            traceback.print_exc()
+            # UI側で重要なエラーとしてダイアログ表示させるため ValueError を発生させる
+            raise ValueError(error_msg)
+            
+        # タスク側へ【予定済】の印とIDを付与して更新（バッチでまとめて送信）
+        batch = self.tasks.batch()
+        updates = []
+        failed_titles = []
+        for placement, event_id in zip(plan, event_ids):
+            request = placement["item"]
+            task = request["task"]
+            title = task.get('title', '')
+            if not event_id:
+                failed_titles.append(title)
                 continue
+            task['title'] = f"{self.SCHEDULED_PREFIX}{title}"
+            task['notes'] = f"{task.get('notes', '')}\n\n[Ref:EventID:{event_id}]"
+            updates.append((title, task, event_id, batch.update(request["list_id"], task['id'], task)))
+            
+        results = batch.execute()
+        # この書き込み（1回のバッチ分）の紐付けは1回のコミットにまとめて保存する
+        # （パイプラインでは書き込みのバッチごとにコミットし、それまでに登録した予定の紐付けを失わないようにする）
+        with self.state.transaction():
+            for title, task, event_id, index in updates:
+                if results[index]["ok"]:
+                    self.state.link_task_to_event(task['id'], event_id)
+                    self.log(f"  -> {title} のカレンダー登録・タスク更新が完了しました。")
+                else:
+                    self.log(f"  -> (注意) 「{title}」は予定(ID: {event_id})を登録しましたが、タスクの更新に失敗しました: {results[index]['error']}")
                 
-            elif len(subtasks) > 1:
-                # 正常な範囲でのサブタスク分割実行
-                self.log(f"  -> {len(subtasks)}個のサブタスクに分割します。")
-                
-                # 元タスクの名称を【分割済】に変更
-                new_title = f"{self.SPLIT_PREFIX}{title}"
-                task['title'] = new_title
-                self.tasks.update_task(list_id, task_id, task)
-                
-                # 子タスクを作成
-                for sub_title in subtasks:
-                    # 子タスクをタスクリストへ登録
-                    new_task_body = self.tasks.insert_task(list_id, sub_title, f"Parent: {title}")
-                    if new_task_body:
-                         # 子タスクのスケジュール登録
-                         search_start = self._schedule_single_task(list_id, new_task_body, analysis, freebusy_data, search_start)
-
-            else:
-                # 単一タスクの場合の通常スケジュール登録
-                search_start = self._schedule_single_task(list_id, task, analysis, freebusy_data, search_start)
+        return failed_titles
 
-        self.log("スケジューリング処理が完了しました。")
+    def _raise_for_failed_registrations(self, failed_titles: list):
+        if failed_titles:
+            error_msg = f"{len(failed_titles)}件のタスクのカレンダー登録に失敗しました。\nネットワーク接続や認証設定を確認してください。\n対象: {', '.join(failed_titles)}"
+            self.log(f"  -> {error_msg}")
+            # UI側で重要なエラーとしてダイアログ表示させるため ValueError を発生させる
+            raise ValueError(error_msg)
 
-    def _schedule_single_task(self, list_id: str, task: dict, analysis: dict, freebusy_data: list, search_start: datetime.datetime):
+    @staticmethod
+    def _parse_explicit_duration(title: str):
         """
-        単一のタスクをカレンダーの空き時間に登録し、タスクの名称・メモを更新する内部処理。
+        タイトル末尾の明示的な時間指定 ([:：][数値][HhMmＨｈＭｍ]) を分単位で返す。指定が無ければ None。
         """
-        title = task.get('title', '')
-        notes = task.get('notes', '')
-        task_id = task['id']
-        # 15分単位にするため不足分を切り上げる（最低15分）
-        base_dur = analysis.get("duration_minutes", 30)
+        match = re.search(r'[:：]\s*([0-9０-９]+)\s*([HhMmＨｈＭｍ])\s*$', title)
+        if not match:
+            return None
+        num_str = match.group(1).translate(str.maketrans('０１２３４５６７８９', '0123456789'))
+        unit_str = match.group(2).lower().translate(str.maketrans('ｈｍ', 'hm'))
+        val = int(num_str)
+        # 要望によりタイトル内の時間指定部分（:30mなど）は削除せずそのまま残す
+        return val * 60 if unit_str == 'h' else val
+
+    def _analyze_targets(self, target_tasks: list) -> list:
+        """
+        対象タスク全件を GeminiAdapter の一括分析APIでまとめて分析する。
+        （リクエストはサイズ上限ごとのチャンクに分割され、同時実行数を制限して並行実行される）
+        戻り値は target_tasks と同じ順序の分析結果の配列（配置順序を決定的に保つため）。
+        """
+        batch_results = self.gemini.analyze_tasks_batch([item["task"] for item in target_tasks])
+        return [self._finalize_analysis(item["task"], batch_results.get(item["task"]['id'], {})) for item in target_tasks]
+
+    def _finalize_analysis(self, task: dict, analysis: dict) -> dict:
+        """
+        AIの分析結果に、タイトルの明示的な時間指定を反映した複製を返す。
+        """
+        analysis = dict(analysis)
+        # 明示的な時間指定があれば優先して適用し、AIによる勝手なタスク分割を抑制する
+        explicit_duration = self._parse_explicit_duration(task.get('title', ''))
+        if explicit_duration is not None:
+            analysis["duration_minutes"] = explicit_duration
+            analysis["recommended_subtasks"] = []
+        return analysis
+
+    @staticmethod
+    def _round_duration(analysis: dict) -> int:
+        """
+        AIの推定所要時間を15分単位に切り上げる（最低15分）。
+        """
+        try:
+            base_dur = int(analysis.get("duration_minutes", 30))
+        except (TypeError, ValueError):
+            base_dur = 30
         rem = base_dur % 15
         duration = base_dur if rem == 0 else base_dur + (15 - rem)
+        return max(duration, 15)
+
+    @staticmethod
+    def _parse_importance(analysis: dict) -> int:
+        # 1〜5 の範囲外の値は範囲内に丸める（配置の優先度計算が重要度の上限を前提とするため）
+        try:
+            importance = int(analysis.get("importance", 3))
+        except (TypeError, ValueError):
+            return 3
+        return min(max(importance, 1), PlacementPlanner.MAX_IMPORTANCE)
+
+    @staticmethod
+    def _parse_due(due: str):
+        """
+        Google Tasks の期限 ('2024-01-31T00:00:00.000Z'、日付部分のみ有効) を、
+        その日の終わり（JSTの翌日0時）を表す datetime に変換する。期限が無ければ None を返す。
+        """
+        if not due:
+            return None
+        try:
+            due_date = datetime.date.fromisoformat(due[:10])
+        except ValueError:
+            return None
+        jst_tz = datetime.timezone(datetime.timedelta(hours=9))
+        return datetime.datetime.combine(due_date + datetime.timedelta(days=1), datetime.time(0, 0), tzinfo=jst_tz)
+
+    def _schedule_single_task(self, list_id: str, task: dict, analysis: dict, busy_timeline: BusyTimeline, search_start: datetime.datetime = None):
+        """
+        単一のタスクをカレンダーの空き時間に登録し、タスクの名称・メモを更新する内部処理。
+        （UIからの承認タスクなど、一括計画を経由しない個別登録で使用する）
+        busy_timeline には freebusy 形式の配列を渡すこともできる（その場合は内部で BusyTimeline に変換する）。
+        """
+        duration = self._round_duration(analysis)
         
-        # ISO形式の文字列をdatetime(UTC)に変換するヘルパー
-        def parse_iso(ts_str):
-            # Google APIの '2023-01-01T10:00:00Z' や '+09:00' に対応
-            ts_str = ts_str.replace('Z', '+00:00')
-            return datetime.datetime.fromisoformat(ts_str)
+        if not isinstance(busy_timeline, BusyTimeline):
+            busy_timeline = BusyTimeline(busy_timeline)
+        if search_start is None:
+            search_start = BusyTimeline.snap_up(datetime.datetime.now(datetime.timezone.utc))
             
         # -----------------------------
         # 空き時間 (free space) 探索ロジック
         # -----------------------------
-        candidate_start = search_start
-        while True:
-            candidate_end = candidate_start + datetime.timedelta(minutes=duration)
-            conflict = False
-            
-            for busy in freebusy_data:
-                b_start = parse_iso(busy['start'])
-                b_end = parse_iso(busy['end'])
-                
-                # 候補時間がbusy期間に被っているか検出
-                latest_start = max(candidate_start, b_start)
-                earliest_end = min(candidate_end, b_end)
-                
-                if latest_start < earliest_end:  # overlap exists
-                    conflict = True
-                    # 候補をbusyの終了時刻まで移動させる
-                    candidate_start = b_end
-                    # 新しいcandidate_startを15分スナップに乗せる
-                    rem = candidate_start.minute % 15
-                    if rem != 0 or candidate_start.second != 0 or candidate_start.microsecond != 0:
-                        candidate_start += datetime.timedelta(minutes=15 - rem, seconds=-candidate_start.second, microseconds=-candidate_start.microsecond)
-                    break
-            
-            if not conflict:
-                # オーバーラップするbusy期間がなければ、ここを空き時間として決定
-                start_time = candidate_start
-                end_time = candidate_end
-                break
+        # マージ済みBusy区間を二分探索し、最初に収まる枠を決定する
+        start_time, end_time = busy_timeline.find_first_fit(search_start, duration)
+        # メモリ上のBusy区間に今回の登録分をマージし、直後のタスクが被らないようにする
+        busy_timeline.add(start_time, end_time)
+
+        self._register_event(list_id, task, start_time, end_time, duration)
+             
+        # 次の検索開始時間をこのタスクの終了直後として返す
+        return end_time
+
+    def _register_event(self, list_id: str, task: dict, start_time: datetime.datetime, end_time: datetime.datetime, duration: int):
+        """
+        決定済みの枠でカレンダーへ予定を登録し、タスクへ【予定済】の印とイベントIDを付与する。
+        """
+        title = task.get('title', '')
+        notes = task.get('notes', '')
+        task_id = task['id']
 
         # 日本時間(JST)でログ出力するためのフォーマット
         jst_tz = datetime.timezone(datetime.timedelta(hours=9))
         start_jst = start_time.astimezone(jst_tz)
         end_jst = end_time.astimezone(jst_tz)
         
-        self.log(f"  -> 「{title}」をカレンダーへイベント登録中... [{start_jst.strftime('%H:%M')} - {end_jst.strftime('%H:%M')} , 予定: {duration}分]")
+        self.log(f"  -> 「{title}」をカレンダーへイベント登録中... [{start_jst.strftime('%m/%d %H:%M')} - {end_jst.strftime('%H:%M')} , 予定: {duration}分]")
         try:
              # カレンダーAPIへ登録
              event = self.calendar.insert_event(
@@ -310,12 +578,6 @@ class Scheduler:
              event_id = event.get('id')
              
              if event_id:
-                 # メモリ上のbusyリストに今回の登録分を追加し、直後のタスクが被らないようにする
-                 freebusy_data.append({
-                     'start': event['start'].get('dateTime', event['start'].get('date')),
-                     'end': event['end'].get('dateTime', event['end'].get('date'))
-                 })
-                 
                  # タスク側へ【予定済】の印とIDを付与して更新
                  new_title = f"{self.SCHEDULED_PREFIX}{title}"
                  new_notes = f"{notes}\n\n[Ref:EventID:{event_id}]"
@@ -333,59 +595,123 @@ class Scheduler:
              traceback.print_exc()
              # UI側で重要なエラーとしてダイアログ表示させるため ValueError を発生させる
              raise ValueError(error_msg)
-             
-        # 次の検索開始時間をこのタスクの終了直後として返す
-        return end_time
 
-    def undo_scheduled_tasks(self):
+    def take_pending_split(self, original_task_id: str) -> dict:
+        """
+        承認待ちリストから指定したタスクを取り出す。既に取り出されている場合は None を返す。
+        （UIの再描画前に同じボタンが複数回押されても、同じタスクが二重に処理されないようにする）
+        """
+        with self._pending_lock:
+            for index, pending in enumerate(self.pending_split_tasks):
+                if pending["original_task_id"] == original_task_id:
+                    return self.pending_split_tasks.pop(index)
+        return None
+
+    def drain_pending_splits(self) -> list:
+        """
+        承認待ちリストの全てのタスクを取り出し、承認待ちリストを空にする。
+        """
+        with self._pending_lock:
+            pending = list(self.pending_split_tasks)
+            self.pending_split_tasks.clear()
+        return pending
+
+    def approve_split_task(self, pending: dict):
+        """
+        ユーザーが承認した過剰分割タスクを分割し、サブタスクを空き時間へ順に登録する。
+        """
+        list_id = pending["list_id"]
+        task_id = pending["original_task_id"]
+        title = pending["title"]
+        analysis = pending["analysis"]
+        subtasks = analysis.get("recommended_subtasks", [])
+
+        # 親タスク更新
+        self.tasks.update_task(list_id, task_id, {"title": f"{self.SPLIT_PREFIX}{title}"})
+
+        with self._placement_lock:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            freebusy_data = self.calendar.get_free_busy(now, now + datetime.timedelta(days=14))
+            # 複数のサブタスク間で登録済みの枠を共有するため、Busy区間は一度だけ構築する
+            busy_timeline = BusyTimeline(freebusy_data)
+            search_start = None
+            for sub_title in subtasks:
+                new_task_body = self.tasks.insert_task(list_id, sub_title, f"Parent: {title}")
+                if new_task_body:
+                    search_start = self._schedule_single_task(list_id, new_task_body, analysis, busy_timeline, search_start)
+
+    def undo_scheduled_tasks(self, delete_events: bool = False):
         """
         （テスト用機能）
         「【予定済】」となっているタスクから接頭辞とメモ欄のEventID表記を削除し、
         タスク側のみを未スケジュールの状態に復元する。
-        ※ カレンダーの予定自体はこの処理では削除されません。
+        対象はステートの紐付けと、タイトル・メモの目印の検索（ローカルミラー上）から特定し、
+        完了・削除済み等で見つからないタスクの紐付けは解除する（delete_events=True の場合は予定も削除する）。
+        変更のあった項目（タイトル・メモ）のみをバッチリクエストでまとめて部分更新する。
+        ※ カレンダーの予定自体は delete_events=True の場合のみ、まとめて削除されます。
         """
-        import re
         self.log("元に戻す(Undo) 処理を開始します...")
         
         all_lists = self.tasks.get_tasklists()
+        links = self.state.get_all_links()
+        candidates = self.tasks.find_tasks(
+            [lst['id'] for lst in all_lists],
+            [self.SCHEDULED_PREFIX, self.SPLIT_PREFIX, "[Ref:EventID:"],
+            task_ids=links.keys()
+        )
         undo_count = 0
+        # 復元内容はバッチリクエストでまとめて送信する
+        batch = self.tasks.batch()
+        reverted = []
+        # タスクの変更が不要で、紐付けの解除のみ行うタスク
+        # （完了・削除済みなどで見つからなかったタスクの紐付けも解除し、予定は削除対象に含める）
+        found_task_ids = {task['id'] for _, task in candidates}
+        unlinked = [task_id for task_id in links if task_id not in found_task_ids]
+        event_ids = [links[task_id] for task_id in unlinked if links[task_id]]
         
-        for lst in all_lists:
-            list_id = lst['id']
-            # すべてのタスクを取得（完了済み等も必要に応じて含む場合は show_completed=True 等を要検討だが今回はデフォルト）
-            tasks = self.tasks.get_tasks(list_id)
+        for list_id, task in candidates:
+            title = task.get('title', '')
+            notes = task.get('notes', '')
+            task_id = task['id']
+            self.log(f"  -> 対象タスク発見: {title}")
             
-            for task in tasks:
-                title = task.get('title', '')
-                notes = task.get('notes', '')
-                task_id = task['id']
-                
-                is_scheduled_title = self.SCHEDULED_PREFIX in title
-                is_split_title = self.SPLIT_PREFIX in title
-                has_event_id_note = "[Ref:EventID:" in notes
-                
-                if is_scheduled_title or is_split_title or has_event_id_note:
-                    self.log(f"  -> 対象タスク発見: {title}")
+            if links.get(task_id):
+                event_ids.append(links[task_id])
+            event_ids.extend(re.findall(r'\[Ref:EventID:(.*?)\]', notes))
+            
+            # 1. タイトルの復元
+            new_title = title.replace(self.SCHEDULED_PREFIX, "").replace(self.SPLIT_PREFIX, "").strip()
+            # 2. メモの復元 (ID部分のみ正規表現で削除する)
+            #    改行を含めて綺麗に消すパターン: 0個以上の改行 + [Ref:EventID:任意の文字列]
+            new_notes = re.sub(r'\n*\[Ref:EventID:.*?\]\n*', '', notes).strip() if "[Ref:EventID:" in notes else notes
+            
+            fields = {}
+            if new_title != title:
+                fields['title'] = new_title
+            if new_notes != notes:
+                fields['notes'] = new_notes
+            if not fields:
+                unlinked.append(task_id)
+                continue
+            # 3. Tasks API 経由で変更した項目のみ更新（キューに積み、後でまとめて送信）
+            reverted.append((new_title, task_id, batch.patch(list_id, task_id, fields)))
                     
-                    # 1. タイトルの復元
-                    if is_scheduled_title:
-                        title = title.replace(self.SCHEDULED_PREFIX, "").strip()
-                    if is_split_title:
-                        title = title.replace(self.SPLIT_PREFIX, "").strip()
-                    task['title'] = title
-                        
-                    # 2. メモの復元 (ID部分のみ正規表現で削除する)
-                    if has_event_id_note:
-                        # 改行を含めて綺麗に消すパターン: 0個以上の改行 + [Ref:EventID:任意の文字列]
-                        # re.sub でパターンに一致する部分を空文字列に置換
-                        notes = re.sub(r'\n*\[Ref:EventID:.*?\]\n*', '', notes)
-                        task['notes'] = notes.strip()
-                        
-                    # 3. Tasks API 経由で更新
-                    self.tasks.update_task(list_id, task_id, task)
+        results = batch.execute()
+        with self.state.transaction():
+            for task_id in unlinked:
+                self.state.remove_link(task_id)
+            for title, task_id, index in reverted:
+                if results[index]["ok"]:
                     self.state.remove_link(task_id) # ステートの紐付けも解除
-                    
                     undo_count += 1
+                else:
+                    self.log(f"  -> 「{title}」の復元に失敗しました: {results[index]['error']}")
+
+        if delete_events and event_ids:
+            # 重複を除いて、紐付いていた予定をバッチリクエストでまとめて削除する
+            event_ids = list(dict.fromkeys(event_ids))
+            deleted = self.calendar.delete_events(event_ids)
+            self.log(f"  -> カレンダーの予定を{deleted}件削除しました。")
                     
         self.log(f"元に戻す(Undo) 処理が完了しました。（更新件数: {undo_count}件）")
 
@@ -0,0 +1,640 @@
+import datetime
+import json
+import random
+import re
+import threading
+import time
+import zlib
+import httplib2
+from googleapiclient.errors import HttpError
+from google.api_core.exceptions import ResourceExhausted
+from config.config import Config
+from src.logic.tasks_adapter import TasksAdapter
+from src.logic.calendar_adapter import CalendarAdapter
+from src.logic.gemini_adapter import GeminiAdapter
+from src.logic.task_mirror import TaskMirror
+from src.logic.calendar_cache import CalendarEventCache
+from src.logic.llm_cache import LLMCache
+from src.logic.rate_limiter import RateLimiter
+
+# Google Tasks / Calendar / Gemini を通信なしで模擬するシミュレーション用バックエンド。
+# googleapiclient のサービスオブジェクトと同じ呼び出し方 (service.tasks().list(...).execute() 等) に応答するため、
+# 各アダプタ・Scheduler・Synchronizer のコードはそのまま（ページネーション・バッチ・差分同期を含めて）動作する。
+# 遅延は固定値、クォータエラーは一定回数ごとに発生させるため、同じ設定であれば結果は毎回同じになる。
+
+
+def _format_rfc3339(dt: datetime.datetime) -> str:
+    return dt.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _parse_rfc3339(value: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _stable_hash(text: str) -> int:
+    # 実行ごとに値が変わる hash() ではなく、決定的な CRC32 を用いる
+    return zlib.crc32(text.encode('utf-8'))
+
+
+class SimulatedAuth:
+    """
+    シミュレーション用の認証。アダプタの初期化で呼ばれても、ブラウザ認証やトークンの読み書きを行わない。
+    """
+    def authenticate(self):
+        return None
+
+
+class FakeRequest:
+    """
+    googleapiclient の HttpRequest の代わりに、execute() で模擬サービスの処理を実行するリクエスト。
+    """
+    def __init__(self, service: "FakeGoogleService", handler):
+        self.service = service
+        self.handler = handler
+
+    def execute(self):
+        self.service.simulate_round_trip()
+        return self.service.perform(self.handler)
+
+
+class FakeBatchRequest:
+    """
+    new_batch_http_request() の代わりに、複数のリクエストを1回の通信として処理するバッチ。
+    """
+    def __init__(self, service: "FakeGoogleService", callback):
+        self.service = service
+        self.callback = callback
+        self._requests = []
+
+    def add(self, request: FakeRequest, request_id: str = None):
+        self._requests.append((request_id or str(len(self._requests)), request))
+
+    def execute(self):
+        self.service.simulate_round_trip(batched=True)
+        for request_id, request in self._requests:
+            try:
+                response = self.service.perform(request.handler)
+            except HttpError as e:
+                self.callback(request_id, None, e)
+            else:
+                self.callback(request_id, response, None)
+
+
+class FakeGoogleService:
+    """
+    模擬サービスの共通部分。固定の遅延、一定回数ごとのクォータエラー (429)、呼び出し回数の記録を担当する。
+    内部のデータは複数スレッドから操作されるため、ロックで保護する。
+    """
+    def __init__(self, latency_seconds: float = 0.0, quota_error_every: int = 0):
+        # latency_seconds: 1回の通信（バッチは1回として数える）ごとの待ち時間
+        # quota_error_every: N件目ごとのリクエストを 429 (クォータ超過) で失敗させる (0 で無効)
+        self.latency_seconds = latency_seconds
+        self.quota_error_every = quota_error_every
+        self.stats = {"round_trips": 0, "batches": 0, "requests": 0, "quota_errors": 0}
+        self._lock = threading.RLock()
+
+    def simulate_round_trip(self, batched: bool = False):
+        with self._lock:
+            self.stats["round_trips"] += 1
+            if batched:
+                self.stats["batches"] += 1
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    @staticmethod
+    def http_error(status: int, message: str) -> HttpError:
+        """
+        googleapiclient が送出するものと同じ HttpError を生成する（再送判定や 410 の処理がそのまま働く）。
+        """
+        resp = httplib2.Response({'status': status})
+        content = json.dumps({"error": {"code": status, "message": message}}).encode('utf-8')
+        return HttpError(resp, content)
+
+    def perform(self, handler):
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.quota_error_every and self.stats["requests"] % self.quota_error_every == 0:
+                self.stats["quota_errors"] += 1
+                raise self.http_error(429, "Quota exceeded (simulated)")
+            return handler()
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatchRequest(self, callback)
+
+
+class FakeTasksService(FakeGoogleService):
+    """
+    Google Tasks API (v1) の模擬サービス。タスクリスト・タスクをメモリ上に保持する。
+    maxResults / pageToken によるページネーション、showCompleted / showHidden / showDeleted / updatedMin に対応する。
+    """
+    # 本物の API と同様に、1ページあたりの件数の上限を 100 件とする
+    MAX_PAGE_SIZE = 100
+    # 位置 (position) の間隔。移動時は前後の中間値を用いる
+    POSITION_STEP = 1 << 20
+
+    def __init__(self, latency_seconds: float = 0.0, quota_error_every: int = 0):
+        super().__init__(latency_seconds, quota_error_every)
+        self.tasklist_items = []
+        # {リストID: {タスクID: タスク}}（削除済みのタスクも deleted=True で保持する）
+        self.task_items = {}
+        # リストごとの先頭（最小）の位置。新しいタスクはこれより前に作成する
+        self._top_positions = {}
+        self._next_id = 0
+
+    def _new_id(self, prefix: str) -> str:
+        self._next_id += 1
+        return f"{prefix}{self._next_id:08d}"
+
+    def add_tasklist(self, title: str) -> dict:
+        """
+        タスクリストを作成する（データ投入用、通信として数えない）。
+        """
+        with self._lock:
+            tasklist = {"kind": "tasks#taskList", "id": self._new_id("list"), "title": title}
+            self.tasklist_items.append(tasklist)
+            self.task_items[tasklist["id"]] = {}
+            return dict(tasklist)
+
+    def add_task(self, tasklist_id: str, title: str, notes: str = "", due: str = None, status: str = "needsAction") -> dict:
+        """
+        タスクを作成する（データ投入用、通信として数えない）。
+        """
+        body = {"title": title, "notes": notes, "status": status}
+        if due:
+            body["due"] = due
+        with self._lock:
+            return self._insert(tasklist_id, body)
+
+    def _require_list(self, tasklist_id: str) -> dict:
+        if tasklist_id not in self.task_items:
+            raise self.http_error(404, f"Task list not found: {tasklist_id}")
+        return self.task_items[tasklist_id]
+
+    def _require_task(self, tasklist_id: str, task_id: str) -> dict:
+        task = self._require_list(tasklist_id).get(task_id)
+        if task is None or task.get("deleted"):
+            raise self.http_error(404, f"Task not found: {task_id}")
+        return task
+
+    def _touch(self, task: dict):
+        task["updated"] = _format_rfc3339(datetime.datetime.now(datetime.timezone.utc))
+
+    def _insert(self, tasklist_id: str, body: dict) -> dict:
+        tasks = self._require_list(tasklist_id)
+        # 本物の API と同様に、新しいタスクはリストの先頭に作成する
+        position = self._top_positions.get(tasklist_id, 1 << 60) - self.POSITION_STEP
+        self._top_positions[tasklist_id] = position
+        task = {
+            "kind": "tasks#task",
+            "id": self._new_id("task"),
+            "title": body.get("title", ""),
+            "notes": body.get("notes", ""),
+            "status": body.get("status", "needsAction"),
+            "position": f"{position:020d}",
+        }
+        if body.get("due"):
+            task["due"] = body["due"]
+        self._touch(task)
+        tasks[task["id"]] = task
+        return dict(task)
+
+    def _update(self, tasklist_id: str, task_id: str, body: dict, replace: bool) -> dict:
+        task = self._require_task(tasklist_id, task_id)
+        # id・位置などサーバーが管理する項目は書き換えない
+        managed = {key: task[key] for key in ("kind", "id", "position", "parent") if key in task}
+        if replace:
+            task.clear()
+        task.update({key: value for key, value in body.items() if key not in managed})
+        task.update(managed)
+        if task.get("status") == "completed" and "completed" not in task:
+            task["completed"] = _format_rfc3339(datetime.datetime.now(datetime.timezone.utc))
+        self._touch(task)
+        return dict(task)
+
+    def _move(self, tasklist_id: str, task_id: str, previous_id: str = None) -> dict:
+        task = self._require_task(tasklist_id, task_id)
+        ordered = sorted(
+            (t for t in self.task_items[tasklist_id].values() if not t.get("deleted") and not t.get("parent") and t["id"] != task_id),
+            key=lambda t: t["position"]
+        )
+        if previous_id:
+            index = next(i for i, t in enumerate(ordered) if t["id"] == previous_id) + 1
+        else:
+            index = 0
+        before = int(ordered[index - 1]["position"]) if index > 0 else 0
+        after = int(ordered[index]["position"]) if index < len(ordered) else before + 2 * self.POSITION_STEP
+        position = (before + after) // 2
+        task["position"] = f"{position:020d}"
+        self._top_positions[tasklist_id] = min(position, self._top_positions.get(tasklist_id, position))
+        self._touch(task)
+        return dict(task)
+
+    def _delete(self, tasklist_id: str, task_id: str):
+        task = self._require_task(tasklist_id, task_id)
+        task["deleted"] = True
+        task["hidden"] = True
+        self._touch(task)
+        return ""
+
+    def _list(self, tasklist: str, pageToken: str = None, maxResults: int = 20, showCompleted: bool = True,
+              showHidden: bool = False, showDeleted: bool = False, updatedMin: str = None, **kwargs) -> dict:
+        # fields (部分レスポンス) 等のその他の引数は無視し、常に全項目を返す
+        tasks = self._require_list(tasklist).values()
+        updated_min = _parse_rfc3339(updatedMin) if updatedMin else None
+        items = []
+        for task in tasks:
+            if task.get("deleted") and not showDeleted:
+                continue
+            if task.get("status") == "completed" and not showCompleted:
+                continue
+            if task.get("hidden") and not task.get("deleted") and not showHidden:
+                continue
+            if updated_min and _parse_rfc3339(task["updated"]) < updated_min:
+                continue
+            items.append(task)
+        items.sort(key=lambda t: t["position"])
+        offset = int(pageToken) if pageToken else 0
+        page_size = min(maxResults or self.MAX_PAGE_SIZE, self.MAX_PAGE_SIZE)
+        result = {"kind": "tasks#tasks", "items": [dict(t) for t in items[offset:offset + page_size]]}
+        if offset + page_size < len(items):
+            result["nextPageToken"] = str(offset + page_size)
+        return result
+
+    def _list_tasklists(self, maxResults: int = 20, pageToken: str = None, **kwargs) -> dict:
+        offset = int(pageToken) if pageToken else 0
+        page_size = min(maxResults or self.MAX_PAGE_SIZE, self.MAX_PAGE_SIZE)
+        result = {"items": [dict(t) for t in self.tasklist_items[offset:offset + page_size]]}
+        if offset + page_size < len(self.tasklist_items):
+            result["nextPageToken"] = str(offset + page_size)
+        return result
+
+    def tasklists(self):
+        return _FakeResource(self, {
+            "list": lambda **kw: self._list_tasklists(**kw),
+        })
+
+    def tasks(self):
+        return _FakeResource(self, {
+            "list": lambda **kw: self._list(**kw),
+            "get": lambda tasklist, task: dict(self._require_task(tasklist, task)),
+            "insert": lambda tasklist, body, **kw: self._insert(tasklist, body),
+            "update": lambda tasklist, task, body: self._update(tasklist, task, body, replace=True),
+            "patch": lambda tasklist, task, body: self._update(tasklist, task, body, replace=False),
+            "move": lambda tasklist, task, previous=None, **kw: self._move(tasklist, task, previous),
+            "delete": lambda tasklist, task: self._delete(tasklist, task),
+        })
+
+
+class FakeCalendarService(FakeGoogleService):
+    """
+    Google Calendar API (v3) の模擬サービス。予定をメモリ上に保持する。
+    events.list のページネーションと syncToken による差分取得（失効時は 410）、freebusy.query に対応する。
+    """
+    MAX_PAGE_SIZE = 2500
+
+    def __init__(self, latency_seconds: float = 0.0, quota_error_every: int = 0):
+        super().__init__(latency_seconds, quota_error_every)
+        # {カレンダーID: {イベントID: 予定}}（削除済みの予定も status=cancelled で保持する）
+        self.event_items = {}
+        # 変更の通し番号（syncToken はこの番号で表す）
+        self._seq = 0
+        self._oldest_valid_seq = 0
+        self._next_id = 0
+
+    def add_event(self, summary: str, start_time: datetime.datetime, end_time: datetime.datetime,
+                  calendar_id: str = 'primary', transparent: bool = False) -> dict:
+        """
+        予定を作成する（データ投入用、通信として数えない）。
+        """
+        body = {
+            "summary": summary,
+            "start": {"dateTime": start_time.isoformat()},
+            "end": {"dateTime": end_time.isoformat()},
+        }
+        if transparent:
+            body["transparency"] = "transparent"
+        with self._lock:
+            return self._insert(calendar_id, body)
+
+    def expire_sync_tokens(self):
+        """
+        発行済みの syncToken をすべて失効させる（次回の差分取得は 410 Gone になる）。
+        """
+        with self._lock:
+            self._oldest_valid_seq = self._seq
+
+    def _record(self, event: dict):
+        self._seq += 1
+        event["_seq"] = self._seq
+        event["updated"] = _format_rfc3339(datetime.datetime.now(datetime.timezone.utc))
+
+    @staticmethod
+    def _public(event: dict) -> dict:
+        return {key: value for key, value in event.items() if not key.startswith("_")}
+
+    def _insert(self, calendarId: str, body: dict, **kwargs) -> dict:
+        self._next_id += 1
+        event = dict(body, id=f"evt{self._next_id:08d}", status="confirmed")
+        self._record(event)
+        self.event_items.setdefault(calendarId, {})[event["id"]] = event
+        return self._public(event)
+
+    def _delete(self, calendarId: str, eventId: str, **kwargs):
+        event = self.event_items.get(calendarId, {}).get(eventId)
+        if event is None or event["status"] == "cancelled":
+            raise self.http_error(410 if event else 404, f"Event not found: {eventId}")
+        event["status"] = "cancelled"
+        self._record(event)
+        return ""
+
+    @staticmethod
+    def _event_range(event: dict) -> tuple:
+        def to_dt(value):
+            if value.get("dateTime"):
+                return _parse_rfc3339(value["dateTime"])
+            jst_tz = datetime.timezone(datetime.timedelta(hours=9))
+            return datetime.datetime.combine(datetime.date.fromisoformat(value["date"]), datetime.time(0, 0), tzinfo=jst_tz)
+        return to_dt(event["start"]), to_dt(event["end"])
+
+    def _list(self, calendarId: str, syncToken: str = None, timeMin: str = None, timeMax: str = None,
+              pageToken: str = None, maxResults: int = 250, **kwargs) -> dict:
+        events = sorted(self.event_items.get(calendarId, {}).values(), key=lambda e: e["_seq"])
+        if syncToken:
+            since = int(syncToken)
+            if since < self._oldest_valid_seq:
+                raise self.http_error(410, "Sync token is no longer valid, a full sync is required.")
+            items = [e for e in events if e["_seq"] > since]
+        else:
+            time_min = _parse_rfc3339(timeMin) if timeMin else None
+            time_max = _parse_rfc3339(timeMax) if timeMax else None
+            items = []
+            for event in events:
+                if event["status"] == "cancelled":
+                    continue
+                start, end = self._event_range(event)
+                if (time_max is None or start < time_max) and (time_min is None or end > time_min):
+                    items.append(event)
+        offset = int(pageToken) if pageToken else 0
+        page_size = min(maxResults or self.MAX_PAGE_SIZE, self.MAX_PAGE_SIZE)
+        result = {"items": [self._public(e) for e in items[offset:offset + page_size]]}
+        if offset + page_size < len(items):
+            result["nextPageToken"] = str(offset + page_size)
+        else:
+            result["nextSyncToken"] = str(self._seq)
+        return result
+
+    def _freebusy(self, body: dict) -> dict:
+        time_min = _parse_rfc3339(body["timeMin"])
+        time_max = _parse_rfc3339(body["timeMax"])
+        calendars = {}
+        for item in body.get("items", []):
+            busy = []
+            for event in self.event_items.get(item["id"], {}).values():
+                if event["status"] == "cancelled" or event.get("transparency") == "transparent":
+                    continue
+                start, end = self._event_range(event)
+                if start < time_max and end > time_min:
+                    busy.append({"start": _format_rfc3339(start), "end": _format_rfc3339(end)})
+            calendars[item["id"]] = {"busy": sorted(busy, key=lambda b: b["start"])}
+        return {"calendars": calendars}
+
+    def events(self):
+        return _FakeResource(self, {
+            "list": lambda **kw: self._list(**kw),
+            "insert": lambda **kw: self._insert(**kw),
+            "delete": lambda **kw: self._delete(**kw),
+        })
+
+    def freebusy(self):
+        return _FakeResource(self, {
+            "query": lambda body: self._freebusy(body),
+        })
+
+
+class _FakeResource:
+    """
+    service.tasks() 等が返すリソース。各メソッドは FakeRequest を返し、execute() で処理される。
+    """
+    def __init__(self, service: FakeGoogleService, handlers: dict):
+        self._service = service
+        self._handlers = handlers
+
+    def __getattr__(self, name):
+        handler = self._handlers.get(name)
+        if handler is None:
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            return FakeRequest(self._service, lambda: handler(*args, **kwargs))
+        return method
+
+
+class FakeResponse:
+    """
+    generate_content の戻り値と同様に .text で本文を参照できる応答。
+    """
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Gemini (GenerativeModel) の模擬モデル。
+    script に積んだ応答（文字列・例外・プロンプトを受け取る関数）を順に返し、尽きた後は
+    プロンプトの種類（一括分析・単発分析・並び替え・振り分け）を判別して決定的な応答を生成する。
+    """
+    def __init__(self, script: list = None, latency_seconds: float = 0.0, quota_error_every: int = 0, split_fanout: int = 2):
+        # split_fanout: 分割対象と判定したタスクのサブタスク数（一部のタスクは過剰分割として5個以上に分割する）
+        self.split_fanout = split_fanout
+        self.script = list(script or [])
+        self.latency_seconds = latency_seconds
+        self.quota_error_every = quota_error_every
+        self.prompts = []
+        self.stats = {"requests": 0, "quota_errors": 0}
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt: str):
+        with self._lock:
+            self.prompts.append(prompt)
+            self.stats["requests"] += 1
+            quota_error = bool(self.quota_error_every and self.stats["requests"] % self.quota_error_every == 0)
+            if quota_error:
+                self.stats["quota_errors"] += 1
+            scripted = self.script.pop(0) if self.script else None
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if quota_error:
+            raise ResourceExhausted("429 Resource has been exhausted (simulated quota)")
+        if isinstance(scripted, Exception):
+            raise scripted
+        if callable(scripted):
+            return FakeResponse(scripted(prompt))
+        if scripted is not None:
+            return FakeResponse(scripted)
+        return FakeResponse(self.default_response(prompt))
+
+    def analysis_for(self, title: str) -> dict:
+        """
+        タスク名から決定的な分析結果を生成する（所要時間・重要度・一部のタスクはサブタスク分割）。
+        """
+        h = _stable_hash(title)
+        subtasks = []
+        if h % 50 == 0:
+            subtasks = [f"{title} 工程{i + 1}" for i in range(max(5, self.split_fanout))]
+        elif h % 10 == 0:
+            subtasks = [f"{title} 工程{i + 1}" for i in range(self.split_fanout)]
+        return {
+            "duration_minutes": 15 * (1 + h % 8),
+            "importance": 1 + (h >> 3) % 5,
+            "location": None,
+            "recommended_subtasks": subtasks,
+        }
+
+    def default_response(self, prompt: str) -> str:
+        if "【選択肢となるタスクリスト】" in prompt:
+            choices_text = prompt.split("【選択肢となるタスクリスト】", 1)[1].strip().split("\n", 1)[0]
+            choices = [c.strip() for c in choices_text.split(",") if c.strip()]
+            result = {}
+            for task_id, title in re.findall(r'タスクID: (.*)\nタイトル: (.*)', prompt):
+                work = [c for c in choices if "仕事" in c]
+                if work and any(word in title for word in ("仕事", "会議", "資料")):
+                    result[task_id] = work[0]
+                elif choices and _stable_hash(title) % 7:
+                    result[task_id] = choices[_stable_hash(title) % len(choices)]
+                else:
+                    result[task_id] = "None"
+            body = result
+        elif '"sorted_ids"' in prompt:
+            entries = re.findall(r'ID: (.*)\nタイトル: (.*)\n', prompt)
+            seen = set()
+            sorted_ids, duplicate_ids = [], []
+            for task_id, title in entries:
+                (duplicate_ids if title in seen else sorted_ids).append(task_id)
+                seen.add(title)
+            body = {"sorted_ids": sorted_ids, "duplicate_ids": duplicate_ids}
+        elif re.search(r'^\[\d+\]$', prompt, re.M):
+            body = {
+                index: self.analysis_for(title)
+                for index, title in re.findall(r'^\[(\d+)\]\nタスク名: (.*)$', prompt, re.M)
+            }
+        else:
+            match = re.search(r'タスク名: (.*)', prompt)
+            body = self.analysis_for(match.group(1) if match else "")
+        return "```json\n" + json.dumps(body, ensure_ascii=False) + "\n```"
+
+
+def simulated_limiter(name: str, max_concurrency: int = 8) -> RateLimiter:
+    """
+    模擬サービス用の RateLimiter。送信レートは制限せず、再試行の待ち時間を短くして計測時間への影響を抑える。
+    """
+    return RateLimiter(name, 0, max_concurrency, backoff_base_seconds=0.01, backoff_max_seconds=0.1)
+
+
+class SimulatedTasksAdapter(TasksAdapter):
+    """
+    FakeTasksService に接続する TasksAdapter。ミラーは既定でメモリ上に作成し、実データと混ざらないようにする。
+    """
+    def __init__(self, service: FakeTasksService, mirror: TaskMirror = None, limiter: RateLimiter = None):
+        self.fake_service = service
+        if mirror is None and Config.TASK_MIRROR_ENABLED:
+            mirror = TaskMirror(":memory:")
+        super().__init__(SimulatedAuth(), mirror=mirror, limiter=limiter or simulated_limiter("tasks"))
+
+    def _build_service(self):
+        # 模擬サービスはスレッドセーフなため、全スレッドで共有する
+        return self.fake_service
+
+
+class SimulatedCalendarAdapter(CalendarAdapter):
+    """
+    FakeCalendarService に接続する CalendarAdapter。予定キャッシュは既定でメモリ上に作成する。
+    """
+    def __init__(self, service: FakeCalendarService, event_cache: CalendarEventCache = None, limiter: RateLimiter = None):
+        self.fake_service = service
+        if event_cache is None and Config.CALENDAR_CACHE_ENABLED:
+            event_cache = CalendarEventCache(":memory:")
+        super().__init__(SimulatedAuth(), event_cache=event_cache, limiter=limiter or simulated_limiter("calendar"))
+
+    def _build_service(self):
+        return self.fake_service
+
+
+class SimulatedGeminiAdapter(GeminiAdapter):
+    """
+    FakeGenerativeModel を用いる GeminiAdapter。APIキーは不要で、応答キャッシュは既定でメモリ上に作成する。
+    """
+    def __init__(self, model: FakeGenerativeModel = None, cache: LLMCache = None, limiter: RateLimiter = None):
+        self.model_name = 'simulated'
+        self.model = model or FakeGenerativeModel()
+        self._models = {}
+        self.limiter = limiter or simulated_limiter("gemini")
+        if cache is None and Config.LLM_CACHE_ENABLED:
+            cache = LLMCache(":memory:")
+        self.cache = cache
+
+    def _create_model(self, model_name: str):
+        # 処理種別ごとのモデル選択（MODEL_ROUTES）は実際と同じ名前で計測し、応答は共通の模擬モデルが返す
+        return self.model
+
+
+class SimulatedWorkspace:
+    """
+    模擬サービス一式（Tasks / Calendar / Gemini）と、負荷試験用の決定的なテストデータの生成を担当する。
+    """
+    INBOX_TITLE = "■メモ"
+    LIST_TITLES = ["■仕事", "■プライベート", "■勉強", "■家事", "■■作業用"]
+    TITLE_WORDS = ["資料作成", "会議準備", "買い物", "掃除", "読書", "メール返信", "請求書処理", "運動", "企画書レビュー", "家計簿"]
+
+    def __init__(self, latency_seconds: float = 0.0, quota_error_every: int = 0, seed: int = 0, script: list = None, split_fanout: int = 2):
+        self.seed = seed
+        self.tasks_service = FakeTasksService(latency_seconds, quota_error_every)
+        self.calendar_service = FakeCalendarService(latency_seconds, quota_error_every)
+        self.model = FakeGenerativeModel(script, latency_seconds, quota_error_every, split_fanout=split_fanout)
+
+    def populate(self, num_tasks: int = 0, inbox_ratio: float = 0.2, busy_events_per_day: int = 3, days: int = 14, tasks_per_list: int = None):
+        """
+        タスクリスト・タスク・予定を生成する。同じ seed であれば常に同じ内容になる。
+        tasks_per_list を指定した場合は、Inbox を含む各リストにその件数ずつ作成する（num_tasks / inbox_ratio は無視する）。
+        """
+        rng = random.Random(self.seed)
+        inbox = self.tasks_service.add_tasklist(self.INBOX_TITLE)
+        lists = [self.tasks_service.add_tasklist(title) for title in self.LIST_TITLES]
+        if tasks_per_list is not None:
+            targets = [lst for lst in [inbox] + lists for _ in range(tasks_per_list)]
+        else:
+            targets = [inbox if rng.random() < inbox_ratio else rng.choice(lists) for _ in range(num_tasks)]
+        today = datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        for i, target in enumerate(targets):
+            title = f"{rng.choice(self.TITLE_WORDS)} #{i}"
+            due = None
+            if rng.random() < 0.3:
+                due = _format_rfc3339(today + datetime.timedelta(days=rng.randint(0, days)))
+            self.tasks_service.add_task(target["id"], title, notes=f"simulated task {i}", due=due)
+
+        jst_tz = datetime.timezone(datetime.timedelta(hours=9))
+        base = datetime.datetime.now(jst_tz).replace(hour=0, minute=0, second=0, microsecond=0)
+        for day in range(days):
+            for n in range(busy_events_per_day):
+                start = base + datetime.timedelta(days=day, hours=rng.randint(8, 20), minutes=rng.choice([0, 15, 30, 45]))
+                end = start + datetime.timedelta(minutes=rng.choice([30, 60, 90]))
+                self.calendar_service.add_event(f"予定 {day}-{n}", start, end)
+
+    def create_adapters(self) -> tuple:
+        """
+        (TasksAdapter, CalendarAdapter, GeminiAdapter) 互換のアダプタを返す。
+        """
+        return (
+            SimulatedTasksAdapter(self.tasks_service),
+            SimulatedCalendarAdapter(self.calendar_service),
+            SimulatedGeminiAdapter(self.model),
+        )
+
+    def stats(self) -> dict:
+        """
+        各模擬サービスの通信回数・リクエスト数・クォータエラー数を返す。
+        """
+        return {
+            "tasks": dict(self.tasks_service.stats),
+            "calendar": dict(self.calendar_service.stats),
+            "gemini": dict(self.model.stats),
+        }
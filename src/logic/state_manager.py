@@ -1,33 +1,75 @@
 import json
 import os
+import sqlite3
+import threading
+from contextlib import contextmanager
 from config.config import Config
 
 class StateManager:
     """
-    ローカルのファイル (state.json) を利用して、アプリケーションの状態を管理・永続化する。
+    ローカルのSQLiteファイル (state.sqlite3) を利用して、アプリケーションの状態を管理・永続化する。
     タスクIDとイベントIDの紐付けや、過去に登録した移動イベントの履歴等を保存する役割を持つ。
+    変更は1件ごとに原子的に書き込まれ（WALモード）、transaction() 内の変更はまとめて1回でコミットされる。
+    UIから複数の処理が並行して実行されるため、読み書きはすべてロックで保護する。
+    旧形式の state.json が残っている場合は、初回起動時に自動で取り込む。
     """
-    def __init__(self):
-        self.state_file = Config.DATA_DIR / "state.json"
-        
-        # 起動時に既存の状態を読み込む
+    def __init__(self, db_file=None):
+        # db_file: 保存先（シミュレーション等では ":memory:" を指定して実データと分離する）
+        self.db_file = db_file or (Config.DATA_DIR / "state.sqlite3")
+        # 旧形式（JSONファイル全体を書き換える方式）の状態ファイル（保存先を指定した場合は取り込まない）
+        self.state_file = None if db_file else Config.DATA_DIR / "state.json"
+
+        # 状態（メモリ上の辞書とDB接続）を保護するロック。transaction() 中は同じスレッドのみが変更できる
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.db_file), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS mapped_tasks (task_id TEXT PRIMARY KEY, event_id TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS travel_history (route TEXT PRIMARY KEY, minutes INTEGER NOT NULL)")
+        self._conn.commit()
+        # transaction() の入れ子の深さ（0 のときは変更ごとにコミットする）
+        self._transaction_depth = 0
+
+        self._migrate_json_state()
+        # 起動時に既存の状態を読み込む（読み出しはメモリ上の辞書から行う）
         self.state = self._load_state()
 
+    def _migrate_json_state(self):
+        """
+        旧形式の state.json が存在すれば内容をデータベースへ取り込み、取り込み済みのファイルは名前を変えて残す。
+        ファイルが破損している場合は初期化せず、退避した上でその旨を出力する。
+        """
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except Exception as e:
+            print(f"旧形式の状態ファイルの読み込みに失敗しました: {e}")
+            os.replace(self.state_file, str(self.state_file) + ".corrupt")
+            print(f"破損したファイルは {self.state_file}.corrupt に退避しました。")
+            return
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO mapped_tasks (task_id, event_id) VALUES (?, ?)",
+                legacy.get("mapped_tasks", {}).items()
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO travel_history (route, minutes) VALUES (?, ?)",
+                legacy.get("travel_history", {}).items()
+            )
+        os.replace(self.state_file, str(self.state_file) + ".migrated")
+        print(f"旧形式の状態ファイルを取り込みました（{len(legacy.get('mapped_tasks', {}))}件の紐付け）。")
+
     def _load_state(self) -> dict:
         """
-        ローカルJSONファイルから状態を読み込む。
-        ファイルが存在しない場合は初期構造を返却する。
+        データベースから状態を読み込む。
         """
-        if os.path.exists(self.state_file):
-            try:
-                with open(self.state_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"状態ファイルの読み込みに失敗しました: {e}")
-                # 破損している場合は初期化する
-                return self._get_default_state()
-        else:
-            return self._get_default_state()
+        state = self._get_default_state()
+        state["mapped_tasks"] = dict(self._conn.execute("SELECT task_id, event_id FROM mapped_tasks"))
+        state["travel_history"] = dict(self._conn.execute("SELECT route, minutes FROM travel_history"))
+        return state
 
     def _get_default_state(self) -> dict:
         """
@@ -38,48 +80,79 @@ class StateManager:
             "travel_history": {} # "From_To": minutes
         }
 
-    def _save_state(self):
+    def _write(self, sql: str, params: tuple):
         """
-        現在の状態をローカルのJSONに書き込み永続化する。
+        1件の変更を書き込む。transaction() の外ではその場でコミットする。
         """
-        try:
-            with open(self.state_file, 'w', encoding='utf-8') as f:
-                json.dump(self.state, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"状態ファイルの書き込みに失敗しました: {e}")
+        self._conn.execute(sql, params)
+        if self._transaction_depth == 0:
+            self._conn.commit()
+
+    @contextmanager
+    def transaction(self):
+        """
+        ブロック内の変更をまとめて1回でコミットする（入れ子で呼んだ場合は最も外側でコミットする）。
+        例外が発生した場合は変更を取り消し、メモリ上の状態もデータベースの内容に戻す。
+        """
+        with self._lock:
+            self._transaction_depth += 1
+            try:
+                yield self
+            except Exception:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    self._conn.rollback()
+                    self.state = self._load_state()
+                raise
+            else:
+                self._transaction_depth -= 1
+                if self._transaction_depth == 0:
+                    self._conn.commit()
 
     def get_event_id(self, task_id: str) -> str:
         """
         特定のタスクIDに紐づくカレンダーのイベントIDを取得する。
         """
-        return self.state["mapped_tasks"].get(task_id)
+        with self._lock:
+            return self.state["mapped_tasks"].get(task_id)
+
+    def get_all_links(self) -> dict:
+        """
+        すべてのタスクIDとイベントIDの紐付けを {task_id: event_id} の複製で返す。
+        """
+        with self._lock:
+            return dict(self.state["mapped_tasks"])
 
     def link_task_to_event(self, task_id: str, event_id: str):
         """
         タスクがカレンダーに登録された際、そのIDの紐付けを保存する。
         """
-        self.state["mapped_tasks"][task_id] = event_id
-        self._save_state()
+        with self._lock:
+            self.state["mapped_tasks"][task_id] = event_id
+            self._write("INSERT OR REPLACE INTO mapped_tasks (task_id, event_id) VALUES (?, ?)", (task_id, event_id))
 
     def remove_link(self, task_id: str):
         """
         タスクのカレンダー登録が取り消された際、紐付けを解除する。
         """
-        if task_id in self.state["mapped_tasks"]:
-            del self.state["mapped_tasks"][task_id]
-            self._save_state()
+        with self._lock:
+            if task_id in self.state["mapped_tasks"]:
+                del self.state["mapped_tasks"][task_id]
+                self._write("DELETE FROM mapped_tasks WHERE task_id = ?", (task_id,))
 
     def update_travel_history(self, location_from: str, location_to: str, minutes: int):
         """
         過去の移動時間の履歴を記録・学習する。
         """
         key = f"{location_from}_{location_to}"
-        self.state["travel_history"][key] = minutes
-        self._save_state()
+        with self._lock:
+            self.state["travel_history"][key] = minutes
+            self._write("INSERT OR REPLACE INTO travel_history (route, minutes) VALUES (?, ?)", (key, minutes))
 
     def get_travel_time(self, location_from: str, location_to: str) -> int:
         """
         過去の移動履歴から所要時間を取得する。履歴が無い場合は None を返す。
         """
         key = f"{location_from}_{location_to}"
-        return self.state["travel_history"].get(key)
+        with self._lock:
+            return self.state["travel_history"].get(key)
@@ -2,6 +2,10 @@ from src.logic.tasks_adapter import TasksAdapter
 from src.logic.calendar_adapter import CalendarAdapter
 from src.logic.state_manager import StateManager
 from src.logic.gemini_adapter import GeminiAdapter
+from src.logic.inbox_classifier import InboxClassifier
+from src.logic import instrumentation
+from concurrent.futures import ThreadPoolExecutor
+from config.config import Config
 import traceback
 
 class Synchronizer:
@@ -16,13 +20,19 @@ class Synchronizer:
         calendar_adapter: CalendarAdapter,
         state_manager: StateManager,
         gemini_adapter: GeminiAdapter,
-        logger=print
+        logger=print,
+        classifier: InboxClassifier = None
     ):
         self.tasks = tasks_adapter
         self.calendar = calendar_adapter
         self.state = state_manager
         self.gemini = gemini_adapter
         self.logger = logger
+        # 振り分け先のローカル分類器（確信度が高いタスクは Gemini に問い合わせずに振り分ける）
+        # 状態をメモリ上にのみ保持している場合（シミュレーション等）は、学習結果も実データと分離する
+        if classifier is None and Config.INBOX_CLASSIFIER_ENABLED:
+            classifier = InboxClassifier(":memory:" if str(state_manager.db_file) == ":memory:" else None)
+        self.classifier = classifier
 
     def _get_target_lists(self) -> dict:
         """
@@ -48,16 +58,30 @@ class Synchronizer:
                 
         return target_lists
 
-    def organize_inbox(self):
+    def get_inbox_tasks(self) -> list:
+        """
+        Inbox（■メモ）の未完了タスクを返す（Inbox が無い場合は空の配列）。
+        """
+        inbox = self._get_target_lists()["inbox"]
+        return self.tasks.get_tasks(inbox['id']) if inbox else []
+
+    def organize_inbox(self, task_ids=None):
         """
         Inbox（■メモ）に溜まっている新着タスクを分析し、最適な■リストに自動で振り分ける。
         移動先が見つからない場合は Inbox に留める。
         （※仕様上、ユーザーが手動で公式アプリにて修正可能）
+        task_ids を指定した場合は、そのIDのタスクのみを対象とする（常駐モードの差分処理で使用）。
+        処理フェーズごとの所要時間とAPI呼び出しを計測し、終了時に集計をログへ出力する。
         """
+        with instrumentation.run("organize_inbox", self.logger):
+            self._organize_inbox(task_ids)
+
+    def _organize_inbox(self, task_ids=None):
         self.logger("タスクの振り分け処理を開始します...")
         
         # 1. 扱うべきリスト郡を取得
-        lists = self._get_target_lists()
+        with instrumentation.span("fetch_lists"):
+            lists = self._get_target_lists()
         
         inbox = lists["inbox"]
         if not inbox:
@@ -70,17 +94,32 @@ class Synchronizer:
         inbox_id = inbox['id']
         
         # 2. Inboxから未完了のタスクを取得
-        tasks_in_inbox = self.tasks.get_tasks(inbox_id)
+        with instrumentation.span("fetch_inbox"):
+            tasks_in_inbox = self.tasks.get_tasks(inbox_id)
+        if task_ids is not None:
+            task_ids = set(task_ids)
+            tasks_in_inbox = [task for task in tasks_in_inbox if task['id'] in task_ids]
         if not tasks_in_inbox:
             self.logger("Inbox に振り分けるべきタスクはありません。")
             return
             
+        # 各■リストに現在あるタスクを、ローカル分類器の学習例として取り込む
+        with instrumentation.span("learn_lists"):
+            self._learn_from_lists(active_lists)
+
         self.logger(f"Inboxの {len(tasks_in_inbox)} 件のタスクを一括で分析中...")
         
         try:
             # まとめてAIに判定させる
-            target_list_mapping = self._determine_target_lists_batch(tasks_in_inbox, active_lists)
+            with instrumentation.span("classify"):
+                target_list_mapping = self._determine_target_lists_batch(tasks_in_inbox, active_lists)
             
+            # 4. 判定結果に基づいて移動
+            # Tasks API v1 にはリスト間移動のメソッドが無いため、
+            # 先に新しいリストに同一内容で作成し、元リストから削除する擬似的な移動処理を行う
+            # （作成・削除はそれぞれバッチリクエストでまとめて送信する）
+            batch = self.tasks.batch()
+            moves = []
             for task in tasks_in_inbox:
                 title = task.get('title', '')
                 notes = task.get('notes', '')
@@ -88,44 +127,133 @@ class Synchronizer:
                 
                 target_list_id = target_list_mapping.get(task_id)
                 
-                # 4. 判定結果に基づいて移動
                 if target_list_id:
                     self.logger(f"'{title}' -> リストを移動します")
-                    # Tasks API v1 にはリスト間移動のメソッドが無いため、
-                    # 先に新しいリストに同一内容で作成し、元リストから削除する擬似的な移動処理を行う
-                    new_task = self.tasks.insert_task(
-                        tasklist_id=target_list_id, 
-                        title=title, 
-                        notes=notes
-                    )
-                    
-                    if new_task:
-                         self.tasks.delete_task(tasklist_id=inbox_id, task_id=task_id)
-                         self.logger(f"  -> 移動完了")
+                    moves.append((task, batch.insert(target_list_id, title, notes)))
                 else:
                     self.logger(f"'{title}' -> 適切な移動先が見つからなかったため、Inboxに残します。")
                     
+            with instrumentation.span("move_insert"):
+                insert_results = batch.execute()
+            
+            # 移動先への作成に成功したタスクのみ、Inboxから削除する
+            deletions = []
+            learned = []
+            for task, index in moves:
+                result = insert_results[index]
+                if result["ok"] and result["response"]:
+                    deletions.append((task, batch.delete(inbox_id, task['id'])))
+                    # 振り分け結果を移動先のタスクIDで学習する（次回以降のリストからの学習と重複しない）
+                    learned.append((result["response"]['id'], task.get('title', ''), target_list_mapping[task['id']]))
+                else:
+                    self.logger(f"  -> '{task.get('title', '')}' の移動先への作成に失敗しました: {result['error']}")
+            if self.classifier is not None and learned:
+                self.classifier.learn_many(learned)
+                    
+            with instrumentation.span("move_delete"):
+                delete_results = batch.execute()
+            for task, index in deletions:
+                result = delete_results[index]
+                if result["ok"]:
+                    self.logger(f"  -> '{task.get('title', '')}' 移動完了")
+                else:
+                    self.logger(f"  -> '{task.get('title', '')}' をInboxから削除できませんでした（移動先には作成済み）: {result['error']}")
+                    
         except Exception as e:
             self.logger(f"一括分析・移動処理中にエラーが発生しました: {e}")
             import traceback
             traceback.print_exc()
 
+        cache_stats = self.gemini.cache_stats()
+        if cache_stats:
+            self.logger(f"AI応答キャッシュ(起動後の累計): ヒット {cache_stats['hits']}件 / ミス {cache_stats['misses']}件")
         self.logger("振り分け処理が完了しました。")
 
+    def _learn_from_lists(self, active_lists: list):
+        """
+        各■リストの未完了タスクを「タスクID → リストID」の例としてローカル分類器に学習させる。
+        ローカルミラーが無効な場合は全件の取得が必要となるため、振り分け結果からの学習のみとする。
+        """
+        if self.classifier is None or getattr(self.tasks, "mirror", None) is None:
+            return
+        max_workers = max(1, min(Config.TASKS_MAX_CONCURRENCY, len(active_lists)))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list_tasks = list(executor.map(lambda lst: self.tasks.get_tasks(lst['id']), active_lists))
+        examples = [
+            (task['id'], task.get('title', ''), lst['id'])
+            for lst, tasks in zip(active_lists, list_tasks)
+            for task in tasks
+        ]
+        learned = self.classifier.learn_many(examples)
+        if learned:
+            self.logger(f"  -> 振り分けの学習データを更新しました（{learned}件 / 累計 {len(self.classifier)}件）")
+
     def _determine_target_lists_batch(self, tasks: list, available_lists: list) -> dict:
         """
         Geminiを用いて、複数のタスクの一括振り分け先を判定し、タスクIDと移動先リストIDの辞書を返す。
+        タスクは文字数・件数の上限ごとのチャンクに分け、同時実行数を制限して並行に判定する。
+        判定に失敗したチャンクはそのチャンクのみ再試行し、成功したチャンクの結果は適用する。
         """
         # 利用可能なリストの名前とIDの辞書を作成
         list_mapping = {lst['title']: lst['id'] for lst in available_lists}
         list_names = list(list_mapping.keys())
         
-        tasks_text = ""
+        # 過去に同じ内容・同じ選択肢で分類済みのタスクはキャッシュの結果を用いる
+        task_target_mapping = {}
+        uncached_tasks = []
         for task in tasks:
-            t_id = task['id']
-            title = task.get('title', '')
-            notes = task.get('notes', '')
-            tasks_text += f"タスクID: {t_id}\nタイトル: {title}\nメモ: {notes}\n---\n"
+            cached_name = self.gemini.cache_lookup("classify", self._classify_cache_payload(task, list_names))
+            if cached_name is None:
+                uncached_tasks.append(task)
+            elif list_mapping.get(cached_name):
+                task_target_mapping[task['id']] = list_mapping[cached_name]
+
+        # ローカル分類器の確信度が高いタスクは即座に振り分け、判断が分かれるタスクのみを Gemini に問い合わせる
+        if self.classifier is not None and uncached_tasks:
+            list_ids = list(list_mapping.values())
+            ambiguous_tasks = []
+            for task in uncached_tasks:
+                list_id = self.classifier.classify(task.get('title', ''), list_ids)
+                if list_id:
+                    task_target_mapping[task['id']] = list_id
+                else:
+                    ambiguous_tasks.append(task)
+            if len(ambiguous_tasks) < len(uncached_tasks):
+                self.logger(f"  -> ローカル分類器で {len(uncached_tasks) - len(ambiguous_tasks)}件を判定しました（AIへの問い合わせ: {len(ambiguous_tasks)}件）")
+            uncached_tasks = ambiguous_tasks
+        if not uncached_tasks:
+            return task_target_mapping
+
+        chunks = self.gemini.chunk_tasks(uncached_tasks, max_tasks=Config.GEMINI_CLASSIFY_BATCH_MAX_TASKS)
+        if len(chunks) > 1:
+            self.logger(f"  -> {len(uncached_tasks)}件を{len(chunks)}回に分けて判定します。")
+        max_workers = max(1, min(Config.GEMINI_MAX_CONCURRENCY, len(chunks)))
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for chunk, names in zip(chunks, executor.map(lambda chunk: self._classify_chunk(chunk, list_names), chunks)):
+                for task in chunk:
+                    list_name = names.get(task['id'])
+                    if list_name is None:
+                        failed += 1
+                        continue
+                    # 判定結果はタスク単位でキャッシュする
+                    self.gemini.cache_store("classify", self._classify_cache_payload(task, list_names), list_name)
+                    if list_mapping.get(list_name):
+                        task_target_mapping[task['id']] = list_mapping[list_name]
+        if failed:
+            self.logger(f"一括分類推論エラー: {failed}件のタスクは判定できなかったため、Inboxに残します。")
+        return task_target_mapping
+
+    def _classify_chunk(self, tasks: list, list_names: list, retries: int = 1) -> dict:
+        """
+        1チャンク分のタスクを1回のリクエストで判定し、タスクIDと移動先リスト名（移動しない場合は "None"）の辞書を返す。
+        プロンプト内ではトークン節約のためタスクIDの代わりに連番を用いる。
+        失敗した場合は、チャンクを半分に分けて（1件なら同じ内容で）retries 回まで再試行する。
+        再試行でも判定できなかったタスクは結果に含めない。
+        """
+        tasks_text = ""
+        for index, task in enumerate(tasks, start=1):
+            tasks_text += f"タスクID: {index}\nタイトル: {task.get('title', '')}\nメモ: {task.get('notes', '') or ''}\n---\n"
         
         prompt = f'''
 以下の複数のタスクについて、それぞれ提供されたタスクリストの選択肢から最も適切なものに分類（振り分け）してください。
@@ -141,36 +269,45 @@ class Synchronizer:
 - 「買い物」「家事」「私用」など個人の用事は「■プライベート」系統のリストへ
 - どちらにも属さない、またはリストが存在しない場合は "None" としてください。
 
-出力形式は必ず以下の形式のJSONデータのみとしてください。Markdownのコードブロック(```json)は含めても構いません。
+出力形式は必ず以下の形式のJSONデータのみとしてください。キーはタスクIDの番号です。Markdownのコードブロック(```json)は含めても構いません。
 {{
-  "task_id_1": "■仕事",
-  "task_id_2": "None",
+  "1": "■仕事",
+  "2": "None",
   ... (すべてのタスクIDについて出力)
 }}
-'''     
+'''
+        valid_names = set(list_names) | {"None"}
+
+        def parse(text):
+            result = self.gemini.parse_json_response(text)
+            if not isinstance(result, dict):
+                raise ValueError("JSONオブジェクトではありません")
+            # すべてのタスクに選択肢のいずれか（または "None"）が返っていれば十分とみなす
+            return result, all(result.get(str(index)) in valid_names for index in range(1, len(tasks) + 1))
+
         try:
-            # Geminiで分類実行 (リトライ付き)
-            response = self.gemini.generate_content_with_retry(prompt)
-            text = response.text
-            import json
-            import re
-            
-            # Markdownのコードブロックなどで囲まれている場合に対処
-            match = re.search(r'```(?:json)?\s*(.*?)\s*```', text, re.DOTALL)
-            if match:
-                text = match.group(1)
-                
-            result_json = json.loads(text)
-            
-            # リスト名をIDに変換して辞書を作成
-            task_target_mapping = {}
-            for t_id, list_name in result_json.items():
-                list_id = list_mapping.get(list_name)
-                if list_id:
-                    task_target_mapping[t_id] = list_id
-                    
-            return task_target_mapping
-            
+            # Geminiで分類実行 (高速なモデルを使用し、不完全な応答は上位のモデルで再実行する)
+            # 不完全な応答でも、選択肢に一致した分のみを採用する（キャッシュは採用したタスク単位で行う）
+            result_json, _ = self.gemini.generate_parsed(prompt, "classify", parse)
         except Exception as e:
-            self.logger(f"一括分類推論エラー: {e}")
-            return {}
+            if retries <= 0:
+                self.logger(f"一括分類推論エラー: {e}")
+                return {}
+            self.logger(f"一括分類推論エラーのため、{len(tasks)}件を再判定します: {e}")
+            instrumentation.record_retry("classify_chunk")
+            halves = [tasks[:len(tasks) // 2], tasks[len(tasks) // 2:]] if len(tasks) > 1 else [tasks]
+            names = {}
+            for half in halves:
+                names.update(self._classify_chunk(half, list_names, retries - 1))
+            return names
+
+        return {
+            task['id']: result_json[str(index)]
+            for index, task in enumerate(tasks, start=1)
+            if result_json.get(str(index)) in valid_names
+        }
+
+    @staticmethod
+    def _classify_cache_payload(task: dict, list_names: list) -> dict:
+        # 選択肢のリスト構成が変わった場合は別の問い合わせとして扱う
+        return {"title": task.get('title', ''), "notes": task.get('notes', '') or '', "lists": sorted(list_names)}
@@ -0,0 +1,166 @@
+import datetime
+import json
+import sqlite3
+import threading
+from config.config import Config
+
+
+class TaskMirror:
+    """
+    Google Tasks のタスクをリスト単位でローカルのSQLiteファイルに複製（ミラー）するクラス。
+    リストごとに最終同期時刻を保持し、2回目以降は Tasks API の updatedMin で差分のみを取得して反映する。
+    削除・非表示・完了済みのタスクも差分として受け取り、ミラーの内容を正しく保つ。
+    """
+    def __init__(self, path=None):
+        self.path = path or (Config.DATA_DIR / "tasks_mirror.sqlite3")
+        # 複数スレッドから利用されるため、接続は1つにしてロックで保護する
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            " list_id TEXT NOT NULL,"
+            " task_id TEXT NOT NULL,"
+            " parent TEXT,"
+            " position TEXT,"
+            " status TEXT,"
+            " hidden INTEGER NOT NULL DEFAULT 0,"
+            " title TEXT,"
+            " notes TEXT,"
+            " body TEXT NOT NULL,"
+            " PRIMARY KEY (list_id, task_id))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS list_sync ("
+            " list_id TEXT PRIMARY KEY,"
+            " updated_min TEXT NOT NULL,"
+            " full_synced_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def format_timestamp(dt: datetime.datetime) -> str:
+        """
+        datetime を Tasks API の updatedMin に渡せる RFC3339 形式 (UTC) に変換する。
+        """
+        return dt.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+    def get_sync_state(self, list_id: str) -> tuple:
+        """
+        リストの (次回の updatedMin, 最後に全件同期した時刻のUNIX秒) を返す。未同期の場合は (None, None)。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT updated_min, full_synced_at FROM list_sync WHERE list_id = ?", (list_id,)
+            ).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    def _upsert(self, list_id: str, task: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tasks (list_id, task_id, parent, position, status, hidden, title, notes, body)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                list_id, task['id'], task.get('parent'), task.get('position'), task.get('status'),
+                1 if task.get('hidden') else 0, task.get('title', ''), task.get('notes', ''),
+                json.dumps(task, ensure_ascii=False)
+            )
+        )
+
+    def apply_changes(self, list_id: str, items: list, updated_min: str, full: bool, synced_at: float):
+        """
+        APIから取得したタスク（差分または全件）をミラーへ反映し、次回の updatedMin を記録する。
+        full=True の場合は、リストの既存データを置き換える。
+        """
+        with self._lock:
+            if full:
+                self._conn.execute("DELETE FROM tasks WHERE list_id = ?", (list_id,))
+            for task in items:
+                if task.get('deleted'):
+                    self._conn.execute("DELETE FROM tasks WHERE list_id = ? AND task_id = ?", (list_id, task['id']))
+                else:
+                    self._upsert(list_id, task)
+            if full:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO list_sync (list_id, updated_min, full_synced_at) VALUES (?, ?, ?)",
+                    (list_id, updated_min, synced_at)
+                )
+            else:
+                self._conn.execute("UPDATE list_sync SET updated_min = ? WHERE list_id = ?", (updated_min, list_id))
+            self._conn.commit()
+
+    def upsert_task(self, list_id: str, task: dict):
+        """
+        本アプリ自身が作成・更新したタスクを即座にミラーへ反映する（書き込みスルー）。
+        """
+        if not task or 'id' not in task:
+            return
+        with self._lock:
+            self._upsert(list_id, task)
+            self._conn.commit()
+
+    def delete_task(self, list_id: str, task_id: str):
+        """
+        本アプリ自身が削除したタスクを即座にミラーから取り除く。
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM tasks WHERE list_id = ? AND task_id = ?", (list_id, task_id))
+            self._conn.commit()
+
+    def get_tasks(self, list_id: str, show_completed: bool = False, show_hidden: bool = False) -> list:
+        """
+        ミラーからリスト内のタスクを取得する。Tasks API と同様に、親タスクの直後に子タスクが並ぶ順序で返す。
+        """
+        query = "SELECT body FROM tasks WHERE list_id = ?"
+        if not show_completed:
+            query += " AND (status IS NULL OR status != 'completed')"
+        if not show_hidden:
+            query += " AND hidden = 0"
+        with self._lock:
+            rows = self._conn.execute(query, (list_id,)).fetchall()
+        tasks = [json.loads(row[0]) for row in rows]
+
+        positions = {task['id']: task.get('position') or '' for task in tasks}
+
+        def sort_key(task):
+            parent = task.get('parent')
+            if parent:
+                return (positions.get(parent, ''), 1, task.get('position') or '')
+            return (task.get('position') or '', 0, '')
+
+        return sorted(tasks, key=sort_key)
+
+    def find_tasks(self, markers: list, task_ids=(), list_ids: list = None, show_completed: bool = False, show_hidden: bool = False) -> list:
+        """
+        タイトルまたはメモに目印の文字列 (markers) のいずれかを含むタスク、および task_ids に含まれるタスクを探し、
+        (リストID, タスク) の配列で返す。本文 (JSON) を展開するのは該当したタスクのみ。
+        list_ids を指定した場合は、そのリストに限定する。
+        """
+        conditions = []
+        params = []
+        for marker in markers:
+            conditions.append("instr(title, ?) > 0 OR instr(notes, ?) > 0")
+            params.extend([marker, marker])
+        query = "SELECT list_id, task_id, body FROM tasks WHERE 1 = 1"
+        if list_ids is not None:
+            query += f" AND list_id IN ({', '.join('?' for _ in list_ids)})"
+        if not show_completed:
+            query += " AND (status IS NULL OR status != 'completed')"
+        if not show_hidden:
+            query += " AND hidden = 0"
+        list_params = list(list_ids or [])
+        task_ids = list(task_ids)
+
+        found = {}
+        with self._lock:
+            if conditions:
+                rows = self._conn.execute(
+                    f"{query} AND ({' OR '.join(conditions)})", list_params + params
+                ).fetchall()
+                found.update(((row[0], row[1]), row[2]) for row in rows)
+            # SQLite のプレースホルダ数の上限を超えないよう、IDは分割して照会する
+            for i in range(0, len(task_ids), 500):
+                chunk = task_ids[i:i + 500]
+                rows = self._conn.execute(
+                    f"{query} AND task_id IN ({', '.join('?' for _ in chunk)})", list_params + chunk
+                ).fetchall()
+                found.update(((row[0], row[1]), row[2]) for row in rows)
+        return [(list_id, json.loads(body)) for (list_id, _), body in found.items()]
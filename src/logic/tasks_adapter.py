@@ -1,19 +1,45 @@
-from googleapiclient.discovery import build
+import datetime
+import time
+from config.config import Config
 from src.logic.auth import GoogleAuth
+from src.logic.batch_request import BatchRequestQueue
+from src.logic.google_service import ThreadLocalService, build_service
+from src.logic.rate_limiter import RateLimiter, get_limiter
+from src.logic.task_mirror import TaskMirror
 
 class TasksAdapter:
     """
     Google Tasks API と連携するためのアダプタクラス。
     タスクリストの取得やタスクの移動・更新などをカプセル化する。
     """
-    def __init__(self, auth: GoogleAuth):
+    # 差分取得の取りこぼしを防ぐため、updatedMin は取得開始時刻からこの秒数だけ遡らせる
+    SYNC_OVERLAP_SECONDS = 300
+
+    def __init__(self, auth: GoogleAuth, mirror: TaskMirror = None, limiter: RateLimiter = None):
         self.auth = auth
-        self.service = self._build_service()
+        # ローカルミラー（有効時は get_tasks を差分同期＋ミラーからの読み出しで処理する）
+        if mirror is None and Config.TASK_MIRROR_ENABLED:
+            mirror = TaskMirror()
+        self.mirror = mirror
+        self.creds = self.auth.authenticate()
+        # googleapiclient (httplib2) のサービスはスレッドセーフではないため、スレッドごとに保持する
+        # レート制限・再試行はサービス単位で共有する（既定は Config の設定による共有の RateLimiter）
+        self.limiter = limiter or get_limiter("tasks")
+        self._services = ThreadLocalService(self._build_service, "tasks", self.limiter)
+        # 呼び出し元スレッドのサービスは起動時に構築しておく
+        self._services.get()
 
     def _build_service(self):
         # 認証情報を使用して Tasks API のサービスオブジェクトを構築
-        creds = self.auth.authenticate()
-        return build('tasks', 'v1', credentials=creds)
+        # （ディスカバリドキュメントは同梱・保存済みのものを共有し、通信せずに構築する）
+        return build_service('tasks', 'v1', self.creds)
+
+    @property
+    def service(self):
+        """
+        現在のスレッド専用の Tasks API サービスオブジェクトを返す。
+        """
+        return self._services.get()
 
     def get_tasklists(self) -> list:
         """
@@ -27,52 +53,116 @@ class TasksAdapter:
         """
         指定したタスクリストIDに含まれるタスクをすべて取得する（ページネーション対応）。
         デフォルトでは完了済みのタスクや非表示タスクは除外して取得する。
+        ローカルミラーが有効な場合は、前回以降の差分のみをAPIから取得してミラーに反映し、ミラーから返す。
+        """
+        if self.mirror:
+            self.sync_list(tasklist_id)
+            return self.mirror.get_tasks(tasklist_id, show_completed=show_completed, show_hidden=show_hidden)
+        return self._list_tasks(tasklist_id, show_completed=show_completed, show_hidden=show_hidden)
+
+    def _list_tasks(self, tasklist_id: str, show_completed=False, show_hidden=False, show_deleted=False, updated_min: str = None, fields: str = None) -> list:
+        """
+        Tasks API からタスクをページネーションしながら全件取得する。
+        fields を指定した場合は、必要な項目のみを取得する（部分レスポンス）。
         """
         tasks = []
         page_token = None
+        params = {
+            "tasklist": tasklist_id,
+            "showCompleted": show_completed,
+            "showHidden": show_hidden,
+            "maxResults": 100,
+        }
+        if show_deleted:
+            params["showDeleted"] = True
+        if updated_min:
+            params["updatedMin"] = updated_min
+        if fields:
+            params["fields"] = f"nextPageToken,items({fields})"
         while True:
-            results = self.service.tasks().list(
-                tasklist=tasklist_id, 
-                showCompleted=show_completed,
-                showHidden=show_hidden,
-                maxResults=100,
-                pageToken=page_token
-            ).execute()
+            results = self.service.tasks().list(pageToken=page_token, **params).execute()
             tasks.extend(results.get('items', []))
             page_token = results.get('nextPageToken')
             if not page_token:
                 break
         return tasks
 
+    def sync_list(self, tasklist_id: str) -> int:
+        """
+        ローカルミラーを最新化し、反映した（変更のあった）タスク数を返す。
+        初回や一定時間経過後は全件を取得し直し、それ以外は updatedMin による差分のみを取得する。
+        差分には削除・非表示・完了済みのタスクも含めて取得する。
+        """
+        updated_min, full_synced_at = self.mirror.get_sync_state(tasklist_id)
+        now = time.time()
+        full = (
+            updated_min is None
+            or now - full_synced_at > Config.TASK_MIRROR_FULL_RESYNC_HOURS * 3600
+        )
+        started_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=self.SYNC_OVERLAP_SECONDS)
+        
+        items = self._list_tasks(
+            tasklist_id,
+            show_completed=True,
+            show_hidden=True,
+            show_deleted=not full,
+            updated_min=None if full else updated_min
+        )
+        self.mirror.apply_changes(tasklist_id, items, TaskMirror.format_timestamp(started_at), full, now)
+        return len(items)
+
+    def find_tasks(self, tasklist_ids: list, markers: list, task_ids=()) -> list:
+        """
+        タイトルまたはメモに目印の文字列 (markers) を含むタスク、および task_ids に含まれるタスクを探し、
+        (リストID, タスク) の配列で返す（完了済み・非表示のタスクは除く）。
+        ローカルミラーが有効な場合は差分同期後のミラーを検索し、無効な場合は必要な項目のみをAPIから取得して判定する。
+        """
+        if self.mirror:
+            for tasklist_id in tasklist_ids:
+                self.sync_list(tasklist_id)
+            return self.mirror.find_tasks(markers, task_ids, list_ids=tasklist_ids)
+
+        task_ids = set(task_ids)
+        found = []
+        for tasklist_id in tasklist_ids:
+            for task in self._list_tasks(tasklist_id, fields="id,title,notes"):
+                title = task.get('title', '')
+                notes = task.get('notes', '')
+                if task['id'] in task_ids or any(marker in title or marker in notes for marker in markers):
+                    found.append((tasklist_id, task))
+        return found
+
     def insert_task(self, tasklist_id: str, title: str, notes: str = "") -> dict:
         """
         新しいタスクを指定したタスクリストに作成する。
         """
-        task_body = {
-            'title': title,
-            'notes': notes
-        }
-        return self.service.tasks().insert(tasklist=tasklist_id, body=task_body).execute()
+        task = self._insert_request(self.service, tasklist_id, title, notes).execute()
+        self._mirror_upsert(tasklist_id, task)
+        return task
 
     def update_task(self, tasklist_id: str, task_id: str, task_body: dict) -> dict:
         """
         既存のタスクを更新する。（名前・メモの変更、完了状態の更新など）
         """
-        return self.service.tasks().update(
-            tasklist=tasklist_id, 
-            task=task_id, 
-            body=task_body
-        ).execute()
+        task = self._update_request(self.service, tasklist_id, task_id, task_body).execute()
+        self._mirror_upsert(tasklist_id, task)
+        return task
+
+    def patch_task(self, tasklist_id: str, task_id: str, fields: dict) -> dict:
+        """
+        既存のタスクの指定した項目のみを更新する（タスク全体を送り直さない部分更新）。
+        """
+        task = self._patch_request(self.service, tasklist_id, task_id, fields).execute()
+        self._mirror_upsert(tasklist_id, task)
+        return task
 
     def move_task(self, tasklist_id: str, task_id: str, previous_id: str = None) -> dict:
         """
         タスクをリスト内で移動する（順番の変更）
         """
-        return self.service.tasks().move(
-            tasklist=tasklist_id, 
-            task=task_id, 
-            previous=previous_id
-        ).execute()
+        task = self._move_request(self.service, tasklist_id, task_id, previous_id).execute()
+        self._mirror_upsert(tasklist_id, task)
+        return task
 
     # Note: Tasks API v1 では "タスクを別のタスクリストに直接移動" (move between lists) するAPIエンドポイントは存在しません。
     # 代替手段として、新しいリストに作成して古いリストから削除する方法を用いたり、
@@ -81,7 +171,112 @@ class TasksAdapter:
         """
         指定されたタスクを削除する。
         """
-        return self.service.tasks().delete(
+        result = self._delete_request(self.service, tasklist_id, task_id).execute()
+        if self.mirror:
+            self.mirror.delete_task(tasklist_id, task_id)
+        return result
+
+    def _mirror_upsert(self, tasklist_id: str, task: dict):
+        # 自身の書き込み結果をミラーへ即座に反映し、次回の差分取得を待たずに読み出せるようにする
+        if self.mirror and isinstance(task, dict):
+            self.mirror.upsert_task(tasklist_id, task)
+
+    def batch(self) -> "TaskMutationBatch":
+        """
+        複数の更新操作をまとめて送信するためのバッチを作成する。
+        """
+        return TaskMutationBatch(self)
+
+    # ----- リクエスト生成（単発実行・バッチ実行の両方で共用する） -----
+    @staticmethod
+    def _insert_request(service, tasklist_id: str, title: str, notes: str = ""):
+        task_body = {
+            'title': title,
+            'notes': notes
+        }
+        return service.tasks().insert(tasklist=tasklist_id, body=task_body)
+
+    @staticmethod
+    def _update_request(service, tasklist_id: str, task_id: str, task_body: dict):
+        return service.tasks().update(
+            tasklist=tasklist_id, 
+            task=task_id, 
+            body=task_body
+        )
+
+    @staticmethod
+    def _patch_request(service, tasklist_id: str, task_id: str, fields: dict):
+        return service.tasks().patch(
+            tasklist=tasklist_id, 
+            task=task_id, 
+            body=fields
+        )
+
+    @staticmethod
+    def _move_request(service, tasklist_id: str, task_id: str, previous_id: str = None):
+        return service.tasks().move(
+            tasklist=tasklist_id, 
+            task=task_id, 
+            previous=previous_id
+        )
+
+    @staticmethod
+    def _delete_request(service, tasklist_id: str, task_id: str):
+        return service.tasks().delete(
             tasklist=tasklist_id, 
             task=task_id
-        ).execute()
+        )
+
+
+class TaskMutationBatch(BatchRequestQueue):
+    """
+    TasksAdapter の更新系操作（作成・更新・部分更新・移動・削除）をキューに積み、
+    バッチHTTPリクエストでまとめて送信するクラス。
+    各メソッドは結果配列上の番号を返し、execute() で操作ごとの結果が得られる。
+    """
+    def __init__(self, adapter: TasksAdapter):
+        super().__init__(lambda: adapter.service, limiter=adapter.limiter)
+        self.adapter = adapter
+        # ミラーへ反映するための操作内容 (種類, リストID, タスクID)
+        self._operations = []
+
+    def insert(self, tasklist_id: str, title: str, notes: str = "") -> int:
+        self._operations.append(("upsert", tasklist_id, None))
+        # 作成は再送すると重複するため、レート制限エラーの場合のみ再送する
+        return self.add(lambda service: TasksAdapter._insert_request(service, tasklist_id, title, notes), idempotent=False)
+
+    def update(self, tasklist_id: str, task_id: str, task_body: dict) -> int:
+        # 送信までに呼び出し元で辞書が書き換えられても影響しないよう複製しておく
+        task_body = dict(task_body)
+        self._operations.append(("upsert", tasklist_id, task_id))
+        return self.add(lambda service: TasksAdapter._update_request(service, tasklist_id, task_id, task_body))
+
+    def patch(self, tasklist_id: str, task_id: str, fields: dict) -> int:
+        fields = dict(fields)
+        self._operations.append(("upsert", tasklist_id, task_id))
+        return self.add(lambda service: TasksAdapter._patch_request(service, tasklist_id, task_id, fields))
+
+    def move(self, tasklist_id: str, task_id: str, previous_id: str = None) -> int:
+        self._operations.append(("upsert", tasklist_id, task_id))
+        return self.add(lambda service: TasksAdapter._move_request(service, tasklist_id, task_id, previous_id))
+
+    def delete(self, tasklist_id: str, task_id: str) -> int:
+        self._operations.append(("delete", tasklist_id, task_id))
+        return self.add(lambda service: TasksAdapter._delete_request(service, tasklist_id, task_id))
+
+    def execute(self) -> list:
+        """
+        キューに積んだ操作を送信し、成功した操作の結果をローカルミラーへ反映する。
+        """
+        operations = self._operations
+        self._operations = []
+        results = super().execute()
+        for (kind, tasklist_id, task_id), result in zip(operations, results):
+            if not result["ok"]:
+                continue
+            if kind == "delete":
+                if self.adapter.mirror:
+                    self.adapter.mirror.delete_task(tasklist_id, task_id)
+            else:
+                self.adapter._mirror_upsert(tasklist_id, result["response"])
+        return results
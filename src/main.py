@@ -11,11 +11,19 @@ warnings.filterwarnings("ignore", category=FutureWarning)
 root_dir = Path(__file__).resolve().parent.parent
 sys.path.append(str(root_dir))
 
-from src.ui.app import TaskManagerApp
-import flet as ft
+from contextlib import nullcontext
+from src.logic import instrumentation
+
+# 起動時間の計測（画面の構築・ロジックの先読みまで）。結果は起動後にアプリのログへ出力する
+startup_trace = instrumentation.begin_run("startup")
+
+# Gemini・Google API クライアントのモジュールは、画面の表示後にバックグラウンドで読み込む (TaskManagerApp._preload_logic)
+with startup_trace.span("import_ui") if startup_trace else nullcontext():
+    from src.ui.app import TaskManagerApp
+    import flet as ft
 
 def main():
-    app = TaskManagerApp()
+    app = TaskManagerApp(startup_trace)
     ft.app(target=app.main)
 
 if __name__ == "__main__":
@@ -1,22 +1,22 @@
 import flet as ft
 from config.config import Config
 from src.logic.auth import GoogleAuth
-from src.logic.tasks_adapter import TasksAdapter
-from src.logic.calendar_adapter import CalendarAdapter
-from src.logic.gemini_adapter import GeminiAdapter
-from src.logic.state_manager import StateManager
-from src.logic.synchronizer import Synchronizer
-from src.logic.scheduler import Scheduler
+from src.logic.backends import create_components
+from src.logic.instance_lock import InstanceLock, InstanceLockError
+from src.logic import instrumentation
+from src.ui.log_sink import UILogSink
+from contextlib import nullcontext
 import sys
 import threading
-import time
 import datetime
 
 # GUIアプリケーションのメインクラス
 # FletによるデスクトップUIを提供し、各種ロジックの実行を管理する。
 class TaskManagerApp:
-    def __init__(self):
-        # 認証機能は起動時にインスタンス化しておく
+    def __init__(self, startup_trace=None):
+        # startup_trace: 起動時間の計測 (instrumentation.begin_run)。画面の構築とロジックの先読みが終わった時点でログに出力する
+        self.startup_trace = startup_trace
+        # 認証機能は起動時にインスタンス化しておく（トークンの読み込み・認証は初回の実行時に行う）
         self.auth = GoogleAuth()
         # 各種アダプタやロジックの実体は、実行ボタンが押されたタイミング等で遅延初期化(Lazy Init)する
         self.tasks_adapter = None
@@ -26,17 +26,58 @@ class TaskManagerApp:
         self.synchronizer = None
         self.scheduler = None
         self.log_callback = print
+        self._init_lock = threading.Lock()
+        # 同じアカウントに対する常駐モード・コマンドライン版との同時実行を防ぐロック（初回の実行時に取得し、終了まで保持する）
+        self._instance_lock = None
+
+    def _startup_span(self, name: str):
+        return self.startup_trace.span(name) if self.startup_trace else nullcontext()
+
+    def _preload_logic(self):
+        """
+        画面の表示後にバックグラウンドで、読み込みに時間がかかるモジュール（Gemini・Google API クライアント）と
+        ディスカバリドキュメントを先読みする（初回のボタン操作を待たせないため。認証は行わない）。
+        """
+        try:
+            with self._startup_span("preload_logic"):
+                import src.logic.synchronizer
+                import src.logic.scheduler
+                from src.logic import gemini_adapter, google_service
+                gemini_adapter.preload()
+                if Config.BACKEND == "google":
+                    google_service.prefetch_discovery([('tasks', 'v1'), ('calendar', 'v3')])
+        except Exception as e:
+            print(f"Preload failed: {e}")
+        instrumentation.end_run(self.startup_trace, self.log_callback)
 
     def initialize_logic(self):
+        # ボタン操作ごとに別スレッドから呼ばれるため、初期化は1度だけ行われるようにロックで保護する
+        with self._init_lock:
+            self._initialize_logic()
+
+    def _initialize_logic(self):
         # 既に初期化済みの場合はスキップ
         if self.synchronizer and self.scheduler:
             return
 
-        creds = self.auth.authenticate()
-        self.tasks_adapter = TasksAdapter(self.auth)
-        self.calendar_adapter = CalendarAdapter(self.auth)
-        self.gemini_adapter = GeminiAdapter()
-        self.state_manager = StateManager()
+        # 別のプロセスが同じアカウントで実行中の場合は InstanceLockError となる（次回のボタン操作で再び取得を試みる）
+        if self._instance_lock is None:
+            instance_lock = InstanceLock.for_account()
+            instance_lock.acquire()
+            self._instance_lock = instance_lock
+
+        from src.logic.synchronizer import Synchronizer
+        from src.logic.scheduler import Scheduler
+
+        # 接続先 (実際の API / シミュレーション) は Config.BACKEND で切り替える
+        # 初期化の各段階（認証・アダプタの構築）の所要時間を計測してログへ出力する
+        with instrumentation.run("initialize_logic", self.log_callback):
+            (
+                self.tasks_adapter,
+                self.calendar_adapter,
+                self.gemini_adapter,
+                self.state_manager
+            ) = create_components(self.auth)
         
         self.synchronizer = Synchronizer(
             self.tasks_adapter, 
@@ -52,8 +93,42 @@ class TaskManagerApp:
             self.gemini_adapter,
             logger=self.log_callback
         )
+        # 初回の処理と並行して、タスクリストと空き時間をバックグラウンドで先読みする
+        threading.Thread(target=self._prewarm, daemon=True).start()
+
+    def _prewarm(self):
+        """
+        タスクリスト（ローカルミラーが有効な場合は各■リストのタスクも）と今後2週間の空き時間を取得しておく。
+        ミラー・予定キャッシュが有効な場合、以後の処理での取得は差分のみになる。
+        """
+        try:
+            with instrumentation.run("prewarm", self.log_callback):
+                with instrumentation.span("tasklists"):
+                    task_lists = self.tasks_adapter.get_tasklists()
+                    if self.tasks_adapter.mirror:
+                        for lst in task_lists:
+                            if lst.get('title', '').startswith('■'):
+                                self.tasks_adapter.sync_list(lst['id'])
+                with instrumentation.span("freebusy"):
+                    now = datetime.datetime.now(datetime.timezone.utc)
+                    self.calendar_adapter.get_free_busy(now, now + datetime.timedelta(days=14))
+        except Exception as e:
+            print(f"Prewarm failed: {e}")
+
+    def release_instance_lock(self):
+        # 画面を閉じた時点でロックを解放し、常駐モード等が実行できるようにする
+        with self._init_lock:
+            if self._instance_lock is not None:
+                self._instance_lock.release()
+                self._instance_lock = None
 
     def main(self, page: ft.Page):
+        with self._startup_span("build_ui"):
+            self._build_ui(page)
+        # 画面の表示後に、ロジックのモジュールをバックグラウンドで先読みする
+        threading.Thread(target=self._preload_logic, daemon=True).start()
+
+    def _build_ui(self, page: ft.Page):
         try:
             page.title = "Task Manager"
             page.window_width = 800
@@ -64,19 +139,17 @@ class TaskManagerApp:
             page.update()
 
             # UI Elements
-            log_view = ft.Column(scroll=ft.ScrollMode.ALWAYS, auto_scroll=True, expand=True)
+            # ログの表示は保持する行数に上限のある仮想化リストとし、更新は UILogSink がまとめて行う
+            log_view = ft.ListView(auto_scroll=True, expand=True)
+            log_sink = UILogSink(log_view)
+
+            def on_disconnect(e):
+                self.release_instance_lock()
+                log_sink.close()
+            page.on_disconnect = on_disconnect
             
-            # Log function
-            def ui_log(message, color=None):
-                print(message)
-                log_view.controls.append(ft.Text(str(message).strip(), selectable=True, font_family="Consolas", color=color))
-                try:
-                    log_view.update()
-                    page.update()
-                    # 画面表示(リフレッシュ)を確実に毎度反映させるため短いスリープを挟む
-                    time.sleep(0.05)
-                except Exception as e:
-                    print(f"UI update failed: {e}")
+            # Log function (どのスレッドからも呼び出せ、画面の更新を待たずに戻る)
+            ui_log = log_sink.log
             
             self.log_callback = ui_log
 
@@ -92,8 +165,8 @@ class TaskManagerApp:
                             self.initialize_logic()
                             target_func()
                             ui_log(end_msg)
-                        except ValueError as ve:
-                            # 設定エラーなどはユーザーへダイアログで通知する
+                        except (ValueError, InstanceLockError) as ve:
+                            # 設定エラーや、別のプロセスが同じアカウントで実行中の場合はユーザーへダイアログで通知する
                             error_msg = str(ve)
                             ui_log(f"Warning in {error_name}: {error_msg}", color="black")
                             
@@ -177,39 +250,22 @@ class TaskManagerApp:
                 if not self.scheduler or not self.scheduler.pending_split_tasks:
                      approval_list.controls.append(ft.Text("現在、承認待ちのタスクはありません。", color="grey"))
                 else:
-                     for idx, p_task in enumerate(self.scheduler.pending_split_tasks):
+                     for p_task in list(self.scheduler.pending_split_tasks):
                          subtasks_str = ", ".join(p_task["analysis"].get("recommended_subtasks", []))
                          
-                         def make_approve_handler(task_index, t_data):
+                         def make_approve_handler(t_data):
                               def handler(e):
                                   ui_log(f"[{t_data['title']}] の分割を承認し、スケジュール登録を再開します...")
-                                  # 1. 保留リストから削除
-                                  self.scheduler.pending_split_tasks.pop(task_index)
+                                  # 1. 保留リストから取り出す（既に処理中の場合は何もしない）
+                                  pending = self.scheduler.take_pending_split(t_data["original_task_id"])
                                   refresh_approval_ui() # UI更新
+                                  if pending is None:
+                                      return
                                   
                                   # 2. スケジュール強制実行 (バックグラウンド)
                                   def process_approved():
                                       try:
-                                          freebusy_data = self.calendar.get_free_busy(
-                                              datetime.datetime.now(datetime.timezone.utc), 
-                                              datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=14)
-                                          )
-                                          # Scheduler の単一処理や分割処理を強制的に呼び出す
-                                          # ここでは簡易的にサブタスク化して登録するロジックを再実行 (scheduler本体にメソッドを切り出すのが望ましいがインラインで処理)
-                                          list_id = t_data["list_id"]
-                                          task_id = t_data["original_task_id"]
-                                          title = t_data["title"]
-                                          analysis = t_data["analysis"]
-                                          subtasks = analysis.get("recommended_subtasks", [])
-                                          
-                                          # 親タスク更新
-                                          new_title = f"{self.scheduler.SPLIT_PREFIX}{title}"
-                                          self.tasks_adapter.update_task(list_id, task_id, {"title": new_title})
-                                          
-                                          for str_sub in subtasks:
-                                              new_task_body = self.tasks_adapter.insert_task(list_id, str_sub, f"Parent: {title}")
-                                              if new_task_body:
-                                                   self.scheduler._schedule_single_task(list_id, new_task_body, analysis, freebusy_data)
+                                          self.scheduler.approve_split_task(pending)
                                           ui_log(f"-> 承認されたタスクのスケジュール登録が完了しました。")
                                       except Exception as ex:
                                           ui_log(f"承認タスクの処理中にエラー: {ex}")
@@ -220,7 +276,7 @@ class TaskManagerApp:
                          row = ft.Row([
                              ft.Icon(ft.icons.WARNING, color="orange"),
                              ft.Text(f"「{p_task['title']}」が {len(p_task['analysis'].get('recommended_subtasks', []))} 個に分割されました。", tooltip=subtasks_str, expand=True),
-                             ft.ElevatedButton("内容を承認して登録", on_click=make_approve_handler(idx, p_task), bgcolor="green", color="white")
+                             ft.ElevatedButton("内容を承認して登録", on_click=make_approve_handler(p_task), bgcolor="green", color="white")
                          ])
                          approval_list.controls.append(row)
                          
@@ -0,0 +1,88 @@
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import flet as ft
+from config.config import Config
+
+
+class UILogSink:
+    """
+    ワーカースレッドからのログを画面に表示するための出力先。
+    - log() はスレッドセーフなキューに積むだけで、画面の更新を待たずに戻る
+    - 表示用のスレッドが一定間隔 (UI_LOG_FPS) でキューの内容をまとめ、1回の update() で画面に反映する
+    - 画面に保持する行数は UI_LOG_MAX_LINES 行までとし、超えた分は古い行から削除する（表示は仮想化された ListView）
+    - 全ての行はローテーションするログファイル (data/logs/taskmanager.log) に保存する
+    """
+    def __init__(self, log_view: ft.ListView, max_lines: int = None, fps: float = None, log_file=None):
+        self.log_view = log_view
+        self.max_lines = Config.UI_LOG_MAX_LINES if max_lines is None else max_lines
+        self.interval = 1.0 / (Config.UI_LOG_FPS if fps is None else fps)
+        self._queue = queue.SimpleQueue()
+        self._stop = threading.Event()
+
+        log_file = log_file or (Config.DATA_DIR / "logs" / "taskmanager.log")
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        self._file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=Config.UI_LOG_FILE_MAX_BYTES, backupCount=Config.UI_LOG_FILE_BACKUPS, encoding="utf-8"
+        )
+        self._file_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+
+        self._thread = threading.Thread(target=self._run, name="ui-log-flusher", daemon=True)
+        self._thread.start()
+
+    def log(self, message, color=None):
+        """
+        ログを1行追加する（どのスレッドからでも呼び出せる）。
+        """
+        print(message)
+        # 出力された時刻で記録するため、ファイル用のレコードはこの時点で作成する
+        record = logging.makeLogRecord({"msg": str(message).strip(), "levelno": logging.INFO, "levelname": "INFO"})
+        self._queue.put((record, color))
+
+    def _drain(self) -> list:
+        entries = []
+        while True:
+            try:
+                entries.append(self._queue.get_nowait())
+            except queue.Empty:
+                return entries
+
+    def flush(self):
+        """
+        キューに溜まっているログを、ファイルへの保存と画面への反映（1回の update()）でまとめて出力する。
+        """
+        entries = self._drain()
+        if not entries:
+            return
+        for record, _ in entries:
+            self._file_handler.handle(record)
+        self._file_handler.flush()
+
+        # 1回の反映で追加するのは表示できる行数までとする
+        controls = self.log_view.controls
+        controls.extend(
+            ft.Text(record.msg, selectable=True, font_family="Consolas", color=color)
+            for record, color in entries[-self.max_lines:]
+        )
+        overflow = len(controls) - self.max_lines
+        if overflow > 0:
+            del controls[:overflow]
+        try:
+            self.log_view.update()
+        except Exception as e:
+            print(f"UI update failed: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        """
+        表示用のスレッドを停止し、残っているログを出力してからログファイルを閉じる。
+        """
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        self._file_handler.close()